@@ -6,106 +6,84 @@
 ########################################################################################################################
 
 
+import argparse
+import os
 import requests
-from bs4 import BeautifulSoup
-import re
 import csv
-import time
 
+import http_cache
+import http_client
+import profiling
+import telemetry
+from http_cache import cached_get
+from parsers import extract_info, parse_brand_page
+from politeness import get_scheduler
+
+@profiling.hot()
 def get_html_content(url):
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
     try:
-        response = requests.get(url, headers=headers)
+        response = cached_get(url, headers=headers)
         response.raise_for_status()
         return response.text
     except requests.RequestException as e:
         print(f"Error fetching the webpage: {e}")
         return None
 
-def extract_manufacturers(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    manufacturers = []
+MODEL_FIELDS = ['brand', 'production_models', 'discontinued_models', 'model_name', 'body_type', 'fuel_types', 'generations', 'production_years', 'status', 'image_url', 'model_link']
+# manufacturers.csv as of the last stage 02 run, plus the index update date and the brand
+# name its rows carry in all_brand_models.csv. Stage 01 rewrites manufacturers.csv before
+# this stage runs, so the baseline has to be kept here.
+CRAWLED_FILE = 'manufacturers.crawled.csv'
+CRAWLED_FIELDS = ['name', 'logo_url', 'link', 'in_production', 'discontinued', 'update_date', 'brand']
 
-    manufacturer_blocks = soup.find_all(['div', 'a'], class_=['col2width fl bcol-white carman', 'car-brand-logo'])
-    
-    for block in manufacturer_blocks:
-        name_elem = block.find(['h5', 'img'])
-        if not name_elem:
-            continue
-        
-        if name_elem.name == 'img':
-            name = name_elem['alt'].replace(' logo', '')
-        else:
-            name = name_elem.text.strip()
-        
-        link = block.find('a')['href'] if block.find('a') else ''
-        
-        manufacturers.append({
-            'name': name,
-            'link': link
-        })
+def read_csv(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r', newline='', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
 
-    return manufacturers
+def load_previous(crawled_file, models_file):
+    # Last run's index counters by brand link, and its model rows by brand name.
+    previous = {row['link']: row for row in read_csv(crawled_file)}
+    models = {}
+    for row in read_csv(models_file):
+        models.setdefault(row['brand'], []).append(row)
+    return previous, models
 
-def extract_brand_info(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    brand_name = soup.find('h1', class_='newstitle').text.strip()
-    brand_name = re.sub(r'Models & Brand History', '', brand_name).strip()
-    
-    info_div = soup.find('div', class_='brandinfo')
-    production_models = info_div.find('b', class_='col-green2').text if info_div else '0'
-    discontinued_models = info_div.find('b', class_='col-red').text if info_div else '0'
-    
-    return brand_name, int(production_models), int(discontinued_models)
+def is_unchanged(manufacturer, update_date, previous, models, check_date=False):
+    # A brand is carried forward only if its in-production and discontinued counters are the
+    # same as in the last run and its rows are on disk. The update date is one for the whole
+    # index, so it can only add to that: with check_date, a newer index date refetches too.
+    row = previous.get(manufacturer['link'])
+    if not row or row['brand'] not in models:
+        return False
+    if check_date and row['update_date'] != update_date:
+        return False
+    return (row['in_production'] == str(manufacturer['in_production'])
+            and row['discontinued'] == str(manufacturer['discontinued']))
 
-def extract_models(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    models = []
-    
-    for model_div in soup.find_all('div', class_='carmod'):
-        model_name = model_div.find('h4').text.strip()
-        body_type = model_div.find('p', class_='body').text.strip() if model_div.find('p', class_='body') else ''
-        fuel_types = [span.text.strip() for span in model_div.find('p', class_='eng').find_all('span')] if model_div.find('p', class_='eng') else []
-        generations = model_div.find('b').text.strip() if model_div.find('b') else ''
-        years = model_div.find('span').text.strip() if model_div.find('span') else ''
-        
-        # Extract production years
-        production_years = re.search(r'\((\d{4})\s*-\s*(Present|\d{4})\)', years)
-        if production_years:
-            start_year = production_years.group(1)
-            end_year = production_years.group(2)
-            production_years = f"{start_year} - {end_year}"
-        else:
-            production_years = "N/A"
-        
-        # Determine if the model is in production or discontinued
-        status = "PRODUCTION" if "Present" in years else "DISCONTINUED"
-        
-        img = model_div.find('img')
-        image_url = img['src'] if img else ''
-        
-        link = model_div.find('a')['href'] if model_div.find('a') else ''
-        
-        models.append({
-            'model_name': model_name,
-            'body_type': body_type,
-            'fuel_types': ', '.join(fuel_types),
-            'generations': generations,
-            'production_years': production_years,
-            'status': status,
-            'image_url': image_url,
-            'model_link': link
-        })
-    
-    return models
+def carried_forward(rows):
+    first = rows[0]
+    return {
+        'name': first['brand'],
+        'production_models': first['production_models'],
+        'discontinued_models': first['discontinued_models'],
+        'models': [{field: row[field] for field in MODEL_FIELDS[3:]} for row in rows]
+    }
+
+def save_crawled(manufacturers, filename=CRAWLED_FILE):
+    with open(filename, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=CRAWLED_FIELDS)
+        writer.writeheader()
+        for manufacturer in manufacturers:
+            writer.writerow(manufacturer)
 
 def save_to_csv(data, filename='all_brand_models.csv'):
     with open(filename, 'w', newline='', encoding='utf-8') as file:
-        fieldnames = ['brand', 'production_models', 'discontinued_models', 'model_name', 'body_type', 'fuel_types', 'generations', 'production_years', 'status', 'image_url', 'model_link']
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer = csv.DictWriter(file, fieldnames=MODEL_FIELDS)
         writer.writeheader()
         for brand in data:
             for model in brand['models']:
@@ -117,14 +95,43 @@ def save_to_csv(data, filename='all_brand_models.csv'):
                 })
 
 def main():
+    parser = argparse.ArgumentParser(description='Crawl the model list of every brand')
+    parser.add_argument('--full', action='store_true',
+                        help='fetch every brand page, even brands whose index counters are unchanged')
+    parser.add_argument('--check-date', action='store_true',
+                        help='also refetch every brand when the index update date changed since the last run')
+    http_cache.add_arguments(parser)
+    http_client.add_arguments(parser)
+    telemetry.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    cache = http_cache.configure_from_args(args)
+    client = http_client.configure_from_args(args)
+    telemetry.configure_from_args(args, '02')
+    profiling.configure_from_args(args, '02')
+
     base_url = "https://www.autoevolution.com/cars/"
     html_content = get_html_content(base_url)
     
     if html_content:
-        manufacturers = extract_manufacturers(html_content)
+        update_date, _, manufacturers = extract_info(html_content)
+        previous, previous_models = ({}, {}) if args.full else load_previous(CRAWLED_FILE, 'all_brand_models.csv')
         all_data = []
+        crawled = []
+        carried = 0
+        telemetry.get_telemetry().add_items('brand', len(manufacturers))
         
         for manufacturer in manufacturers:
+            if is_unchanged(manufacturer, update_date, previous, previous_models, args.check_date):
+                # 인덱스 카운터가 그대로인 브랜드는 지난 결과를 그대로 사용
+                row = previous[manufacturer['link']]
+                all_data.append(carried_forward(previous_models[row['brand']]))
+                crawled.append({**manufacturer, 'update_date': update_date, 'brand': row['brand']})
+                carried += 1
+                telemetry.get_telemetry().inc('brands_carried_forward_total')
+                telemetry.get_telemetry().item_done('brand')
+                continue
+
             url = manufacturer['link']
             if not url.startswith('http'):
                 url = f"https://www.autoevolution.com{url}"
@@ -132,8 +139,7 @@ def main():
             html_content = get_html_content(url)
             
             if html_content:
-                brand_name, production_models, discontinued_models = extract_brand_info(html_content)
-                models = extract_models(html_content)
+                brand_name, production_models, discontinued_models, models = parse_brand_page(html_content)
                 
                 brand_data = {
                     'name': brand_name,
@@ -142,19 +148,32 @@ def main():
                     'models': models
                 }
                 all_data.append(brand_data)
+                crawled.append({**manufacturer, 'update_date': update_date, 'brand': brand_name})
                 
                 print(f"Processed {brand_name}:")
                 print(f"Production models: {production_models}")
                 print(f"Discontinued models: {discontinued_models}")
                 print(f"Total models extracted: {len(models)}")
                 print("-" * 50)
-            
-            time.sleep(2)  # 웹사이트에 과도한 요청을 보내지 않기 위한 지연
+            else:
+                # 가져오지 못한 브랜드는 지난 결과를 유지하고, 카운터를 비워 다음 실행에 다시 시도
+                row = previous.get(manufacturer['link'])
+                if row and row['brand'] in previous_models:
+                    all_data.append(carried_forward(previous_models[row['brand']]))
+                    crawled.append({**row, 'in_production': '', 'discontinued': '', 'update_date': ''})
+            telemetry.get_telemetry().item_done('brand')
         
         save_to_csv(all_data)
+        save_crawled(crawled)
+        print(f"Fetched {len(manufacturers) - carried} brand pages, carried {carried} unchanged brands forward")
         print("Data has been saved to all_brand_models.csv")
     else:
         print("Failed to retrieve the main webpage.")
 
+    print(f"Requests: {get_scheduler().summary()}")
+    print(f"Cache: {cache.summary()}")
+    print(f"HTTP: {client.summary()}")
+    print(f"Telemetry: {telemetry.finish()}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
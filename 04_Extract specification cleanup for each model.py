@@ -5,34 +5,29 @@
 # Source constructors : Esketch Song (esketch@gmail.com)
 ########################################################################################################################
 
+import argparse
+import asyncio
 import csv
+import logging
 import requests
-from bs4 import BeautifulSoup
-import json
 import os
 import time
-import random
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
-
-def requests_retry_session(
-    retries=3,
-    backoff_factor=0.3,
-    status_forcelist=(500, 502, 504),
-    session=None,
-):
-    session = session or requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
+from concurrent.futures import ProcessPoolExecutor
+
+import adaptive_concurrency
+from async_fetch import fetch_all
+import dataset_export
+import distributed
+import http_cache
+from http_cache import cached_get
+from parsers import parse_specs
+from jsonl_store import JsonlWriter, brand_path
+import politeness
+import profiling
+import spec_store
+import telemetry
+from spec_index import SpecIndex
+from work_queue import DEFAULT_JOURNAL, WorkQueue, fan_out, file_fingerprint, group_rows
 
 def read_csv_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
@@ -50,7 +45,8 @@ def read_csv_file(file_path):
     
     return models
 
-def extract_specs(url, session):
+@profiling.hot()
+def extract_specs(url, session=None):
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -62,126 +58,170 @@ def extract_specs(url, session):
     }
     
     try:
-        response = session.get(url, headers=headers, timeout=10)
+        response = cached_get(url, session=session, headers=headers)
         response.raise_for_status()
     except requests.RequestException as e:
         print(f"Request failed: {e}")
         return None
 
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    # Find all engine blocks
-    engine_blocks = soup.find_all('div', class_='engine-block')
-    
-    if not engine_blocks:
-        # If no engine blocks found, try to extract general information
-        return extract_general_info(soup)
-
-    all_specs = []
-
-    for engine_block in engine_blocks:
-        specs = {}
-
-        # Extract engine name
-        engine_name = engine_block.find('h3')
-        if engine_name:
-            specs['engine_name'] = engine_name.text.strip()
-
-        # Extract all spec tables
-        tables = engine_block.find_all('table', class_='techdata')
-        
-        for table in tables:
-            table_title = table.find('th', class_='title')
-            if table_title:
-                section_name = table_title.text.strip().lower().replace(' specs', '')
-                specs[section_name] = {}
-                
-                for row in table.find_all('tr'):
-                    header = row.find('td', class_='left')
-                    value = row.find('td', class_='right')
-                    if header and value:
-                        key = header.text.strip().replace(':', '').lower()
-                        specs[section_name][key] = value.text.strip()
-
-        all_specs.append(specs)
-
-    return all_specs
-
-def extract_general_info(soup):
-    general_info = {}
-    
-    # Try to extract information from the general description
-    description = soup.find('div', class_='newstext')
-    if description:
-        general_info['description'] = description.text.strip()
-
-    # Try to extract any visible specifications
-    spec_boxes = soup.find_all('div', class_='sbox10')
-    for box in spec_boxes:
-        title = box.find('div', class_='tt')
-        if title:
-            section_name = title.text.strip().lower()
-            general_info[section_name] = {}
-            items = box.find_all('li')
-            for item in items:
-                general_info[section_name][item['id']] = item.text.strip()
-
-def process_brand(brand_models, session):
-    results = []
-    for model in brand_models:
-        full_url = f"https://www.autoevolution.com{model['sub_link']}"
-        specs = extract_specs(full_url, session)
-        
-        if specs:
-            model['specs'] = specs
-            print(f"Successfully extracted specs for {model['brand']} {model['model_name']}")
+    return parse_specs(response.content)
+
+def run_pass(journal, rows, writers, concurrency, parse_workers):
+    def writer_for(brand):
+        writer = writers.get(brand)
+        if writer is None:
+            writer = writers[brand] = JsonlWriter(brand_path(brand), key='sub_link')
+        return writer
+
+    def finish(brand):
+        # A brand file is committed as soon as its last engine page comes back,
+        # while requests for the remaining brands stay in flight.
+        if journal.unfinished(brand) == 0 and brand in writers:
+            writers.pop(brand).commit()
+            print(f"Completed processing for {brand}. Results saved to {brand_path(brand)}")
+            print("-" * 50)
+
+    def on_result(sub_link, specs, error):
+        model = dict(rows[sub_link][0])
+        brand = model['brand']
+        if error is not None:
+            print(f"Request failed: {error}")
+            print(f"Failed to extract specs for {brand} {model['model_name']}")
+            if not journal.mark_failed(sub_link, error):
+                # Out of retries: keep the rows without specs, as before.
+                writer_for(brand).write_many(fan_out(model, rows[sub_link]))
+                telemetry.get_telemetry().item_done('engine')
         else:
-            print(f"Failed to extract specs for {model['brand']} {model['model_name']}")
-        
-        results.append(model)
-        
-        # Add a random delay between requests to avoid overloading the server
-        time.sleep(random.uniform(3, 7))
-    
-    return results
+            if specs:
+                model['specs'] = specs
+                print(f"Successfully extracted specs for {brand} {model['model_name']}")
+            else:
+                print(f"Failed to extract specs for {brand} {model['model_name']}")
+            writer_for(brand).write_many(fan_out(model, rows[sub_link]))
+            journal.mark_done(sub_link)
+            telemetry.get_telemetry().item_done('engine')
+        finish(brand)
+
+    def jobs():
+        for model in journal.claim():
+            if model['sub_link'] in writer_for(model['brand']).keys:
+                # Written just before the previous run stopped.
+                journal.mark_done(model['sub_link'])
+                finish(model['brand'])
+                continue
+            yield model['sub_link'], f"https://www.autoevolution.com{model['sub_link']}"
+
+    if parse_workers:
+        # Parse in worker processes so spec pages are parsed on every core while fetching continues.
+        with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+            asyncio.run(fetch_all(jobs(), parse_specs, on_result, concurrency=concurrency, cache=http_cache.get_cache(),
+                                  parse_executor=executor, parse_workers=parse_workers))
+    else:
+        asyncio.run(fetch_all(jobs(), parse_specs, on_result, concurrency=concurrency, cache=http_cache.get_cache()))
+
+def process_all(models, source, concurrency, parse_workers=0, journal_path=DEFAULT_JOURNAL):
+    # Every sub_link is tracked in the journal and every record is appended to its brand's
+    # JSON Lines file as soon as it is parsed, so a crashed run resumes where it stopped.
+    journal = WorkQueue(journal_path)
+    writers = {}
+    try:
+        if journal.seed(models, source):
+            print(f"Resuming previous run: {journal.counts()}")
+        else:
+            # Part files left by an earlier month's interrupted run are not continued.
+            for brand in journal.brands():
+                if os.path.exists(brand_path(brand) + '.part'):
+                    os.remove(brand_path(brand) + '.part')
+        # Every CSV row is written, including rows repeating a sub_link; the page is fetched once.
+        rows = group_rows(models)
+        counts = journal.counts()
+        telemetry.get_telemetry().add_items('engine', sum(counts.values()) - counts.get('done', 0))
+
+        run_pass(journal, rows, writers, concurrency, parse_workers)
+
+        # Final pass: failed pages are retried with exponential backoff.
+        while True:
+            requeued, wait = journal.requeue_failed()
+            if requeued:
+                print(f"Retrying {requeued} failed pages")
+                run_pass(journal, rows, writers, concurrency, parse_workers)
+            elif wait is None:
+                break
+            else:
+                print(f"Waiting {wait:.0f}s before retrying failed pages")
+                time.sleep(wait)
+
+        # Brands finished by an earlier run that stopped before committing them.
+        for brand in journal.brands():
+            if os.path.exists(brand_path(brand) + '.part') and journal.unfinished(brand) == 0:
+                JsonlWriter(brand_path(brand)).commit()
+
+        print(f"Journal: {journal.counts()}")
+    finally:
+        for writer in writers.values():
+            writer.close()
+        journal.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract specifications for every engine in detailed_model_info.csv')
+    parser.add_argument('--concurrency', type=int, default=8, help='maximum number of requests in flight (the starting point with --adaptive)')
+    parser.add_argument('--rate', type=float, default=politeness.DEFAULT_MAX_RATE, help='request-rate ceiling per host in requests per second')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='parse in this many worker processes (0 parses in threads)')
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL, help='work queue journal used to resume an interrupted run')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='shard the pages over this many worker processes, each with its own --rate budget')
+    adaptive_concurrency.add_arguments(parser)
+    http_cache.add_arguments(parser)
+    dataset_export.add_arguments(parser)
+    spec_store.add_arguments(parser)
+    telemetry.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    scheduler = politeness.configure(max_rate=args.rate)
+    cache = http_cache.configure_from_args(args)
+    telemetry.configure_from_args(args, '04')
+    profiling.configure_from_args(args, '04')
+    controller = adaptive_concurrency.configure_from_args(args, args.concurrency)
+    if controller is not None:
+        # Concurrency decisions are logged as they are made.
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-    return [general_info] if general_info else None
+    try:
+        # CSV 파일 읽기
+        models = read_csv_file('detailed_model_info.csv')
+        source = file_fingerprint('detailed_model_info.csv')
 
-# 메인 코드
-try:
-    # CSV 파일 읽기
-    models = read_csv_file('detailed_model_info.csv')
+        # 브랜드별 JSON 파일을 저장할 디렉토리 생성
+        os.makedirs('brand_specs', exist_ok=True)
 
-    # 브랜드별로 모델 그룹화
-    brands = {}
-    for model in models:
-        brand = model['brand']
-        if brand not in brands:
-            brands[brand] = []
-        brands[brand].append(model)
-
-    # 세션 생성
-    session = requests_retry_session()
-
-    # 브랜드별 JSON 파일을 저장할 디렉토리 생성
-    os.makedirs('brand_specs', exist_ok=True)
-
-    # 각 브랜드 처리
-    for brand, brand_models in brands.items():
-        print(f"Processing brand: {brand}")
-        brand_results = process_brand(brand_models, session)
-        
-        # 이 브랜드의 결과 저장
-        with open(f'brand_specs/{brand}_specs.json', 'w', encoding='utf-8') as f:
-            json.dump(brand_results, f, indent=2, ensure_ascii=False)
-        
-        print(f"Completed processing for {brand}. Results saved to brand_specs/{brand}_specs.json")
-        print("-" * 50)
+        if args.workers > 1:
+            distributed.coordinate(models, source, args.workers, args.journal, args.concurrency, args.rate,
+                                   args.cache_dir, args.offline, options=args)
+        else:
+            process_all(models, source, args.concurrency, args.parse_workers, args.journal)
 
-    print("All brands processed.")
+        # 스펙 페이지 지문 저장: 다음 05 --update는 이후에 바뀐 페이지만 다시 파싱
+        index = SpecIndex()
+        try:
+            index.record_fingerprints([model['sub_link'] for model in models], cache)
+        finally:
+            index.close()
+
+        # 분석용 Parquet 데이터셋 (브랜드별 파티션)
+        dataset_export.export_from_args(args, 'brand_specs')
+        spec_store.sync_from_args(args, 'brand_specs')
 
-except Exception as e:
-    print(f"An error occurred: {e}")
-    # 여기에 추가적인 오류 처리 로직을 넣을 수 있습니다.
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        # 여기에 추가적인 오류 처리 로직을 넣을 수 있습니다.
 
-print("All brands processed.")
\ No newline at end of file
+    print("All brands processed.")
+    print(f"Requests: {scheduler.summary()}")
+    print(f"Cache: {cache.summary()}")
+    if controller is not None:
+        print(f"Concurrency: {controller.summary()}")
+    print(f"Telemetry: {telemetry.finish()}")
+
+if __name__ == "__main__":
+    main()
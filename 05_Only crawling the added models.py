@@ -6,48 +6,35 @@
 ########################################################################################################################
 
 
+import argparse
+import asyncio
 import csv
-import json
-import os
 import requests
-from bs4 import BeautifulSoup
-import time
-import random
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
 import logging
 
+import adaptive_concurrency
+from async_fetch import fetch_all
+import dataset_export
+import http_cache
+import http_client
+from http_cache import cached_get
+from jsonl_store import JsonlWriter, brand_path, rewrite_brand
+from parsers import content_fingerprint, parse_specs
+from politeness import get_scheduler
+import profiling
+import spec_store
+import telemetry
+from spec_index import KEY_FIELDS, SpecIndex
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def load_existing_data():
-    existing_data = {}
-    for filename in os.listdir('brand_specs'):
-        if filename.endswith('_specs.json'):
-            brand = filename.replace('_specs.json', '')
-            with open(f'brand_specs/{filename}', 'r', encoding='utf-8') as f:
-                existing_data[brand] = json.load(f)
-    logging.info(f"Loaded data for {len(existing_data)} brands from existing files.")
-    return existing_data
-
-def requests_retry_session(
-    retries=3,
-    backoff_factor=0.3,
-    status_forcelist=(500, 502, 504),
-    session=None,
-):
-    session = session or requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
+    # The index is only rebuilt for brand files that changed since the last run.
+    index = SpecIndex()
+    reindexed = index.refresh('brand_specs')
+    logging.info(f"Indexed {len(index)} engines across {len(index.brands())} brands ({reindexed} brand files re-indexed).")
+    return index
 
 def read_csv_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
@@ -65,7 +52,8 @@ def read_csv_file(file_path):
     
     return models
 
-def extract_specs(url, session):
+@profiling.hot()
+def extract_specs(url, session=None):
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -77,148 +65,152 @@ def extract_specs(url, session):
     }
     
     try:
-        response = session.get(url, headers=headers, timeout=10)
+        response = cached_get(url, session=session, headers=headers)
         response.raise_for_status()
     except requests.RequestException as e:
         print(f"Request failed: {e}")
         return None
 
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    # Find all engine blocks
-    engine_blocks = soup.find_all('div', class_='engine-block')
-    
-    if not engine_blocks:
-        # If no engine blocks found, try to extract general information
-        return extract_general_info(soup)
-
-    all_specs = []
-
-    for engine_block in engine_blocks:
-        specs = {}
-
-        # Extract engine name
-        engine_name = engine_block.find('h3')
-        if engine_name:
-            specs['engine_name'] = engine_name.text.strip()
-
-        # Extract all spec tables
-        tables = engine_block.find_all('table', class_='techdata')
-        
-        for table in tables:
-            table_title = table.find('th', class_='title')
-            if table_title:
-                section_name = table_title.text.strip().lower().replace(' specs', '')
-                specs[section_name] = {}
-                
-                for row in table.find_all('tr'):
-                    header = row.find('td', class_='left')
-                    value = row.find('td', class_='right')
-                    if header and value:
-                        key = header.text.strip().replace(':', '').lower()
-                        specs[section_name][key] = value.text.strip()
-
-        all_specs.append(specs)
-
-    return all_specs
-
-def extract_general_info(soup):
-    general_info = {}
-    
-    # Try to extract information from the general description
-    description = soup.find('div', class_='newstext')
-    if description:
-        general_info['description'] = description.text.strip()
-
-    # Try to extract any visible specifications
-    spec_boxes = soup.find_all('div', class_='sbox10')
-    for box in spec_boxes:
-        title = box.find('div', class_='tt')
-        if title:
-            section_name = title.text.strip().lower()
-            general_info[section_name] = {}
-            items = box.find_all('li')
-            for item in items:
-                general_info[section_name][item['id']] = item.text.strip()
-
-def load_existing_data():
-    existing_data = {}
-    for filename in os.listdir('brand_specs'):
-        if filename.endswith('_specs.json'):
-            brand = filename.replace('_specs.json', '')
-            with open(f'brand_specs/{filename}', 'r', encoding='utf-8') as f:
-                existing_data[brand] = json.load(f)
-    return existing_data
+    return parse_specs(response.content)
 
 def identify_new_models(existing_data, new_models):
-    new_models_to_crawl = []
-    brands_checked = set()
-    for model in new_models:
-        brand = model['brand']
-        model_name = model['model_name']
-        engine_name = model['engine_name']
-        
-        if brand not in brands_checked:
-            logging.info(f"Checking for new models in brand: {brand}")
-            brands_checked.add(brand)
-        
-        if brand not in existing_data:
-            new_models_to_crawl.append(model)
-            logging.info(f"New brand found: {brand}, adding model {model_name} with engine {engine_name}")
-        elif not any(m['model_name'] == model_name and m['engine_name'] == engine_name 
-                     for m in existing_data[brand]):
-            new_models_to_crawl.append(model)
-            logging.info(f"New model found for {brand}: {model_name} with engine {engine_name}")
-    
-    logging.info(f"Identified {len(new_models_to_crawl)} new models across {len(brands_checked)} brands.")
-    return new_models_to_crawl
+    new_models_to_crawl, changed, removed = existing_data.diff(new_models)
+    known_brands = existing_data.brands()
 
-def crawl_new_models(new_models, session):
-    results = {}
-    for model in new_models:
-        brand = model['brand']
-        if brand not in results:
-            results[brand] = []
-        
-        full_url = f"https://www.autoevolution.com{model['sub_link']}"
-        logging.info(f"Crawling: {brand} {model['model_name']} {model['engine_name']}")
-        specs = extract_specs(full_url, session)
-        
-        if specs:
-            model['specs'] = specs
-            logging.info(f"Successfully extracted specs for {brand} {model['model_name']} {model['engine_name']}")
+    for model in new_models_to_crawl:
+        if model['brand'] not in known_brands:
+            logging.info(f"New brand found: {model['brand']}, adding model {model['model_name']} with engine {model['engine_name']}")
         else:
-            logging.warning(f"Failed to extract specs for {brand} {model['model_name']} {model['engine_name']}")
-        
-        results[brand].append(model)
-        
-        time.sleep(random.uniform(3, 7))
-    
-    return results
+            logging.info(f"New model found for {model['brand']}: {model['model_name']} with engine {model['engine_name']}")
+    for model in changed:
+        logging.info(f"Changed listing for {model['brand']}: {model['model_name']} with engine {model['engine_name']}")
+    for brand, model_name, engine_name, sub_link in removed:
+        logging.info(f"Removed from the site for {brand}: {model_name} with engine {engine_name} ({sub_link})")
+
+    brands_checked = {model['brand'] for model in new_models}
+    logging.info(f"Identified {len(new_models_to_crawl)} new, {len(changed)} changed and {len(removed)} removed "
+                 f"models across {len(brands_checked)} brands.")
+    return new_models_to_crawl
 
-def update_existing_data(existing_data, new_data):
-    for brand, models in new_data.items():
-        if brand not in existing_data:
-            existing_data[brand] = models
-            logging.info(f"Added new brand: {brand} with {len(models)} models")
-        else:
-            added_models = 0
-            for new_model in models:
-                existing_models = existing_data[brand]
-                if not any(m['model_name'] == new_model['model_name'] and 
-                           m['engine_name'] == new_model['engine_name'] for m in existing_models):
-                    existing_models.append(new_model)
-                    added_models += 1
-            logging.info(f"Updated {brand}: added {added_models} new models")
-    return existing_data
-
-def save_updated_data(updated_data):
-    for brand, models in updated_data.items():
-        with open(f'brand_specs/{brand}_specs.json', 'w', encoding='utf-8') as f:
-            json.dump(models, f, indent=2, ensure_ascii=False)
-        logging.info(f"Saved updated data for {brand}: {len(models)} models")
+def crawl_new_models(new_models, session, existing_data):
+    # Each crawled model is appended to its brand's JSON Lines file straight away; brand files
+    # are committed at the end, and an interrupted run continues the uncommitted part files.
+    writers = {}
+    added = {}
+    telemetry.get_telemetry().add_items('engine', len(new_models))
+    try:
+        for model in new_models:
+            brand = model['brand']
+
+            full_url = f"https://www.autoevolution.com{model['sub_link']}"
+            logging.info(f"Crawling: {brand} {model['model_name']} {model['engine_name']}")
+            specs = extract_specs(full_url, session)
+
+            if specs:
+                model['specs'] = specs
+                logging.info(f"Successfully extracted specs for {brand} {model['model_name']} {model['engine_name']}")
+            else:
+                logging.warning(f"Failed to extract specs for {brand} {model['model_name']} {model['engine_name']}")
+
+            if update_existing_data(existing_data, model):
+                if brand not in writers:
+                    # Keyed like the index, so a known sub_link under a new model or engine name is
+                    # still written; a row already in the part file of an interrupted run is not.
+                    writers[brand] = JsonlWriter(brand_path(brand), key=KEY_FIELDS, append=True)
+                if writers[brand].write(model):
+                    added[brand] = added.get(brand, 0) + 1
+            telemetry.get_telemetry().item_done('engine')
+    except BaseException:
+        for writer in writers.values():
+            writer.close()
+        raise
+
+    save_updated_data(writers, added, existing_data)
+    # Brand files are committed; fingerprint what was just crawled for the next --update.
+    existing_data.record_fingerprints([model['sub_link'] for model in new_models], http_cache.get_cache())
+    return added
+
+def update_existing_data(existing_data, model):
+    # Registers the model in the index; returns False when the engine is already known.
+    return existing_data.add(model)
+
+def save_updated_data(writers, added, existing_data):
+    for brand, writer in writers.items():
+        writer.commit()
+        existing_data.commit_brand(brand, writer.path)
+        logging.info(f"Saved updated data for {brand}: added {added[brand]} new models")
+
+def detect_changed_pages(existing_data, concurrency):
+    # Revalidates every known spec page (an unchanged page costs a 304) and fingerprints its
+    # spec region; only pages whose fingerprint differs from the stored one are returned.
+    pages = existing_data.pages()
+    fingerprints = existing_data.fingerprints()
+    changed = {}
+    telemetry.get_telemetry().add_items('page', len(pages))
+
+    def on_result(page, fingerprint, error):
+        telemetry.get_telemetry().item_done('page')
+        if error is not None:
+            logging.warning(f"Could not check {page}: {error}")
+        elif any(fingerprints.get(sub_link) != fingerprint for _, sub_link in pages[page]):
+            changed[page] = fingerprint
+
+    asyncio.run(fetch_all(((page, page) for page in pages), content_fingerprint, on_result,
+                          concurrency=concurrency, cache=http_cache.get_cache(), revalidate=True))
+    logging.info(f"Checked {len(pages)} spec pages: {len(changed)} changed since the last update")
+    return pages, changed
+
+def refresh_changed_pages(existing_data, pages, changed):
+    # Re-parses only the changed pages (already in the cache after the check) and rewrites
+    # the affected records of each brand file.
+    cache = http_cache.get_cache()
+    replacements = {}
+    fingerprints = {}
+    for page, fingerprint in changed.items():
+        entry = cache.lookup(page)
+        body = cache.read_body(entry) if entry else None
+        if body is None:
+            continue
+        specs = parse_specs(body)
+        for brand, sub_link in pages[page]:
+            replacements.setdefault(brand, {})[sub_link] = specs
+            fingerprints.setdefault(brand, []).append((sub_link, fingerprint, entry.get('etag'), entry.get('last_modified')))
+
+    for brand, specs_by_link in replacements.items():
+        def update(record, specs_by_link=specs_by_link):
+            specs = specs_by_link.get(record.get('sub_link'))
+            if specs:
+                record['specs'] = specs
+            return record
+
+        path = rewrite_brand(brand, update, 'brand_specs')
+        # A brand's new fingerprints are committed with its rewritten file and not before, so
+        # a brand left unwritten by a crash still looks changed on the next run.
+        for sub_link, fingerprint, etag, last_modified in fingerprints[brand]:
+            existing_data.set_fingerprint(sub_link, fingerprint, etag, last_modified)
+        existing_data.commit_brand(brand, path)
+        logging.info(f"Updated {brand}: refreshed specs for {len(specs_by_link)} engines")
+    existing_data.commit()
 
 def main():
+    parser = argparse.ArgumentParser(description='Crawl specifications for models added since the last run')
+    parser.add_argument('--update', action='store_true',
+                        help='also revalidate every known spec page and re-parse the ones whose content changed')
+    parser.add_argument('--concurrency', type=int, default=8, help='maximum number of requests in flight in --update mode')
+    adaptive_concurrency.add_arguments(parser)
+    http_cache.add_arguments(parser)
+    http_client.add_arguments(parser)
+    dataset_export.add_arguments(parser)
+    spec_store.add_arguments(parser)
+    telemetry.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    cache = http_cache.configure_from_args(args)
+    client = http_client.configure_from_args(args)
+    telemetry.configure_from_args(args, '05')
+    profiling.configure_from_args(args, '05')
+    controller = adaptive_concurrency.configure_from_args(args, args.concurrency)
+
     logging.info("Starting the crawling process")
 
     # 기존 데이터 로드
@@ -235,20 +227,28 @@ def main():
 
     if not new_models_to_crawl:
         logging.info("No new models to crawl.")
-        return
-
-    logging.info(f"Found {len(new_models_to_crawl)} new models to crawl.")
-
-    # 새 모델 크롤링
-    session = requests_retry_session()
-    new_data = crawl_new_models(new_models_to_crawl, session)
-
-    # 기존 데이터 업데이트
-    updated_data = update_existing_data(existing_data, new_data)
-
-    # 업데이트된 데이터 저장
-    save_updated_data(updated_data)
-
+    else:
+        logging.info(f"Found {len(new_models_to_crawl)} new models to crawl.")
+
+        # 새 모델 크롤링 (결과는 브랜드 파일에 바로 추가됨)
+        added = crawl_new_models(new_models_to_crawl, client, existing_data)
+        logging.info(f"Added {sum(added.values())} new models across {len(added)} brands")
+
+    # 변경된 스펙 페이지 확인 및 갱신
+    if args.update:
+        pages, changed = detect_changed_pages(existing_data, args.concurrency)
+        refresh_changed_pages(existing_data, pages, changed)
+
+    # Only the partitions of brand files changed by this run are rewritten.
+    dataset_export.export_from_args(args, 'brand_specs')
+    spec_store.sync_from_args(args, 'brand_specs')
+
+    logging.info(f"Requests: {get_scheduler().summary()}")
+    logging.info(f"Cache: {cache.summary()}")
+    if controller is not None:
+        logging.info(f"Concurrency: {controller.summary()}")
+    logging.info(f"HTTP: {client.summary()}")
+    logging.info(f"Telemetry: {telemetry.finish()}")
     logging.info("Crawling and updating process completed.")
 
 if __name__ == "__main__":
@@ -8,84 +8,59 @@
 
 # 데이터 로드
 
-import json
-import os
+import argparse
+
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# 데이터 로드
-def load_all_data():
-    all_data = []
-    for filename in os.listdir('brand_specs'):
-        if filename.endswith('_specs.json'):
-            with open(f'brand_specs/{filename}', 'r', encoding='utf-8') as f:
-                brand_data = json.load(f)
-                all_data.extend(brand_data)
-    return pd.DataFrame(all_data)
-
-df = load_all_data()
-
+import lazy_dataset
+import profiling
 
+# spawn/forkserver 워커가 이 파일을 다시 import하므로, 인자 처리와 로드는 메인 프로세스에서만
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Plot the spec corpus in brand_specs')
+    lazy_dataset.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.configure_from_args(args, '06')
 
+    # 데이터 로드: 각 그래프가 쓰는 컬럼만 읽고, 읽은 컬럼은 다음 그래프에서 재사용
+    dataset = lazy_dataset.configure_from_args(args)
 
-plt.figure(figsize=(15, 8))
-brand_counts = df['brand'].value_counts().head(20)
-sns.barplot(x=brand_counts.index, y=brand_counts.values)
-plt.title('Top 20 Brands by Number of Models')
-plt.xlabel('Brand')
-plt.ylabel('Number of Models')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.show()
-
-
+    df = dataset.load(['brand', 'fuel_type'])
 
 
+    plt.figure(figsize=(15, 8))
+    brand_counts = df['brand'].value_counts().head(20)
+    sns.barplot(x=brand_counts.index, y=brand_counts.values)
+    plt.title('Top 20 Brands by Number of Models')
+    plt.xlabel('Brand')
+    plt.ylabel('Number of Models')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.show()
 
-# 연료 유형 분포
+    # 연료 유형 분포
 
-plt.figure(figsize=(10, 10))
-fuel_type_counts = df['fuel_type'].value_counts()
-plt.pie(fuel_type_counts.values, labels=fuel_type_counts.index, autopct='%1.1f%%')
-plt.title('Distribution of Fuel Types')
-plt.axis('equal')
-plt.show()
+    plt.figure(figsize=(10, 10))
+    fuel_type_counts = df['fuel_type'].value_counts()
+    plt.pie(fuel_type_counts.values, labels=fuel_type_counts.index, autopct='%1.1f%%')
+    plt.title('Distribution of Fuel Types')
+    plt.axis('equal')
+    plt.show()
 
 
 
-import json
-import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
-import re
-
-def load_all_data():
-    all_data = []
-    for filename in os.listdir('brand_specs'):
-        if filename.endswith('_specs.json'):
-            with open(f'brand_specs/{filename}', 'r', encoding='utf-8') as f:
-                brand_data = json.load(f)
-                all_data.extend(brand_data)
-    return all_data
-
-def clean_horsepower(hp_string):
-    # 숫자만 추출
-    match = re.search(r'\d+', hp_string)
-    if match:
-        return int(match.group())
-    return None
-
-def create_dataframe(data):
-    df = pd.DataFrame(data)
-    # 중첩된 'specs' 데이터를 평탄화
-    df = pd.concat([df.drop(['specs'], axis=1), df['specs'].apply(pd.Series)], axis=1)
-    
-    # 마력 데이터 정제
-    df['horsepower'] = df['horsepower'].apply(clean_horsepower)
-    
-    return df
+
+@profiling.hot()
+def create_dataframe(dataset):
+    # 필요한 컬럼만 로드 (마력은 숫자로 정제된 컬럼)
+    df = dataset.load(['brand', 'fuel_type', 'horsepower_hp'])
+    return df.rename(columns={'horsepower_hp': 'horsepower'})
 
 def plot_brand_model_count(df):
     plt.figure(figsize=(12, 6))
@@ -131,11 +106,8 @@ def plot_horsepower_by_fuel_type(df):
     plt.close()
 
 def main():
-    # 데이터 로드
-    data = load_all_data()
-    
     # DataFrame 생성
-    df = create_dataframe(data)
+    df = create_dataframe(dataset)
     
     # 시각화
     plot_brand_model_count(df)
@@ -152,60 +124,26 @@ if __name__ == "__main__":
 
 
 
-import json
-import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
-import numpy as np
-
-def load_all_data():
-    all_data = []
-    for filename in os.listdir('brand_specs'):
-        if filename.endswith('_specs.json'):
-            with open(f'brand_specs/{filename}', 'r', encoding='utf-8') as f:
-                brand_data = json.load(f)
-                all_data.extend(brand_data)
-    return all_data
-
-def clean_numeric(value):
-    if isinstance(value, str):
-        return float(''.join(filter(str.isdigit, value)))
-    return value
-
-def create_dataframe(data):
-    df = pd.DataFrame(data)
-    # 중첩된 'specs' 데이터를 평탄화
-    if 'specs' in df.columns:
-        df = pd.concat([df.drop(['specs'], axis=1), df['specs'].apply(pd.Series)], axis=1)
+
+@profiling.hot()
+def create_dataframe(dataset):
+    # 배기량과 복합 연비의 원본 컬럼만 읽어 단위를 정규화
+    df = dataset.load(['brand', 'fuel_type', 'displacement_l', 'fuel_combined_mpg']).copy()
     
     # 데이터 구조 확인
     print("Columns in the dataframe:", df.columns)
     
-    # 엔진 크기와 연비 데이터 추출 (실제 컬럼 이름에 맞게 수정)
-    if 'engine' in df.columns:
-        df['engine_size'] = df['engine'].apply(lambda x: x.get('displacement') if isinstance(x, dict) else x)
-    elif 'displacement' in df.columns:
-        df['engine_size'] = df['displacement']
-    else:
+    # 엔진 크기(L)와 연비(MPG US)
+    df['engine_size'] = df['displacement_l']
+    df['fuel_efficiency'] = df['fuel_combined_mpg']
+    df['fuel_economy'] = df['fuel_combined_mpg']
+    if df['engine_size'].isna().all():
         print("Warning: No engine size data found")
-        df['engine_size'] = np.nan
-
-    if 'fuel economy' in df.columns:
-        df['fuel_efficiency'] = df['fuel economy'].apply(lambda x: x.get('combined', {}).get('mpg') if isinstance(x, dict) else x)
-    elif 'combined' in df.columns:
-        df['fuel_efficiency'] = df['combined']
-    else:
+    if df['fuel_efficiency'].isna().all():
         print("Warning: No fuel economy data found")
-        df['fuel_efficiency'] = np.nan
-
-    # 데이터 정제
-    df['engine'] = df['engine'].apply(lambda x: x.get('displacement') if isinstance(x, dict) else x)
-    df['engine'] = df['engine'].apply(clean_numeric)
-    
-    # fuel_economy 열이 딕셔너리인 경우 처리
-    df['fuel_economy'] = df['fuel_economy'].apply(lambda x: x.get('combined', {}).get('mpg') if isinstance(x, dict) else x)
-    df['fuel_economy'] = pd.to_numeric(df['fuel_economy'].apply(clean_numeric), errors='coerce')
     
     # fuel_type이 비어있거나 NaN인 경우 제거
     df = df[df['fuel_type'].notna() & (df['fuel_type'] != '')]    
@@ -266,11 +204,8 @@ def plot_fuel_economy_trend(df):
         print("Warning: No 'year' column found for fuel economy trend analysis")
 
 def main():
-    # 데이터 로드
-    data = load_all_data()
-    
     # DataFrame 생성
-    df = create_dataframe(data)
+    df = create_dataframe(dataset)
     
     # 데이터 확인
     print(df.head())
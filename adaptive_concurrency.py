@@ -0,0 +1,181 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Adaptive concurrency for the spec fetcher: AIMD on the number of requests in flight
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+
+from telemetry import get_telemetry
+
+DEFAULT_MIN = 1
+DEFAULT_MAX = 64
+DEFAULT_WINDOW = 20            # responses per decision
+DEFAULT_LATENCY_TOLERANCE = 1.5  # p95 over this multiple of the baseline counts as congestion
+DEFAULT_ERROR_THRESHOLD = 0.05   # share of 5xx/429/transport errors in a window
+DECREASE_FACTOR = 0.5
+INCREASE_STEP = 1
+BASELINE_DRIFT = 0.1  # the baseline follows a slower server by this fraction of the gap per window
+THROTTLE_STATUSES = (429, 503)
+
+
+def _p95(latencies):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+class AdaptiveLimit:
+    # Additive increase / multiplicative decrease on the in-flight limit. Every `window`
+    # responses the window is judged: too many errors or a p95 latency above the baseline
+    # (the best p95 seen, drifting up slowly) halves the limit; a healthy window in which
+    # the limit was actually reached raises it by one. A 429/503 cuts the limit at once
+    # instead of waiting for the window to fill, at most once per window.
+    #
+    # The politeness scheduler still caps the request rate per host; this only decides how
+    # many of the admitted requests may be on the wire together. Slots, responses and
+    # decisions are all handled on the fetching event loop.
+    def __init__(self, initial=8, minimum=DEFAULT_MIN, maximum=DEFAULT_MAX, window=DEFAULT_WINDOW,
+                 latency_tolerance=DEFAULT_LATENCY_TOLERANCE, error_threshold=DEFAULT_ERROR_THRESHOLD):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = min(self.maximum, max(minimum, initial))
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.inflight = 0
+        self.waiters = deque()
+        self._reset_window()
+        self.baseline = None
+        self.decisions = []  # (time, action, reason, old limit, new limit, p95, error rate)
+        get_telemetry().gauge('concurrency_limit', self.limit)
+
+    def _reset_window(self):
+        self.latencies = []
+        self.errors = 0
+        self.peak = self.inflight
+        self.cut = False
+
+    async def acquire(self):
+        if self.inflight < self.limit and not self.waiters:
+            self.inflight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    self.release()
+                raise
+        self.peak = max(self.peak, self.inflight)
+        get_telemetry().gauge('concurrency_inflight', self.inflight)
+
+    def release(self):
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self):
+        # Slots freed by a release or a raised limit go to the oldest waiters; the slot is
+        # counted here so a newcomer cannot take it first.
+        while self.waiters and self.inflight < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    def record(self, status, latency):
+        # One HTTP exchange; status None is a transport error or timeout.
+        error = status is None or status >= 500 or status == 429
+        self.latencies.append(latency)
+        self.errors += error
+        if status in THROTTLE_STATUSES and not self.cut:
+            self._decide('decrease', 'throttled')
+            self.cut = True
+        if len(self.latencies) >= self.window:
+            self._judge()
+            self._reset_window()
+
+    def _judge(self):
+        p95 = _p95(self.latencies)
+        error_rate = self.errors / len(self.latencies)
+        if self.baseline is None or p95 < self.baseline:
+            self.baseline = p95
+        get_telemetry().gauge('concurrency_p95_seconds', p95)
+        get_telemetry().gauge('concurrency_baseline_seconds', self.baseline)
+        if self.cut:
+            # Already cut for a throttle in this window; let the next one show the effect.
+            action, reason = 'hold', 'throttled'
+        elif error_rate > self.error_threshold:
+            action, reason = 'decrease', 'errors'
+        elif p95 > self.baseline * self.latency_tolerance:
+            action, reason = 'decrease', 'latency'
+        elif self.peak >= self.limit:
+            action, reason = 'increase', 'healthy'
+        else:
+            # The limit was not reached, so raising it would not tell us anything.
+            action, reason = 'hold', 'idle'
+        self._decide(action, reason, p95, error_rate)
+        self.baseline += max(0.0, p95 - self.baseline) * BASELINE_DRIFT
+
+    def _decide(self, action, reason, p95=None, error_rate=None):
+        old = self.limit
+        if action == 'decrease':
+            self.limit = max(self.minimum, int(self.limit * DECREASE_FACTOR))
+        elif action == 'increase':
+            self.limit = min(self.maximum, self.limit + INCREASE_STEP)
+        telemetry = get_telemetry()
+        telemetry.inc('concurrency_decisions_total', action=action, reason=reason)
+        telemetry.gauge('concurrency_limit', self.limit)
+        self.decisions.append((time.time(), action, reason, old, self.limit, p95, error_rate))
+        if self.limit != old:
+            details = f", p95 {p95 * 1000:.0f} ms, errors {error_rate:.1%}" if p95 is not None else ''
+            logging.info(f"Concurrency {old} -> {self.limit} ({action}: {reason}{details})")
+            # A raised limit hands out slots to waiters right away.
+            self._wake()
+
+    def summary(self):
+        limits = [new for _, _, _, _, new, _, _ in self.decisions] or [self.limit]
+        changes = sum(1 for _, _, _, old, new, _, _ in self.decisions if old != new)
+        return (f"limit {self.limit} (range {min(limits)}-{max(limits)}), {changes} changes over "
+                f"{len(self.decisions)} decisions")
+
+
+_controller = None
+
+
+def get_controller():
+    # None unless --adaptive was given; fetch_all then keeps its fixed concurrency.
+    return _controller
+
+
+def configure(initial=8, minimum=DEFAULT_MIN, maximum=DEFAULT_MAX, window=DEFAULT_WINDOW,
+              latency_tolerance=DEFAULT_LATENCY_TOLERANCE, error_threshold=DEFAULT_ERROR_THRESHOLD):
+    global _controller
+    _controller = AdaptiveLimit(initial, minimum, maximum, window, latency_tolerance, error_threshold)
+    return _controller
+
+
+def add_arguments(parser):
+    parser.add_argument('--adaptive', action='store_true',
+                        help='adapt the number of requests in flight to latency and errors, starting at --concurrency')
+    parser.add_argument('--min-concurrency', type=int, default=DEFAULT_MIN, help='lower bound for --adaptive')
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX, help='upper bound for --adaptive')
+
+
+def configure_from_args(args, initial):
+    if not args.adaptive:
+        return None
+    return configure(initial, args.min_concurrency, args.max_concurrency)
+
+
+def worker_arguments():
+    # Command-line flags that give a distributed worker the same controller settings.
+    if _controller is None:
+        return []
+    return ['--adaptive', '--min-concurrency', str(_controller.minimum), '--max-concurrency', str(_controller.maximum)]
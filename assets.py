@@ -0,0 +1,287 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Asset stage: brand logos and model images downloaded into a content-addressed store, plus thumbnails
+# Usage: python assets.py [--concurrency 16] [--thumbnail-size 320] [--thumbnail-workers 4]
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import adaptive_concurrency
+from async_fetch import fetch_all
+import politeness
+import profiling
+import telemetry
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SITE = 'https://www.autoevolution.com'
+ASSET_DIR = 'assets'
+ASSET_MAP = 'asset_map.csv'
+DEFAULT_THUMBNAIL_SIZE = 320
+MAX_ATTEMPTS = 3  # failed URLs are tried again on later runs up to this many times
+
+# (CSV written by stages 01-03, column holding an image URL)
+SOURCES = [
+    ('manufacturers.csv', 'logo_url'),
+    ('all_brand_models.csv', 'image_url'),
+    ('detailed_model_info.csv', 'image_url'),
+]
+
+# File signatures; the extension only matters to whoever serves the files.
+SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'RIFF', '.webp'),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    digest TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+
+def absolute(url):
+    if url.startswith('//'):
+        return 'https:' + url
+    if url.startswith('/'):
+        return SITE + url
+    return url
+
+
+def collect_urls(sources=SOURCES):
+    # Every distinct image URL referenced by the CSVs that exist, in first-seen order.
+    urls = {}
+    for path, column in sources:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                url = (row.get(column) or '').strip()
+                if url and url != 'N/A':
+                    urls.setdefault(absolute(url), None)
+    return list(urls)
+
+
+def sniff(content):
+    head = content[:16]
+    for signature, ext in SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if b'<svg' in content[:512].lower():
+        return '.svg'
+    return '.bin'
+
+
+def object_path(digest, ext, directory=ASSET_DIR):
+    # Two levels of 256 shards keep every directory small with hundreds of thousands of files.
+    return os.path.join(directory, 'objects', digest[:2], digest[2:4], digest + ext)
+
+
+def thumbnail_path(digest, size, directory=ASSET_DIR):
+    return os.path.join(directory, 'thumbs', str(size), digest[:2], digest[2:4], digest + '.jpg')
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def make_thumbnail(source, destination, size):
+    # Runs in a worker process. Returns the destination, or None for files Pillow cannot read.
+    try:
+        with Image.open(source) as image:
+            image.thumbnail((size, size))
+            if image.mode not in ('RGB', 'L'):
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image.convert('RGBA'), mask=image.convert('RGBA').split()[-1])
+                image = background
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            tmp = f"{destination}.{os.getpid()}.tmp"
+            image.save(tmp, 'JPEG', quality=85, optimize=True)
+            os.replace(tmp, destination)
+        return destination
+    except (OSError, ValueError):
+        return None
+
+
+class AssetStore:
+    # URL -> content digest in SQLite, bodies stored once per digest however many URLs
+    # point at them. A URL that was downloaded once is never fetched again, so a monthly
+    # run only downloads images that are new to the site.
+    def __init__(self, directory=ASSET_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, 'assets.sqlite'))
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        self.stats = {'cached': 0, 'downloaded': 0, 'duplicates': 0, 'failed': 0, 'thumbnails': 0}
+
+    def close(self):
+        self.db.close()
+
+    def pending(self, urls):
+        # URLs without a stored object, skipping those that have failed too often.
+        known = {url: (digest, attempts) for url, digest, attempts in self.db.execute(
+            "SELECT url, digest, attempts FROM urls")}
+        objects = {digest: ext for digest, ext in self.db.execute("SELECT digest, ext FROM objects")}
+        pending = []
+        for url in urls:
+            digest, attempts = known.get(url, (None, 0))
+            if digest in objects and os.path.exists(object_path(digest, objects[digest], self.directory)):
+                self.stats['cached'] += 1
+            elif attempts < MAX_ATTEMPTS:
+                pending.append(url)
+        return pending
+
+    def store_body(self, content):
+        # Called from the fetch engine's parse threads: hash the body and write it unless an
+        # identical file is already there.
+        digest = hashlib.sha256(content).hexdigest()
+        ext = sniff(content)
+        path = object_path(digest, ext, self.directory)
+        exists = os.path.exists(path)
+        if not exists:
+            _write_atomic(path, content)
+        return digest, ext, len(content), exists
+
+    def record(self, url, stored, error):
+        with self.db:
+            if error is not None:
+                self.stats['failed'] += 1
+                self.db.execute("""
+                    INSERT INTO urls (url, attempts, error, fetched_at) VALUES (?, 1, ?, ?)
+                    ON CONFLICT (url) DO UPDATE SET attempts = attempts + 1, error = excluded.error,
+                                                    fetched_at = excluded.fetched_at""",
+                                (url, str(error)[:500], time.time()))
+                return
+            digest, ext, size, existed = stored
+            self.stats['duplicates' if existed else 'downloaded'] += 1
+            self.db.execute("INSERT OR IGNORE INTO objects (digest, ext, size) VALUES (?, ?, ?)", (digest, ext, size))
+            self.db.execute("""
+                INSERT INTO urls (url, digest, attempts, error, fetched_at) VALUES (?, ?, 0, NULL, ?)
+                ON CONFLICT (url) DO UPDATE SET digest = excluded.digest, attempts = 0, error = NULL,
+                                                fetched_at = excluded.fetched_at""",
+                            (url, digest, time.time()))
+
+    def objects(self):
+        return self.db.execute("SELECT digest, ext FROM objects").fetchall()
+
+    def make_thumbnails(self, size, workers=None):
+        # Only objects without a thumbnail of this size are resized; SVG and unknown files are skipped.
+        if Image is None:
+            print("Pillow is not installed; skipping thumbnails (pip install Pillow)")
+            return 0
+        todo = [(object_path(digest, ext, self.directory), thumbnail_path(digest, size, self.directory))
+                for digest, ext in self.objects()
+                if ext not in ('.svg', '.bin') and not os.path.exists(thumbnail_path(digest, size, self.directory))]
+        if not todo:
+            return 0
+        telemetry.get_telemetry().add_items('thumbnail', len(todo))
+        made = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(make_thumbnail, source, destination, size) for source, destination in todo]
+            for future in futures:
+                if future.result() is not None:
+                    made += 1
+                telemetry.get_telemetry().item_done('thumbnail')
+        self.stats['thumbnails'] += made
+        return made
+
+    def write_map(self, urls, path=ASSET_MAP, size=DEFAULT_THUMBNAIL_SIZE):
+        # What the product UI serves instead of hot-linking: original URL -> local files.
+        objects = dict(self.objects())
+        digests = dict(self.db.execute("SELECT url, digest FROM urls WHERE digest IS NOT NULL"))
+        with open(path + '.part', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['url', 'digest', 'path', 'thumbnail'])
+            for url in urls:
+                digest = digests.get(url)
+                if digest is None or digest not in objects:
+                    continue
+                thumbnail = thumbnail_path(digest, size, self.directory)
+                writer.writerow([url, digest, object_path(digest, objects[digest], self.directory),
+                                 thumbnail if os.path.exists(thumbnail) else ''])
+        os.replace(path + '.part', path)
+
+    def summary(self):
+        return ', '.join(f"{count} {name}" for name, count in self.stats.items())
+
+
+def download(store, urls, concurrency):
+    telemetry.get_telemetry().add_items('asset', len(urls))
+
+    def on_result(url, stored, error):
+        if error is not None:
+            print(f"Failed to download {url}: {error}")
+        store.record(url, stored, error)
+        telemetry.get_telemetry().item_done('asset')
+
+    asyncio.run(fetch_all(((url, url) for url in urls), store.store_body, on_result, concurrency=concurrency,
+                          headers={'User-Agent': 'Mozilla/5.0', 'Referer': SITE + '/'}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download brand logos and model images and make thumbnails')
+    parser.add_argument('--concurrency', type=int, default=16, help='maximum number of downloads in flight')
+    parser.add_argument('--rate', type=float, default=politeness.DEFAULT_MAX_RATE,
+                        help='request-rate ceiling per host in requests per second')
+    parser.add_argument('--asset-dir', default=ASSET_DIR, help='content-addressed store for the images')
+    parser.add_argument('--thumbnail-size', type=int, default=DEFAULT_THUMBNAIL_SIZE,
+                        help='longest side of the thumbnails in pixels (0 for none)')
+    parser.add_argument('--thumbnail-workers', type=int, default=None, help='processes resizing images')
+    adaptive_concurrency.add_arguments(parser)
+    telemetry.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    scheduler = politeness.configure(max_rate=args.rate)
+    telemetry.configure_from_args(args, 'assets')
+    profiling.configure_from_args(args, 'assets')
+    adaptive_concurrency.configure_from_args(args, args.concurrency)
+
+    store = AssetStore(args.asset_dir)
+    try:
+        urls = collect_urls()
+        pending = store.pending(urls)
+        print(f"{len(urls)} image URLs, {len(pending)} to download")
+        if pending:
+            download(store, pending, args.concurrency)
+        if args.thumbnail_size:
+            store.make_thumbnails(args.thumbnail_size, args.thumbnail_workers)
+        store.write_map(urls, size=args.thumbnail_size)
+        print(f"Asset map saved to {ASSET_MAP}")
+    finally:
+        store.close()
+
+    print(f"Assets: {store.summary()}")
+    print(f"Requests: {scheduler.summary()}")
+    print(f"Telemetry: {telemetry.finish()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Asynchronous fetch engine shared by the spec crawling stages
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from adaptive_concurrency import get_controller
+from http_cache import CacheMiss, cache_key
+from http_client import RETRY_STATUSES
+from politeness import MAX_THROTTLE_RETRIES, get_scheduler
+from telemetry import get_telemetry, trace_config
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Referer': 'https://www.autoevolution.com/',
+    'DNT': '1',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+async def fetch_bytes(session, url, scheduler, headers=None, retries=3, backoff_factor=0.3, timeout=10,
+                      controller=None):
+    # Returns (status, body, headers) or raises the last error once retries are exhausted.
+    # 429/503 are handed to the scheduler, which slows the host down before we try again.
+    # With an adaptive_concurrency controller each attempt holds one of its slots while it
+    # is on the wire, and its latency and status feed the controller's next decision. The
+    # slot is taken before the politeness token, so requests queued behind the concurrency
+    # limit do not hold tokens and then go out in a burst.
+    attempt = 0
+    throttled = 0
+    while True:
+        if controller is not None:
+            await controller.acquire()
+        try:
+            await scheduler.acquire_async(url)
+        except BaseException:
+            if controller is not None:
+                controller.release()
+            raise
+        started = time.monotonic()
+        ttfb = None
+        try:
+            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                ttfb = time.monotonic() - started
+                body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            scheduler.record(url, None, elapsed=time.monotonic() - started)
+            get_telemetry().request(None, total=time.monotonic() - started, ttfb=ttfb)
+            if controller is not None:
+                controller.record(None, time.monotonic() - started)
+                controller.release()
+            if attempt >= retries:
+                raise
+            get_telemetry().inc('retries_total', reason='error')
+            await asyncio.sleep(backoff_factor * (2 ** attempt))
+            attempt += 1
+            continue
+        except BaseException:
+            if controller is not None:
+                controller.release()
+            raise
+
+        elapsed = time.monotonic() - started
+        get_telemetry().request(response.status, len(body), elapsed, ttfb)
+        if controller is not None:
+            controller.record(response.status, elapsed)
+            controller.release()
+        backoff = scheduler.record(url, response.status, response.headers, elapsed)
+        if backoff is not None and throttled < MAX_THROTTLE_RETRIES:
+            throttled += 1
+            get_telemetry().inc('retries_total', reason='throttled')
+            continue
+        if response.status in RETRY_STATUSES and attempt < retries:
+            get_telemetry().inc('retries_total', reason='status')
+            await asyncio.sleep(backoff_factor * (2 ** attempt))
+            attempt += 1
+            continue
+        response.raise_for_status()
+        return response.status, body, response.headers
+
+
+async def fetch_cached(session, url, scheduler, cache, loop, revalidate=False, **kwargs):
+    # Same contract as http_cache.cached_get: fresh entries skip the network, stale ones are
+    # revalidated, and offline mode only ever reads from disk. With revalidate=True every
+    # cached entry is revalidated regardless of its TTL. Disk I/O runs on the loop's default
+    # thread pool.
+    entry = await loop.run_in_executor(None, cache.lookup, url)
+    body = await loop.run_in_executor(None, cache.read_body, entry) if entry else None
+    if body is not None and (cache.offline or (not revalidate and cache.is_fresh(entry))):
+        cache.stats['fresh'] += 1
+        return body
+    if cache.offline:
+        cache.stats['missed'] += 1
+        raise CacheMiss(f"Not in cache (offline mode): {url}")
+
+    headers = cache.conditional_headers(entry) if body is not None else None
+    status, content, response_headers = await fetch_bytes(session, url, scheduler, headers=headers, **kwargs)
+    if status == 304 and body is not None:
+        await loop.run_in_executor(None, cache.touch, entry, response_headers)
+        cache.stats['revalidated'] += 1
+        return body
+    await loop.run_in_executor(None, cache.store, url, content, response_headers)
+    cache.stats['downloaded'] += 1
+    return content
+
+
+async def fetch_all(jobs, parse, on_result, concurrency=16, scheduler=None, cache=None, revalidate=False,
+                    headers=None, timeout=10, retries=3, parse_executor=None, parse_workers=None, controller=None):
+    # jobs: iterable of (key, url). on_result(key, parsed, error) is called on the loop thread.
+    # Pass an http_cache.ResponseCache as `cache` to serve and revalidate pages from disk.
+    # With an adaptive_concurrency controller (the configured one by default) `concurrency`
+    # only sizes the parse side; requests in flight follow the controller's limit, up to its
+    # maximum.
+    #
+    # Fetching and parsing are separate stages: fetchers push raw bodies into a bounded queue
+    # and `parse_workers` parse tasks drain it into `parse_executor` (a thread pool by default,
+    # a ProcessPoolExecutor to parse on every core). When parsing falls behind the queue fills
+    # up and the fetchers wait, so pages are never buffered without bound.
+    #
+    # An exception raised by on_result (a failed journal or file write) stops every task and
+    # is re-raised from fetch_all, instead of leaving the queues undrained.
+    scheduler = scheduler or get_scheduler()
+    controller = controller or get_controller()
+    loop = asyncio.get_running_loop()
+    parse_workers = parse_workers or concurrency
+    fetchers_count = controller.maximum if controller is not None else concurrency
+    own_executor = parse_executor is None
+    executor = parse_executor or ThreadPoolExecutor(max_workers=parse_workers)
+    jobs_queue = asyncio.Queue(maxsize=fetchers_count * 2)
+    bodies_queue = asyncio.Queue(maxsize=parse_workers * 2)
+    connector = aiohttp.TCPConnector(limit=fetchers_count, limit_per_host=fetchers_count)
+    # Engines of one generation share a spec page; concurrent jobs for the same page share one download.
+    inflight = {}
+    telemetry = get_telemetry()
+
+    async def load(session, url):
+        if cache is not None:
+            return await fetch_cached(session, url, scheduler, cache, loop, revalidate=revalidate,
+                                      retries=retries, timeout=timeout, controller=controller)
+        status, body, _ = await fetch_bytes(session, url, scheduler, retries=retries, timeout=timeout,
+                                            controller=controller)
+        return body
+
+    def load_shared(session, url):
+        page = cache_key(url)
+        task = inflight.get(page)
+        if task is None:
+            task = inflight[page] = asyncio.ensure_future(load(session, url))
+            task.add_done_callback(lambda _: inflight.pop(page, None))
+        return task
+
+    async def fetcher(session):
+        while True:
+            job = await jobs_queue.get()
+            if job is None:
+                return
+            key, url = job
+            telemetry.gauge('queue_depth', jobs_queue.qsize(), queue='fetch')
+            try:
+                body = await load_shared(session, url)
+            except Exception as e:
+                on_result(key, None, e)
+                continue
+            await bodies_queue.put((key, body))
+
+    async def parser():
+        while True:
+            item = await bodies_queue.get()
+            if item is None:
+                return
+            key, body = item
+            telemetry.gauge('queue_depth', bodies_queue.qsize(), queue='parse')
+            try:
+                parsed = await loop.run_in_executor(executor, parse, body)
+            except Exception as e:
+                on_result(key, None, e)
+                continue
+            on_result(key, parsed, None)
+
+    async def feed(fetchers, parsers):
+        for job in jobs:
+            await jobs_queue.put(job)
+        for _ in fetchers:
+            await jobs_queue.put(None)
+        await asyncio.gather(*fetchers)
+        for _ in parsers:
+            await bodies_queue.put(None)
+
+    try:
+        async with aiohttp.ClientSession(headers=headers or DEFAULT_HEADERS, connector=connector,
+                                         trace_configs=[trace_config()]) as session:
+            fetchers = [asyncio.create_task(fetcher(session)) for _ in range(fetchers_count)]
+            parsers = [asyncio.create_task(parser()) for _ in range(parse_workers)]
+            tasks = [asyncio.create_task(feed(fetchers, parsers)), *fetchers, *parsers]
+            try:
+                # gather raises as soon as any task fails; the others would wait on the queues forever.
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks + list(inflight.values()):
+                    task.cancel()
+                await asyncio.gather(*tasks, *inflight.values(), return_exceptions=True)
+                raise
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
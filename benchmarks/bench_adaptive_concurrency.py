@@ -0,0 +1,85 @@
+########################################################################################################################
+# Adaptive concurrency against a simulated server: fixed limits vs the AIMD controller
+# Usage: python benchmarks/bench_adaptive_concurrency.py [--capacity 12] [--throttle-at 24] [--requests 3000]
+# The server answers in `latency` while fewer than `capacity` requests are in flight, queues beyond that
+# (latency grows with the backlog) and answers 429 once `throttle-at` requests are in flight.
+########################################################################################################################
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adaptive_concurrency import AdaptiveLimit
+
+
+class SimulatedServer:
+    def __init__(self, capacity, throttle_at, latency):
+        self.capacity = capacity
+        self.throttle_at = throttle_at
+        self.latency = latency
+        self.inflight = 0
+
+    async def get(self):
+        self.inflight += 1
+        try:
+            if self.inflight > self.throttle_at:
+                await asyncio.sleep(self.latency / 4)
+                return 429
+            await asyncio.sleep(self.latency * max(1.0, self.inflight / self.capacity))
+            return 200
+        finally:
+            self.inflight -= 1
+
+
+async def run(server, requests, fixed=None, controller=None):
+    # Every request is retried until it succeeds, the way fetch_bytes retries throttled pages.
+    pending = iter(range(requests))
+    throttled = [0]
+    workers = fixed or controller.maximum
+
+    async def worker():
+        for _ in pending:
+            while True:
+                if controller is not None:
+                    await controller.acquire()
+                started = time.monotonic()
+                status = await server.get()
+                if controller is not None:
+                    controller.record(status, time.monotonic() - started)
+                    controller.release()
+                if status == 200:
+                    break
+                throttled[0] += 1
+                await asyncio.sleep(server.latency)
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return requests / (time.monotonic() - started), throttled[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--capacity', type=int, default=12, help='requests the server handles without slowing down')
+    parser.add_argument('--throttle-at', type=int, default=24, help='requests in flight that trigger 429s')
+    parser.add_argument('--latency', type=float, default=0.01, help='unloaded response time in seconds')
+    parser.add_argument('--requests', type=int, default=3000)
+    args = parser.parse_args()
+
+    for fixed in (4, args.capacity, args.throttle_at * 2):
+        server = SimulatedServer(args.capacity, args.throttle_at, args.latency)
+        rate, throttled = asyncio.run(run(server, args.requests, fixed=fixed))
+        print(f"fixed {fixed:>3}:        {rate:8.0f} req/s, {throttled:5d} throttled")
+
+    for initial in (2, args.throttle_at * 2):
+        server = SimulatedServer(args.capacity, args.throttle_at, args.latency)
+        controller = AdaptiveLimit(initial=initial, maximum=64)
+        rate, throttled = asyncio.run(run(server, args.requests, controller=controller))
+        print(f"adaptive from {initial:>3}: {rate:8.0f} req/s, {throttled:5d} throttled, {controller.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+########################################################################################################################
+# Wall-clock comparison of the sequential spec fetch loop and async_fetch.fetch_all
+# Usage: python benchmarks/bench_async_fetch.py --requests 200 --latency 0.5 --rate 30
+########################################################################################################################
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_fetch import fetch_all
+from politeness import PolitenessScheduler
+from stub_server import start_stub_server
+
+
+def run_sequential(urls, rate):
+    # The old process_brand loop: one request at a time, never faster than the rate budget.
+    session = requests.Session()
+    interval = 1.0 / rate
+    done = 0
+    for url in urls:
+        started = time.monotonic()
+        response = session.get(url, timeout=10)
+        len(response.content)
+        done += 1
+        wait = interval - (time.monotonic() - started)
+        if wait > 0:
+            time.sleep(wait)
+    return done
+
+
+def run_async(urls, rate, concurrency):
+    done = []
+    scheduler = PolitenessScheduler(max_rate=rate, burst=1)
+    asyncio.run(fetch_all(enumerate(urls), len, lambda key, parsed, error: done.append(error is None),
+                          concurrency=concurrency, scheduler=scheduler))
+    print(f"scheduler:  {scheduler.summary()}")
+    return sum(done)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--rate', type=float, default=30.0)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    urls = [f"{base_url}/engines/{i}.html" for i in range(args.requests)]
+    try:
+        started = time.monotonic()
+        ok = run_sequential(urls, args.rate)
+        sequential = time.monotonic() - started
+        print(f"sequential: {ok} pages in {sequential:.2f}s ({ok / sequential:.1f} req/s)")
+
+        started = time.monotonic()
+        ok = run_async(urls, args.rate, args.concurrency)
+        concurrent = time.monotonic() - started
+        print(f"async:      {ok} pages in {concurrent:.2f}s ({ok / concurrent:.1f} req/s)")
+        print(f"speed-up:   {sequential / concurrent:.1f}x at a budget of {args.rate:g} req/s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+########################################################################################################################
+# Bulk import of historical brand_specs snapshots into the spec store: serial sync vs parallel upsert
+# Usage: python benchmarks/bench_bulk_import.py [--snapshots 3] [--brands 60] [--workers 4]
+# The snapshots are legacy pretty-printed {brand}_specs.json files written to a temporary directory.
+########################################################################################################################
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spec_store import SpecStore, _int, bulk_import, ijson
+
+FUELS = ('DIESEL', 'GASOLINE', 'HYBRID', 'ELECTRIC')
+SECTIONS = {
+    'engine': ('cylinders', 'displacement', 'power', 'torque', 'fuel system', 'fuel'),
+    'performance': ('top speed', 'acceleration 0-62 mph (0-100 kph)'),
+    'fuel economy (nedc)': ('city', 'highway', 'combined', 'co2 emissions'),
+    'dimensions': ('length', 'width', 'height', 'wheelbase'),
+    'weight': ('unladen weight', 'gross weight limit'),
+}
+
+
+def write_snapshot(directory, snapshot, brands, models, engines):
+    rng = random.Random(snapshot)
+    os.makedirs(directory)
+    for b in range(brands):
+        brand = f'BRAND{b}'
+        records = []
+        for m in range(models):
+            # A spec page carries every engine of the generation; each record repeats it.
+            blocks = [{'engine_name': f'{e} engine', **{section: {key: f'{rng.randint(1, 9999)} unit' for key in keys}
+                                                        for section, keys in SECTIONS.items()}}
+                      for e in range(engines)]
+            for e in range(engines):
+                records.append({'brand': brand, 'model_name': f'Model {m}', 'fuel_type': rng.choice(FUELS),
+                                'engine_name': f'{e} engine', 'horsepower': f'{rng.randint(60, 650)} HP',
+                                'image_url': '', 'sub_link': f'/cars/{brand}-{m}.html#aeng_{e}', 'specs': blocks})
+        with open(os.path.join(directory, f'{brand}_specs.json'), 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+
+
+def check_sync_keeps_history(tmp, store_path, args):
+    # import -> sync -> query: a sync of the current brand files (one brand and half the
+    # models fewer) must keep every imported engine, and the current ones stay queryable.
+    current = os.path.join(tmp, 'current', 'brand_specs')
+    write_snapshot(current, args.snapshots, args.brands - 1, args.models // 2, args.engines)
+    store = SpecStore(store_path)
+    imported = store.counts()['engines']
+    failures = []
+    stats = store.sync(current)
+    if stats['removed']:
+        failures.append(f"sync removed {stats['removed']} brands that were only imported")
+    if store.counts()['engines'] != imported:
+        failures.append(f"sync dropped imported engines: {imported} -> {store.counts()['engines']}")
+    expected = (args.brands - 1) * (args.models // 2) * args.engines
+    if len(store.query(current=True)) != expected:
+        failures.append(f"{len(store.query(current=True))} current engines, expected {expected}")
+    if not store.query(brand=f'BRAND{args.brands - 1}'):
+        failures.append("the brand only found in snapshots is gone")
+    if store.sync(current)['loaded']:
+        failures.append("a second sync reloaded unchanged brand files")
+    store.close()
+    return failures
+
+
+def check_newest_wins(store_path, newest):
+    # The snapshots are handed to bulk_import newest first; the store must still hold the
+    # newest snapshot's values.
+    with open(os.path.join(newest, 'BRAND0_specs.json'), 'r', encoding='utf-8') as f:
+        record = json.load(f)[0]
+    store = SpecStore(store_path)
+    engines = store.engines(record['sub_link'])
+    store.close()
+    if [engine['horsepower'] for engine in engines] != [_int(record['horsepower'])]:
+        return [f"{record['sub_link']}: {[engine['horsepower'] for engine in engines]} HP imported, "
+                f"{record['horsepower']} in the newest snapshot"]
+    return []
+
+
+def peak_rss_mb(who):
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snapshots', type=int, default=3)
+    parser.add_argument('--brands', type=int, default=60)
+    parser.add_argument('--models', type=int, default=20)
+    parser.add_argument('--engines', type=int, default=6)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    print(f"ijson: {'yes' if ijson is not None else 'no (legacy files are loaded whole)'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directories = []
+        for snapshot in range(args.snapshots):
+            directory = os.path.join(tmp, f'2023-{snapshot + 1:02d}', 'brand_specs')
+            write_snapshot(directory, snapshot, args.brands, args.models, args.engines)
+            directories.append(directory)
+        size = sum(os.path.getsize(os.path.join(d, name)) for d in directories for name in os.listdir(d))
+        print(f"{args.snapshots} snapshots, {size / 2 ** 20:.0f} MiB of brand files")
+
+        store = SpecStore(os.path.join(tmp, 'serial.sqlite'))
+        started = time.perf_counter()
+        for directory in directories:
+            store.sync(directory)
+        serial = time.perf_counter() - started
+        counts = store.counts()
+        store.close()
+        print(f"serial sync:        {serial:6.2f}s  {counts}  peak RSS {peak_rss_mb(resource.RUSAGE_SELF):.0f} MiB")
+
+        for workers in sorted({1, args.workers}):
+            path = os.path.join(tmp, f'bulk{workers}.sqlite')
+            started = time.perf_counter()
+            bulk_import(path, directories[::-1], workers)
+            elapsed = time.perf_counter() - started
+            store = SpecStore(path)
+            counts = store.counts()
+            store.close()
+            print(f"bulk, {workers:>2} workers:   {elapsed:6.2f}s  {counts}  "
+                  f"peak worker RSS {peak_rss_mb(resource.RUSAGE_CHILDREN):.0f} MiB")
+
+        failures = check_newest_wins(path, directories[-1]) + check_sync_keeps_history(tmp, path, args)
+        if failures:
+            sys.exit('\n'.join(failures))
+        print("import -> sync -> query: newest snapshot wins, imported engines kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+########################################################################################################################
+# Scaling of the distributed spec crawl over 1, 2, 4, ... local worker processes
+# Usage: python benchmarks/bench_distributed.py --pages 400 --rate 20 --workers 1 2 4
+# Every worker has its own --rate budget, so throughput should grow close to linearly with
+# the number of workers until the stub server or the box runs out of headroom.
+########################################################################################################################
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from distributed import coordinate
+from jsonl_store import brand_files, iter_all_records
+from stub_server import start_stub_server
+
+
+def make_models(pages, brands=10):
+    return [{
+        'brand': f"BRAND{i % brands}",
+        'model_name': f"MODEL {i}",
+        'fuel_type': 'GASOLINE',
+        'engine_name': f"1.{i % 9}L",
+        'horsepower': f"{90 + i % 100} HP",
+        'image_url': '',
+        'sub_link': f"/cars/page-{i}.html#aeng_{i}",
+    } for i in range(pages)]
+
+
+def run(workers, models, base_url, rate, concurrency):
+    # Fresh journal, cache and brand directory per run, so nothing is served from disk.
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            started = time.monotonic()
+            coordinate(models, f"bench-{workers}", workers, 'journal.sqlite', concurrency, rate,
+                       cache_dir='http_cache', site=base_url)
+            elapsed = time.monotonic() - started
+            written = sum(1 for _ in iter_all_records())
+            brands = len(brand_files())
+        finally:
+            os.chdir(cwd)
+    return elapsed, written, brands
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--rate', type=float, default=20.0, help='request-rate budget of each worker')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    models = make_models(args.pages)
+    results = []
+    try:
+        for workers in args.workers:
+            elapsed, written, brands = run(workers, models, base_url, args.rate, args.concurrency)
+            results.append((workers, written / elapsed))
+            print(f"{workers} workers: {written} records in {brands} brand files, {elapsed:.2f}s "
+                  f"({written / elapsed:.1f} pages/s)")
+    finally:
+        server.shutdown()
+
+    base_workers, base_rate = results[0]
+    for workers, rate in results[1:]:
+        speedup = rate / base_rate
+        print(f"{workers} workers: {speedup:.2f}x ({speedup / (workers / base_workers):.0%} of linear)")
+
+
+if __name__ == "__main__":
+    main()
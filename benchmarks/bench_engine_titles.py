@@ -0,0 +1,136 @@
+########################################################################################################################
+# Engine title throughput: the per-link regexes stage 03 used to build vs engine_titles.parse_engine_title
+# Usage: python benchmarks/bench_engine_titles.py [--csv detailed_model_info.csv] [--models 2000] [--repeat 20]
+# With --csv the titles are rebuilt from a crawled detailed_model_info.csv ("BRAND MODEL engine (N HP)");
+# otherwise a sample of titles as they appear on autoevolution model pages is spread over --models model
+# names, since a full crawl goes through thousands of models and re's own 512-pattern cache cycles.
+########################################################################################################################
+
+import argparse
+import csv
+import logging
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine_titles import TITLE_FIELDS, parse_engine_title
+
+SAMPLE_TITLES = [
+    ('BMW', '3 Series Sedan', 'BMW 3 Series Sedan 330i xDrive 8AT (258 HP)'),
+    ('BMW', '3 Series Sedan', 'BMW 3 Series Sedan 320d 6MT RWD (190 HP)'),
+    ('AUDI', 'A4 Avant', 'AUDI A4 Avant 2.0 TFSI quattro S tronic (252 HP)'),
+    ('AUDI', 'A4 Avant', 'AUDI A4 Avant 35 TDI S tronic (163 HP)'),
+    ('VOLKSWAGEN', 'Golf', 'VOLKSWAGEN Golf 1.5 eTSI 7-speed DSG / 110 kW (150 HP)'),
+    ('VOLKSWAGEN', 'Golf', 'VOLKSWAGEN Golf 2.0L TDI 4MOTION 7DCT AWD (200 HP)'),
+    ('MERCEDES-BENZ', 'C-Class', 'MERCEDES-BENZ C-Class C 300 4MATIC 9G-TRONIC (258 HP)'),
+    ('TOYOTA', 'Prius', 'TOYOTA Prius 1.8L Hybrid e-CVT FWD (122 HP)'),
+    ('FORD', 'Mustang', 'FORD Mustang 5.0L V8 10AT RWD (450 HP)'),
+    ('FORD', 'Mustang', 'FORD Mustang 2.3L EcoBoost 6MT (314 HP)'),
+    ('TESLA', 'Model 3', 'TESLA Model 3 Long Range AWD (498 HP)'),
+    ('PORSCHE', '911 Carrera', 'PORSCHE 911 Carrera 3.0L 7MT (385 HP)'),
+    ('PORSCHE', '911 Carrera', 'PORSCHE 911 Carrera 4S 3.0L PDK AWD (450 HP)'),
+    ('RENAULT', 'Clio', 'RENAULT Clio 1.0 TCe 5MT (91 HP)'),
+    ('RENAULT', 'Clio', 'RENAULT Clio 1.3 TCe EDC (131 HP)'),
+    ('SUBARU', 'Outback', 'SUBARU Outback 2.5L Lineartronic CVT AWD (169 HP)'),
+    ('JEEP', 'Wrangler', 'JEEP Wrangler 2.0L Turbo 8AT 4WD (272 HP)'),
+    ('DACIA', 'Duster', 'DACIA Duster 1.5 dCi 6MT 4x4 (115 HP)'),
+    ('LADA', 'Niva', 'LADA Niva 1.7L 5MT'),
+    ('KIA', 'EV6', 'KIA EV6 77.4 kWh AWD (325 HP)'),
+    ('HYUNDAI', 'Kona Electric', 'HYUNDAI Kona Electric 64.8kWh 1AT FWD (204 HP)'),
+    ('BMW', 'i3', 'BMW i3 42.2 kWh 120Ah RWD (170 HP)'),
+]
+
+# Expected title_displacement_l per sample; the check fails the run on any mismatch.
+DISPLACEMENT_CASES = {
+    'BMW 3 Series Sedan 330i xDrive 8AT (258 HP)': '',
+    'AUDI A4 Avant 2.0 TFSI quattro S tronic (252 HP)': '2.0',
+    'VOLKSWAGEN Golf 1.5 eTSI 7-speed DSG / 110 kW (150 HP)': '1.5',
+    'VOLKSWAGEN Golf 2.0L TDI 4MOTION 7DCT AWD (200 HP)': '2.0',
+    'FORD Mustang 5.0L V8 10AT RWD (450 HP)': '5.0',
+    'TESLA Model 3 Long Range AWD (498 HP)': '',
+    'LADA Niva 1.7L 5MT': '1.7',
+    'KIA EV6 77.4 kWh AWD (325 HP)': '',
+    'HYUNDAI Kona Electric 64.8kWh 1AT FWD (204 HP)': '',
+    'BMW i3 42.2 kWh 120Ah RWD (170 HP)': '',
+}
+
+
+def legacy(title, brand, model_name):
+    # The loop body extract_model_info ran for every engine link before engine_titles.
+    engine_info = title.strip()
+    engine_info = re.sub(r'\s*/\s*', ' ', engine_info)
+    engine_info = re.sub(r'^' + re.escape(brand) + r'\s+' + re.escape(model_name) + r'\s+', '', engine_info)
+    engine_match = re.search(r'(.*?)\s*\((\d+)\s*HP\)$', engine_info)
+    if engine_match:
+        return engine_match.group(1).strip(), engine_match.group(2) + " HP"
+    logging.info(f"Unmatched engine info: {engine_info}")
+    return engine_info, "N/A"
+
+
+def load_titles(path):
+    titles = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            hp = f" ({row['horsepower']})" if row['horsepower'] != 'N/A' else ''
+            titles.append((row['brand'], row['model_name'], f"{row['brand']} {row['model_name']} {row['engine_name']}{hp}"))
+    return titles
+
+
+def spread(titles, models):
+    # The same titles under `models` distinct model names ("Golf", "Golf 2", ...).
+    spread_titles = []
+    for index in range(models):
+        suffix = f" {index + 1}" if index else ''
+        for brand, model_name, title in titles:
+            name = model_name + suffix
+            spread_titles.append((brand, name, title.replace(f"{brand} {model_name} ", f"{brand} {name} ", 1)))
+    return spread_titles
+
+
+def measure(parse, titles, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for brand, model_name, title in titles:
+            parse(title, brand, model_name)
+    return len(titles) * repeat / (time.perf_counter() - started)
+
+
+def check():
+    failures = []
+    for brand, model_name, title in SAMPLE_TITLES:
+        if title in DISPLACEMENT_CASES:
+            found = parse_engine_title(title, brand, model_name)['title_displacement_l']
+            if found != DISPLACEMENT_CASES[title]:
+                failures.append(f"{title!r}: displacement {found!r}, expected {DISPLACEMENT_CASES[title]!r}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', help='detailed_model_info.csv to take titles from')
+    parser.add_argument('--models', type=int, default=2000, help='model names to spread the sample titles over')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    failures = check()
+    if failures:
+        sys.exit('\n'.join(failures))
+
+    titles = load_titles(args.csv) if args.csv else spread(SAMPLE_TITLES, args.models)
+    before = measure(legacy, titles, args.repeat)
+    after = measure(parse_engine_title, titles, args.repeat)
+    print(f"{len(titles)} titles x {args.repeat}")
+    print(f"per-link regexes: {before:10.0f} titles/s (engine_name, horsepower)")
+    print(f"engine_titles:    {after:10.0f} titles/s (+ {', '.join(TITLE_FIELDS)})")
+
+    parsed = [parse_engine_title(title, brand, model_name) for brand, model_name, title in titles]
+    for field in TITLE_FIELDS:
+        found = sum(1 for row in parsed if row[field])
+        print(f"  {field:<22}{found:>6} / {len(parsed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+########################################################################################################################
+# Connection reuse: a bare requests.get per page vs the pooled keep-alive http_client
+# Usage: python benchmarks/bench_http_client.py --requests 500 --latency 0.005
+# The stub server is plain HTTP, so this measures TCP setup only; over TLS each new connection
+# also pays a TLS handshake and the gap widens.
+########################################################################################################################
+
+import argparse
+import os
+import socket
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import HttpClient
+from stub_server import start_stub_server
+
+_connect = socket.socket.connect
+connects = [0]
+
+
+def counting_connect(self, address):
+    connects[0] += 1
+    return _connect(self, address)
+
+
+def run(get, urls):
+    connects[0] = 0
+    latencies = []
+    started = time.perf_counter()
+    for url in urls:
+        request_started = time.perf_counter()
+        get(url).content
+        latencies.append(time.perf_counter() - request_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return elapsed, connects[0], latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.005, help='stub server latency per request in seconds')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    socket.socket.connect = counting_connect
+    urls = [f"{base_url}/cars/page-{i}.html" for i in range(args.requests)]
+    try:
+        client = HttpClient()
+        for name, get in (('requests.get', lambda url: requests.get(url, timeout=10)), ('http_client', client.get)):
+            elapsed, opened, p50, p99 = run(get, urls)
+            print(f"{name:>13}: {elapsed:.2f}s, {opened} connections, p50 {p50 * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms")
+        print(f"Client metrics: {client.summary()}")
+    finally:
+        socket.socket.connect = _connect
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
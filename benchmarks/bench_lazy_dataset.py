@@ -0,0 +1,68 @@
+########################################################################################################################
+# Stage 06 data loading: three full loads of the corpus vs lazy_dataset's column-pruned, cached loads
+# Usage: python benchmarks/bench_lazy_dataset.py [--specs brand_specs] [--read-workers 4]
+########################################################################################################################
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from jsonl_store import iter_all_records
+from lazy_dataset import SpecDataset
+from spec_normalise import normalise, parse_number, records_frame
+
+
+def full_loads(directory):
+    # What stage 06 did: one DataFrame of raw records and two flattened frames.
+    df = pd.DataFrame(iter_all_records(directory))
+    counts = df['brand'].value_counts(), df['fuel_type'].value_counts()
+    df = records_frame(list(iter_all_records(directory)))
+    df['horsepower'] = parse_number(df['horsepower'])
+    df = records_frame(list(iter_all_records(directory)))
+    df = pd.concat([df, normalise(df)], axis=1)
+    return counts, df[['fuel_type', 'displacement_l', 'fuel_combined_mpg']]
+
+
+def lazy_loads(directory, workers):
+    dataset = SpecDataset(directory, dataset=None, workers=workers)
+    df = dataset.load(['brand', 'fuel_type'])
+    counts = df['brand'].value_counts(), df['fuel_type'].value_counts()
+    dataset.load(['brand', 'fuel_type', 'horsepower_hp'])
+    return counts, dataset.load(['fuel_type', 'displacement_l', 'fuel_combined_mpg'])
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    _, frame = function(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, frame
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--specs', default='brand_specs')
+    parser.add_argument('--read-workers', type=int, default=None)
+    args = parser.parse_args()
+
+    before, before_peak, expected = measure(full_loads, args.specs)
+    # tracemalloc only sees this process; read in-process for a like-for-like peak.
+    after, after_peak, frame = measure(lazy_loads, args.specs, 0)
+    parallel, _, _ = measure(lazy_loads, args.specs, args.read_workers)
+    pd.testing.assert_series_equal(expected['displacement_l'].reset_index(drop=True),
+                                   frame['displacement_l'].reset_index(drop=True), check_names=False)
+    print(f"full loads:            {before:7.2f}s  peak {before_peak / 2 ** 20:7.1f} MiB")
+    print(f"lazy, in-process:      {after:7.2f}s  peak {after_peak / 2 ** 20:7.1f} MiB")
+    print(f"lazy, worker processes:{parallel:7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+########################################################################################################################
+# Spec normalisation: per-row apply() cleaning vs the vectorized spec_normalise engine
+# Usage: python benchmarks/bench_normalise.py [--specs brand_specs] [--rows 200000] [--check]
+# The SAMPLES table (techdata strings as they appear on autoevolution) is asserted before timing;
+# any mismatch exits non-zero without timing anything. --check runs only the assertions.
+########################################################################################################################
+
+import argparse
+import itertools
+import math
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from jsonl_store import iter_all_records
+from spec_normalise import normalise, parse_number, records_frame
+
+# (flattened source column, raw value, canonical column, expected value)
+SAMPLES = [
+    ('engine.displacement', '1598 cm3', 'displacement_cc', 1598.0),
+    ('engine.displacement', '97.5 cu in (1598 cm3)', 'displacement_cc', 1598.0),
+    ('engine.displacement', '1.6 l', 'displacement_cc', 1600.0),
+    ('engine.displacement', '2,993 cc', 'displacement_cc', 2993.0),
+    ('engine.power', '120 HP @ 6000 RPM', 'power_hp', 120.0),
+    ('engine.power', '184 HP @ 5000-6500 RPM', 'power_hp', 184.0),
+    ('engine.power', '88 kW @ 4000 RPM', 'power_hp', 118.0099),
+    ('engine.power', '150 PS', 'power_hp', 147.948),
+    ('engine.torque', '155 Nm @ 4200 RPM', 'torque_nm', 155.0),
+    ('engine.torque', '221 lb-ft @ 1350-4600 RPM', 'torque_nm', 299.6358),
+    ('engine.torque', '221 lb-ft @ 1350-4600 RPM (300 Nm)', 'torque_nm', 300.0),
+    ('performance.top speed', '121.2 mph (195 km/h)', 'top_speed_kmh', 195.0),
+    ('performance.top speed', '155 mph', 'top_speed_kmh', 249.4483),
+    ('performance.acceleration 0-62 mph (0-100 kph)', '10.2 s', 'acceleration_0_100_s', 10.2),
+    ('fuel economy (nedc).combined', '38.6 mpg US (6.1 L/100Km)', 'fuel_combined_l100km', 6.1),
+    ('fuel economy (nedc).combined', '40 mpg US', 'fuel_combined_l100km', 5.8804),
+    ('fuel economy (nedc).combined', '47.9 mpg UK', 'fuel_combined_l100km', 5.8973),
+    ('fuel economy (wltp).city', '28.7 mpg US (8.2 L/100Km)', 'fuel_city_l100km', 8.2),
+    ('fuel economy (nedc).co2 emissions', '142 g/Km', 'co2_gkm', 142.0),
+    ('dimensions.length', '168.5 in (4280 mm)', 'length_mm', 4280.0),
+    ('dimensions.width', '70.1 in', 'width_mm', 1780.54),
+    ('dimensions.ground clearance', '5.5 in (140 mm)', 'ground_clearance_mm', 140.0),
+    ('weight.unladen weight', '2756 lbs (1250 kg)', 'unladen_weight_kg', 1250.0),
+    ('weight.gross weight limit', '3968.3 lbs', 'gross_weight_kg', 1799.99),
+    ('engine.displacement', '', 'displacement_cc', None),
+    ('engine.power', 'Electric motor', 'power_hp', None),
+]
+
+
+def check_samples():
+    # Raises AssertionError listing every sample spec_normalise.FIELDS gets wrong.
+    failures = []
+    for source, raw, column, expected in SAMPLES:
+        result = normalise(pd.DataFrame({source: [raw]}))
+        assert column in result.columns, f"{source}: normalise() produced no {column} column"
+        value = result[column].iloc[0]
+        ok = math.isnan(value) if expected is None else abs(value - expected) <= 1e-3 * max(1.0, abs(expected))
+        if not ok:
+            failures.append(f"{source}={raw!r}: {column}={value}, expected {expected}")
+    assert not failures, '\n'.join(failures)
+    print(f"Samples: {len(SAMPLES)}/{len(SAMPLES)} correct")
+
+
+def synthetic_records(rows):
+    values = {}
+    for source, raw, _, _ in SAMPLES:
+        section, key = source.split('.', 1)
+        values.setdefault((section, key), []).append(raw)
+    cycles = {field: itertools.cycle(raws) for field, raws in values.items()}
+    for i in range(rows):
+        block = {'engine_name': f'Engine {i}'}
+        for (section, key), cycle in cycles.items():
+            block.setdefault(section, {})[key] = next(cycle)
+        yield {'brand': f'B{i % 50}', 'model_name': f'M{i}', 'fuel_type': 'Gasoline', 'engine_name': f'Engine {i}',
+               'horsepower': f'{100 + i % 300} HP', 'image_url': '', 'sub_link': f'/cars/m{i}.html#aeng_{i}',
+               'specs': [block]}
+
+
+def clean_horsepower(hp_string):
+    match = re.search(r'\d+', hp_string)
+    if match:
+        return int(match.group())
+    return None
+
+
+def clean_numeric(value):
+    if isinstance(value, str):
+        digits = ''.join(filter(str.isdigit, value))
+        return float(digits) if digits else None
+    return value
+
+
+def row_wise(records):
+    # The stage 06 cleaning this replaces: nested dicts expanded and cleaned one row at a time.
+    df = pd.DataFrame(records)
+    specs = df['specs'].apply(lambda blocks: blocks[0] if blocks else {}).apply(pd.Series)
+    df = pd.concat([df.drop(['specs'], axis=1), specs], axis=1)
+    df['horsepower'] = df['horsepower'].apply(clean_horsepower)
+    df['engine_size'] = df['engine'].apply(lambda x: x.get('displacement') if isinstance(x, dict) else x).apply(clean_numeric)
+    df['fuel_economy'] = df['fuel economy (nedc)'].apply(lambda x: x.get('combined') if isinstance(x, dict) else x)
+    df['fuel_economy'] = pd.to_numeric(df['fuel_economy'].apply(clean_numeric), errors='coerce')
+    return df
+
+
+def vectorized(records):
+    df = records_frame(records)
+    df = pd.concat([df, normalise(df)], axis=1)
+    df['horsepower'] = parse_number(df['horsepower'])
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--specs', help='brand_specs directory to normalise (defaults to synthetic records)')
+    parser.add_argument('--rows', type=int, default=200000, help='number of synthetic records')
+    parser.add_argument('--check', action='store_true', help='only assert the SAMPLES table')
+    args = parser.parse_args()
+
+    try:
+        check_samples()
+    except AssertionError as e:
+        sys.exit(f"Normalisation samples failed:\n{e}")
+    if args.check:
+        return
+    records = list(iter_all_records(args.specs)) if args.specs else list(synthetic_records(args.rows))
+    print(f"Records: {len(records)}")
+
+    for name, run in (('row-wise apply', row_wise), ('vectorized', vectorized)):
+        started = time.perf_counter()
+        run(records)
+        print(f"{name:>15}: {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+########################################################################################################################
+# Re-parse throughput of a cached spec corpus: thread parsing vs a process pool of parser workers
+# Usage: python benchmarks/bench_parse_pool.py --pages 400 --workers 1 2 4
+########################################################################################################################
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_fetch import fetch_all
+from fixtures import spec_page
+from http_cache import ResponseCache
+from parsers import parse_specs
+
+
+def build_corpus(directory, pages):
+    cache = ResponseCache(directory)
+    urls = []
+    for i in range(pages):
+        url = f"https://www.autoevolution.com/cars/model-{i}.html"
+        body = spec_page(4 + i % 8, filler=30).replace('Engine', f'Engine {i}').encode('utf-8')
+        cache.store(url, body, {})
+        urls.append(url)
+    return urls
+
+
+def reparse(directory, urls, workers):
+    cache = ResponseCache(directory, offline=True)
+    parsed = []
+    on_result = lambda key, specs, error: parsed.append(specs)
+    jobs = list(enumerate(urls))
+    started = time.monotonic()
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            asyncio.run(fetch_all(jobs, parse_specs, on_result, cache=cache,
+                                  parse_executor=executor, parse_workers=workers * 2))
+    else:
+        asyncio.run(fetch_all(jobs, parse_specs, on_result, cache=cache))
+    elapsed = time.monotonic() - started
+    assert all(parsed), 'every cached page should parse'
+    return len(parsed) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        urls = build_corpus(directory, args.pages)
+        print(f"threads:          {reparse(directory, urls, 0):8.1f} pages/s")
+        for workers in args.workers:
+            print(f"{workers:>2} processes:     {reparse(directory, urls, workers):8.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
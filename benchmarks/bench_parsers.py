@@ -0,0 +1,78 @@
+########################################################################################################################
+# CPU time and peak memory per page: full html.parser trees vs lxml + SoupStrainer-scoped parsing
+# Usage: python benchmarks/bench_parsers.py [--pages DIR] [--repeat 5]
+# Saved pages are picked up by file name prefix: index_*.html, brand_*.html, model_*.html, spec_*.html
+########################################################################################################################
+
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers
+import fixtures
+
+EXTRACTORS = {
+    'index': lambda html: parsers.extract_info(html),
+    'brand': lambda html: parsers.parse_brand_page(html),
+    'model': lambda html: parsers.extract_model_info(html, 'BMW'),
+    'spec': lambda html: parsers.parse_specs(html),
+}
+
+
+def load_pages(directory):
+    pages = {kind: [] for kind in EXTRACTORS}
+    if directory:
+        for kind in EXTRACTORS:
+            for path in sorted(glob.glob(os.path.join(directory, f'{kind}_*.html'))):
+                with open(path, 'rb') as f:
+                    pages[kind].append(f.read())
+    else:
+        pages['index'] = [fixtures.index_page(400).encode('utf-8')]
+        pages['brand'] = [fixtures.brand_page(n).encode('utf-8') for n in (20, 60)]
+        pages['model'] = [fixtures.model_page('BMW', '3 SERIES', n).encode('utf-8') for n in (9, 30)]
+        pages['spec'] = [fixtures.spec_page(n, filler=40).encode('utf-8') for n in (1, 6, 20)]
+    return pages
+
+
+def measure(extract, pages, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        for html in pages:
+            extract(html)
+    cpu = (time.process_time() - started) / (repeat * len(pages))
+
+    peak = 0
+    for html in pages:
+        tracemalloc.start()
+        extract(html)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', help='directory of saved pages (defaults to synthetic fixtures)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    print(f"{'extractor':<10}{'pages':>6}{'before ms':>12}{'after ms':>11}{'before KiB':>13}{'after KiB':>12}")
+    for kind, extract in EXTRACTORS.items():
+        if not pages[kind]:
+            continue
+        parsers.PARSER, parsers.SCOPED = 'html.parser', False
+        before_cpu, before_peak = measure(extract, pages[kind], args.repeat)
+        parsers.PARSER, parsers.SCOPED = 'lxml', True
+        after_cpu, after_peak = measure(extract, pages[kind], args.repeat)
+        print(f"{kind:<10}{len(pages[kind]):>6}{before_cpu * 1000:>12.2f}{after_cpu * 1000:>11.2f}"
+              f"{before_peak / 1024:>13.0f}{after_peak / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
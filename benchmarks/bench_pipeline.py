@@ -0,0 +1,97 @@
+########################################################################################################################
+# End-to-end wall clock of stages 01 -> 04 run one after another vs the pipelined crawl
+# Usage: python benchmarks/bench_pipeline.py --brands 10 --models 8 --latency 0.05 --concurrency 16
+# Both runs use the same async fetch engine, concurrency and rate budget; the staged run only
+# starts a stage once the previous one has finished, as the CSV hand-off between scripts does.
+########################################################################################################################
+
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_fetch import fetch_all
+from fixtures import brand_page, index_page, model_page, spec_page
+from parsers import extract_manufacturers, extract_model_info, parse_brand_page, parse_specs
+from pipeline import INDEX_PATH, Pipeline, absolute
+from politeness import PolitenessScheduler
+from stub_server import start_stub_server
+
+
+def make_site(n_brands, n_models, n_engines):
+    index = index_page(n_brands).encode('utf-8')
+    spec = spec_page().encode('utf-8')
+
+    def site(path):
+        if path == INDEX_PATH:
+            return index
+        if path.startswith(INDEX_PATH):
+            return spec
+        parts = path.strip('/').split('/')
+        if len(parts) == 1:
+            page = brand_page(n_models).replace('BRAND Models', f'{parts[0]} Models')
+            return page.replace('/brand/', f'/{parts[0]}/').encode('utf-8')
+        model = parts[1].replace('model', 'MODEL ')
+        return model_page(parts[0], model, n_engines).encode('utf-8')
+
+    return site
+
+
+def run_staged(base_url, scheduler, concurrency):
+    def stage(jobs, parse):
+        results = []
+        asyncio.run(fetch_all(jobs, parse, lambda key, parsed, error: results.append((key, parsed)),
+                              concurrency=concurrency, scheduler=scheduler))
+        return results
+
+    [(_, manufacturers)] = stage([(0, base_url + INDEX_PATH)], extract_manufacturers)
+    brands = stage([(i, absolute(m['link'], base_url)) for i, m in enumerate(manufacturers)], parse_brand_page)
+    links = [(brand, model['model_link']) for _, (brand, _, _, models) in brands for model in models]
+    # The brand prefix is only stripped from engine names, which does not change the cost of a parse.
+    models = stage([(i, absolute(link, base_url)) for i, (brand, link) in enumerate(links)],
+                   functools.partial(extract_model_info, brand=''))
+    sub_links = [engine['sub_link'] for _, info in models for engine in info['engines']]
+    specs = stage([(i, absolute(link, base_url)) for i, link in enumerate(sub_links)], parse_specs)
+    return len(brands), len(models), len(specs)
+
+
+def run_pipelined(base_url, scheduler, concurrency):
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = Pipeline(site=base_url, concurrency=concurrency, scheduler=scheduler,
+                            output_dir=directory, brand_dir=os.path.join(directory, 'brand_specs'))
+        stats = asyncio.run(pipeline.run())
+    return stats['brands'], stats['models'], stats['engines']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--brands', type=int, default=10)
+    parser.add_argument('--models', type=int, default=8, help='models per brand')
+    parser.add_argument('--engines', type=int, default=6, help='engines per model')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--rate', type=float, default=200.0)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency,
+                                         body=make_site(args.brands, args.models, args.engines))
+    try:
+        timings = {}
+        for name, run in (('staged', run_staged), ('pipelined', run_pipelined)):
+            scheduler = PolitenessScheduler(max_rate=args.rate, burst=1)
+            started = time.monotonic()
+            brands, models, engines = run(base_url, scheduler, args.concurrency)
+            timings[name] = time.monotonic() - started
+            print(f"{name:>9}: {brands} brands, {models} models, {engines} engine pages in {timings[name]:.2f}s")
+        print(f"  speed-up: {timings['staged'] / timings['pipelined']:.2f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+########################################################################################################################
+# Offline replay benchmark of the extractors over a recorded page corpus
+# Record: python benchmarks/bench_replay.py record --corpus corpus/ --brands 5 --models 3 --specs 10 [--offline]
+# Replay: python benchmarks/bench_replay.py run --corpus corpus/ --output replay.json [--baseline old.json]
+# Pages are saved as index_*.html, brand_*.html, model_*.html and spec_*.html (the layout bench_parsers.py
+# reads) plus a manifest.json with their URLs. Each extractor is replayed in a fresh process, so its peak
+# RSS is its own; --baseline exits non-zero when an extractor got slower than --threshold.
+########################################################################################################################
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures
+import parsers
+
+SITE = 'https://www.autoevolution.com'
+MANIFEST = 'manifest.json'
+KINDS = ('index', 'brand', 'model', 'spec')
+# Stage 04's extract_specs is a fetch plus parse_specs; only the parse is replayed.
+EXTRACTORS = {
+    'index': ('extract_info', lambda html, brand: parsers.extract_info(html)),
+    'brand': ('extract_models', lambda html, brand: parsers.extract_models(html)),
+    'model': ('extract_model_info', lambda html, brand: parsers.extract_model_info(html, brand)),
+    'spec': ('extract_specs', lambda html, brand: parsers.parse_specs(html)),
+}
+
+
+def _save(corpus, manifest, kind, url, body, brand=''):
+    name = f"{kind}_{len([p for p in manifest if p['kind'] == kind]):04d}.html"
+    with open(os.path.join(corpus, name), 'wb') as f:
+        f.write(body)
+    manifest.append({'file': name, 'kind': kind, 'url': url, 'brand': brand})
+
+
+def record(corpus, brands, models, specs, offline=False):
+    # Fetches through the HTTP cache, so a corpus can be cut from last month's cache with --offline.
+    # Brands are spread over the index; of the spec pages seen, those with the most engine blocks are kept.
+    import http_cache
+
+    http_cache.configure(offline=offline)
+    get = lambda url: http_cache.cached_get(url).content
+    os.makedirs(corpus, exist_ok=True)
+    manifest = []
+
+    index = get(SITE + '/cars/')
+    _save(corpus, manifest, 'index', SITE + '/cars/', index)
+    manufacturers = parsers.extract_manufacturers(index)
+    step = max(1, len(manufacturers) // brands)
+    candidates = []
+    for manufacturer in manufacturers[::step][:brands]:
+        url = manufacturer['link'] if manufacturer['link'].startswith('http') else SITE + manufacturer['link']
+        body = get(url)
+        _save(corpus, manifest, 'brand', url, body)
+        brand, _, _, brand_models = parsers.parse_brand_page(body)
+        for model in brand_models[:models]:
+            body = get(model['model_link'])
+            _save(corpus, manifest, 'model', model['model_link'], body, brand)
+            pages = {engine['sub_link'].split('#')[0] for engine in parsers.extract_model_info(body, brand)['engines']}
+            candidates.extend((brand, SITE + page) for page in sorted(pages))
+
+    bodies = [(brand, url, get(url)) for brand, url in candidates]
+    bodies.sort(key=lambda item: item[2].count(b'engine-block'), reverse=True)
+    for brand, url, body in bodies[:specs]:
+        _save(corpus, manifest, 'spec', url, body, brand)
+
+    with open(os.path.join(corpus, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Recorded {len(manifest)} pages into {corpus}")
+
+
+def load_corpus(corpus):
+    # [(kind, brand, body)]; the synthetic fixtures when no corpus is given.
+    if not corpus:
+        return ([('index', '', fixtures.index_page(400).encode('utf-8'))]
+                + [('brand', '', fixtures.brand_page(n).encode('utf-8')) for n in (20, 60)]
+                + [('model', 'BMW', fixtures.model_page('BMW', '3 SERIES', n).encode('utf-8')) for n in (9, 30)]
+                + [('spec', '', fixtures.spec_page(n, filler=40).encode('utf-8')) for n in (1, 6, 20)])
+    with open(os.path.join(corpus, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    pages = []
+    for entry in manifest:
+        with open(os.path.join(corpus, entry['file']), 'rb') as f:
+            pages.append((entry['kind'], entry['brand'], f.read()))
+    return pages
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def replay(kind, pages, repeat):
+    # Runs in its own process; returns the stats of one extractor.
+    name, extract = EXTRACTORS[kind]
+    baseline_rss = _peak_rss()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for brand, html in pages:
+            page_started = time.perf_counter()
+            extract(html, brand)
+            latencies.append(time.perf_counter() - page_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    peak_rss = _peak_rss()
+    return {
+        'extractor': name,
+        'pages': len(pages),
+        'bytes': sum(len(html) for _, html in pages),
+        'pages_per_s': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'peak_rss_bytes': peak_rss,
+        'rss_growth_bytes': peak_rss - baseline_rss if peak_rss is not None else None,
+    }
+
+
+def run(corpus, repeat):
+    pages = load_corpus(corpus)
+    digest = hashlib.sha256()
+    for _, _, body in pages:
+        digest.update(body)
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for kind in KINDS:
+        subset = [(brand, body) for page_kind, brand, body in pages if page_kind == kind]
+        if not subset:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[EXTRACTORS[kind][0]] = executor.submit(replay, kind, subset, repeat).result()
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parser': parsers.PARSER,
+        'corpus': corpus or 'fixtures',
+        'corpus_sha256': digest.hexdigest(),
+        'repeat': repeat,
+        'extractors': results,
+    }
+
+
+def compare(report, baseline, threshold):
+    # Returns the extractors whose throughput dropped by more than `threshold` against the baseline.
+    if baseline.get('corpus_sha256') != report['corpus_sha256']:
+        print("Baseline was recorded on a different corpus; throughput is not comparable")
+    regressions = []
+    for name, stats in report['extractors'].items():
+        before = baseline.get('extractors', {}).get(name)
+        if not before:
+            continue
+        change = stats['pages_per_s'] / before['pages_per_s'] - 1
+        print(f"{name:<20}{before['pages_per_s']:>10.1f} -> {stats['pages_per_s']:.1f} pages/s ({change:+.0%})")
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='save a representative page corpus')
+    record_parser.add_argument('--corpus', required=True)
+    record_parser.add_argument('--brands', type=int, default=5)
+    record_parser.add_argument('--models', type=int, default=3, help='models per brand')
+    record_parser.add_argument('--specs', type=int, default=10, help='spec pages kept, most engine blocks first')
+    record_parser.add_argument('--offline', action='store_true', help='record from the HTTP cache only')
+    run_parser = commands.add_parser('run', help='replay the corpus through the extractors')
+    run_parser.add_argument('--corpus', help='recorded corpus (defaults to synthetic fixtures)')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--output', help='write the results as JSON')
+    run_parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    run_parser.add_argument('--threshold', type=float, default=0.2, help='tolerated throughput drop against --baseline')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.corpus, args.brands, args.models, args.specs, args.offline)
+        return
+
+    report = run(args.corpus, args.repeat)
+    print(f"{'extractor':<20}{'pages':>6}{'pages/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'peak RSS MiB':>14}")
+    for name, stats in report['extractors'].items():
+        rss = f"{stats['peak_rss_bytes'] / 2 ** 20:.1f}" if stats['peak_rss_bytes'] is not None else 'n/a'
+        print(f"{name:<20}{stats['pages']:>6}{stats['pages_per_s']:>10.1f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}{rss:>14}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"Regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+########################################################################################################################
+# Reporting stage: cold build with 1 vs N rendering processes, then a rerun on an unchanged corpus
+# Usage: python benchmarks/bench_reports.py [--specs brand_specs] [--workers 4]
+########################################################################################################################
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spec_normalise
+from lazy_dataset import SpecDataset
+from reports import build_reports
+
+
+def timed(directory, out, workers, force=False):
+    started = time.perf_counter()
+    stats = build_reports(SpecDataset(directory, workers=workers), out, workers, force)
+    return time.perf_counter() - started, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--specs', default='brand_specs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in sorted({1, args.workers}):
+            out = os.path.join(tmp, f'reports{workers}')
+            cold, stats = timed(args.specs, out, workers)
+            print(f"cold, {workers:>2} workers:     {cold:6.2f}s  aggregates {stats['aggregates']}, "
+                  f"{len(stats['rendered'])} rendered")
+            forced, stats = timed(args.specs, out, workers, force=True)
+            print(f"re-render, {workers:>2} workers: {forced:6.2f}s  aggregates {stats['aggregates']}, "
+                  f"{len(stats['rendered'])} rendered")
+        warm, stats = timed(args.specs, out, args.workers)
+        print(f"unchanged corpus:      {warm:6.2f}s  aggregates {stats['aggregates']}, "
+              f"{len(stats['skipped'])} skipped")
+
+        # A different normalisation must not be served the cached aggregates.
+        pattern, units = spec_normalise.FIELDS['power_hp']
+        spec_normalise.FIELDS['power_hp'] = (pattern, units[:1])
+        try:
+            _, stats = timed(args.specs, out, args.workers)
+        finally:
+            spec_normalise.FIELDS['power_hp'] = (pattern, units)
+        if stats['aggregates'] != 'computed':
+            sys.exit("aggregates were served from the cache after spec_normalise.FIELDS changed")
+        print("changed normalisation: aggregates recomputed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+########################################################################################################################
+# Spec store lookups vs scanning every brand file (what stage 06's load_all_data does)
+# Usage: python benchmarks/bench_spec_store.py [--specs brand_specs] [--brands 100 --models 30 --engines 8]
+# Without --specs a synthetic corpus is written to a temporary directory first.
+########################################################################################################################
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsonl_store import brand_path, iter_all_records
+from spec_store import SpecStore, _int
+
+FUELS = ('DIESEL', 'GASOLINE', 'HYBRID', 'ELECTRIC')
+
+
+def write_corpus(directory, brands, models, engines):
+    rng = random.Random(7)
+    for b in range(brands):
+        brand = f'BRAND{b}'
+        with open(brand_path(brand, directory), 'w', encoding='utf-8') as f:
+            for m in range(models):
+                for e in range(engines):
+                    hp = rng.randint(60, 650)
+                    specs = [{'engine_name': f'{hp} HP', 'engine': {'power': f'{hp} HP @ 6000 RPM', 'displacement': '1998 cm3'},
+                              'performance': {'top speed': '155 mph (250 km/h)'}}]
+                    f.write(json.dumps({'brand': brand, 'model_name': f'Model {m}', 'fuel_type': rng.choice(FUELS),
+                                        'engine_name': f'{hp} HP', 'horsepower': f'{hp} HP', 'image_url': '',
+                                        'sub_link': f'/cars/{brand}-{m}.html#aeng_{e}', 'specs': specs}) + '\n')
+
+
+def check_shared_sub_link(tmp):
+    # Brand-file rows that share a spec page (one engine listed under two models, or two
+    # engine names) are separate engines; sync keeps them all, and a store created with the
+    # old UNIQUE (sub_link) is rebuilt on open without losing its engines or specs.
+    directory = os.path.join(tmp, 'shared', 'brand_specs')
+    os.makedirs(directory)
+    rows = [('Model A', '2.0 TDI'), ('Model A', '2.0 TDI 4MOTION'), ('Model B', '2.0 TDI')]
+    with open(brand_path('SHARED', directory), 'w', encoding='utf-8') as f:
+        for model_name, engine_name in rows:
+            f.write(json.dumps({'brand': 'SHARED', 'model_name': model_name, 'engine_name': engine_name,
+                                'fuel_type': 'DIESEL', 'horsepower': '150 HP', 'image_url': '',
+                                'sub_link': '/cars/shared.html#aeng_1',
+                                'specs': [{'engine_name': engine_name, 'engine': {'power': '150 HP'}}]}) + '\n')
+    failures = []
+    store = SpecStore(os.path.join(tmp, 'shared.sqlite'))
+    store.sync(directory)
+    if len(store.engines('/cars/shared.html#aeng_1')) != len(rows):
+        failures.append(f"{len(store.engines('/cars/shared.html#aeng_1'))} engines for a page shared by {len(rows)} rows")
+    store.close()
+
+    legacy = os.path.join(tmp, 'legacy.sqlite')
+    db = sqlite3.connect(legacy)
+    db.executescript("""
+        CREATE TABLE brands (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE models (id INTEGER PRIMARY KEY, brand_id INTEGER NOT NULL REFERENCES brands (id),
+                             name TEXT NOT NULL, body_type TEXT, status TEXT, production_start INTEGER,
+                             production_end INTEGER, UNIQUE (brand_id, name));
+        CREATE TABLE engines (id INTEGER PRIMARY KEY, model_id INTEGER NOT NULL REFERENCES models (id),
+                              sub_link TEXT NOT NULL UNIQUE, engine_name TEXT, fuel_type TEXT, horsepower INTEGER,
+                              displacement_l REAL, power_kw INTEGER, drivetrain TEXT, transmission TEXT, trim TEXT,
+                              image_url TEXT);
+        CREATE TABLE specs (engine_id INTEGER NOT NULL REFERENCES engines (id) ON DELETE CASCADE,
+                            section TEXT NOT NULL, key TEXT NOT NULL, value TEXT,
+                            PRIMARY KEY (engine_id, section, key)) WITHOUT ROWID;
+        INSERT INTO brands VALUES (1, 'SHARED');
+        INSERT INTO models VALUES (1, 1, 'Model A', NULL, NULL, NULL, NULL);
+        INSERT INTO engines (id, model_id, sub_link, engine_name) VALUES (1, 1, '/cars/shared.html#aeng_1', NULL);
+        INSERT INTO specs VALUES (1, 'engine', 'power', '150 HP');""")
+    db.close()
+    store = SpecStore(legacy)
+    engines = store.engines('/cars/shared.html#aeng_1')
+    if len(engines) != 1 or engines[0]['specs'] != {'engine': {'power': '150 HP'}}:
+        failures.append("rebuilding a sub_link-keyed store lost its engine or specs")
+    store.sync(directory)
+    if len(store.engines('/cars/shared.html#aeng_1')) != len(rows):
+        failures.append("a rebuilt store still collapses rows that share a sub_link")
+    store.close()
+    return failures
+
+
+def scan(directory, brand=None, fuel_type=None, min_hp=None):
+    return [record for record in iter_all_records(directory)
+            if (brand is None or record['brand'] == brand)
+            and (fuel_type is None or record['fuel_type'] == fuel_type)
+            and (min_hp is None or (_int(record['horsepower']) or 0) >= min_hp)]
+
+
+def timed(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--specs', help='brand_specs directory to use instead of a synthetic corpus')
+    parser.add_argument('--brands', type=int, default=100)
+    parser.add_argument('--models', type=int, default=30)
+    parser.add_argument('--engines', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.specs
+        if directory is None:
+            directory = os.path.join(tmp, 'brand_specs')
+            os.makedirs(directory)
+            write_corpus(directory, args.brands, args.models, args.engines)
+        store = SpecStore(os.path.join(tmp, 'store.sqlite'))
+        started = time.perf_counter()
+        stats = store.sync(directory)
+        print(f"sync: {stats} in {time.perf_counter() - started:.2f}s, {store.counts()}")
+
+        queries = [
+            ('diesel >= 300 HP', {'fuel_type': 'DIESEL', 'min_hp': 300}),
+            ('one brand', {'brand': 'BRAND3'}),
+            ('>= 600 HP', {'min_hp': 600}),
+        ]
+        for label, filters in queries:
+            scanned, rows = timed(lambda: scan(directory, **filters), repeat=1)
+            queried, store_rows = timed(lambda: store.query(**filters))
+            print(f"{label:<18} scan {scanned * 1000:9.1f} ms  store {queried * 1000:7.2f} ms  "
+                  f"({rows} / {store_rows} engines)")
+        store.close()
+
+        failures = check_shared_sub_link(tmp)
+        if failures:
+            sys.exit('\n'.join(failures))
+        print("engines sharing a sub_link: kept apart, legacy store rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+########################################################################################################################
+# Synthetic autoevolution-like pages for offline benchmarks
+########################################################################################################################
+
+import random
+
+SECTIONS = {
+    'engine': [
+        ('Cylinders', 'L4'),
+        ('Displacement', '1598 cm3'),
+        ('Power', '120 HP @ 6000 RPM'),
+        ('Torque', '155 Nm @ 4200 RPM'),
+        ('Fuel System', 'Multipoint Injection'),
+        ('Fuel', 'Gasoline'),
+    ],
+    'performance': [
+        ('Top Speed', '121.2 mph (195 km/h)'),
+        ('Acceleration 0-62 Mph (0-100 kph)', '10.2 s'),
+    ],
+    'fuel economy (nedc)': [
+        ('City', '28.7 mpg US (8.2 L/100Km)'),
+        ('Highway', '47 mpg US (5 L/100Km)'),
+        ('Combined', '38.6 mpg US (6.1 L/100Km)'),
+        ('CO2 Emissions', '142 g/Km'),
+    ],
+    'transmission': [
+        ('Drive Type', 'Front Wheel Drive'),
+        ('Gearbox', '5-speed manual'),
+    ],
+    'dimensions': [
+        ('Length', '168.5 in (4280 mm)'),
+        ('Width', '70.1 in (1781 mm)'),
+        ('Height', '58.7 in (1491 mm)'),
+        ('Cargo Volume', '13.1 cuFT (370 L)'),
+    ],
+    'weight': [
+        ('Unladen Weight', '2756 lbs (1250 kg)'),
+        ('Gross Weight Limit', '3748 lbs (1700 kg)'),
+    ],
+}
+
+
+def _filler(paragraphs):
+    words = 'the new model brings revised styling a wider track and a more efficient engine range'.split()
+    rng = random.Random(paragraphs)
+    return ''.join('<p>' + ' '.join(rng.choice(words) for _ in range(80)) + '</p>' for _ in range(paragraphs))
+
+
+def spec_page(n_engines=4, filler=20):
+    blocks = []
+    for i in range(n_engines):
+        tables = []
+        for section, rows in SECTIONS.items():
+            body = ''.join(f'<tr><td class="left">{k}:</td><td class="right">{v}</td></tr>' for k, v in rows)
+            tables.append(f'<table class="techdata"><tr><th class="title" colspan="2">{section.upper()} SPECS</th></tr>{body}</table>')
+        blocks.append(f'<div class="engine-block"><h3>1.6L {100 + i * 10} HP Engine</h3>{"".join(tables)}</div>')
+    return (
+        '<html><head><title>Specs</title>' + '<script>var x = 1;</script>' * 20 + '</head><body>'
+        '<div class="nav">' + '<a href="/cars/">Cars</a>' * 200 + '</div>'
+        f'<div class="newstext">{_filler(filler)}</div>{"".join(blocks)}'
+        '<div class="footer">' + _filler(5) + '</div></body></html>'
+    )
+
+
+def index_page(n_brands=120):
+    blocks = []
+    for i in range(n_brands):
+        blocks.append(
+            f'<div class="col2width fl bcol-white carman"><a href="/brand{i}/"><h5>BRAND{i}</h5></a>'
+            f'<img src="https://s1.cdn.autoevolution.com/images/producers/brand{i}-sm.jpg"></div>'
+            f'<div class="col3width fl carnums"><b>{i % 40} in production</b> <b>{i % 17} discontinued</b></div>'
+        )
+    return (
+        '<html><body><div class="breadcrumb2"><div class="fr">Updated: 28 August 2024</div></div>'
+        f'<div id="newscol3" class="col3width carbrnum">{n_brands} car brands</div>{"".join(blocks)}</body></html>'
+    )
+
+
+def brand_page(n_models=40):
+    models = []
+    for i in range(n_models):
+        end = 'Present' if i % 3 else '2019'
+        models.append(
+            f'<div class="carmod"><a href="https://www.autoevolution.com/brand/model{i}/">'
+            f'<h4>MODEL {i}</h4></a><img src="https://s1.cdn.autoevolution.com/images/models/m{i}.jpg">'
+            f'<p class="body">Hatchback</p><p class="eng"><span>Diesel</span> <span>Gasoline</span></p>'
+            f'<b>{i % 4 + 1} generations</b><span>(2010 - {end})</span></div>'
+        )
+    return (
+        '<html><body><h1 class="newstitle">BRAND Models &amp; Brand History</h1>'
+        '<div class="brandinfo"><b class="col-green2">27</b><b class="col-red">13</b></div>'
+        f'{_filler(10)}{"".join(models)}</body></html>'
+    )
+
+
+def model_page(brand='BRAND', model='MODEL 1', n_engines=12):
+    fuels = ['Diesel', 'Gasoline', 'Hybrid']
+    slug = model.lower().replace(' ', '-')
+    sections = []
+    for fuel in fuels:
+        links = ''.join(
+            f'<a class="engurl semibold" href="https://www.autoevolution.com/cars/{slug}-{fuel.lower()}.html#aeng_{i}">'
+            f'{brand} {model} {1.0 + i / 10:.1f}L {fuel[0]}-{i} 6MT FWD ({90 + i * 5} HP)</a>'
+            for i in range(n_engines // len(fuels))
+        )
+        sections.append(f'<div class="mot clearfix"><strong>{fuel} engines:</strong>{links}</div>')
+    return (
+        f'<html><body><h1 class="padsides_20i mgtop_10 nomgbot newstitle innews">{brand} {model} '
+        'Models/Series Timeline, Specifications &amp; Photos</h1>'
+        '<a class="mpic fr mgtop_20"><img src="https://s1.cdn.autoevolution.com/images/models/m.jpg"></a>'
+        f'{_filler(10)}{"".join(sections)}</body></html>'
+    )
@@ -0,0 +1,38 @@
+########################################################################################################################
+# Local stub HTTP server that imitates autoevolution latency for offline benchmarks
+########################################################################################################################
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fixtures import spec_page
+
+
+def make_handler(body, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            page = body(self.path) if callable(body) else body
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub_server(latency=0.3, body=None, port=0):
+    # Returns (server, base_url); call server.shutdown() when done. `body` may be a
+    # function of the request path to serve a whole site.
+    body = body if body is not None else spec_page().encode('utf-8')
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(body, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,197 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Columnar Parquet dataset of the spec corpus, partitioned by brand
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import json
+import os
+import shutil
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from engine_titles import TITLE_FIELDS
+from jsonl_store import BRAND_DIR, brand_files, iter_brand_records
+
+DEFAULT_DATASET = 'spec_dataset'
+MANIFEST = '_manifest.json'
+PART_FILE = 'part-0.parquet'
+ROW_GROUP_SIZE = 5000
+
+# Columns of detailed_model_info.csv; `brand` is the partition key and is not stored in the files.
+BASE_COLUMNS = ('model_name', 'fuel_type', 'engine_name', 'horsepower', 'image_url', 'sub_link', *TITLE_FIELDS)
+
+
+def available():
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the Parquet dataset (pip install pyarrow)")
+
+
+def select_spec_block(record):
+    # A spec page lists every engine of the generation; the record's own engine is the block
+    # whose title contains the engine name from detailed_model_info.csv, else the first block.
+    blocks = record.get('specs') or []
+    if not isinstance(blocks, list) or not blocks:
+        return {}
+    engine_name = (record.get('engine_name') or '').strip().lower()
+    if engine_name:
+        for block in blocks:
+            if isinstance(block, dict) and engine_name in str(block.get('engine_name', '')).lower():
+                return block
+    return blocks[0] if isinstance(blocks[0], dict) else {}
+
+
+def flatten_record(record):
+    # {'engine': {'displacement': ...}} -> {'engine.displacement': ...}; top-level strings of
+    # the block (its title, a general-info description) become `spec.<key>`.
+    row = {column: record.get(column) for column in BASE_COLUMNS}
+    for section, values in select_spec_block(record).items():
+        if isinstance(values, dict):
+            for key, value in values.items():
+                row[f'{section}.{key}'] = None if value is None else str(value)
+        elif values is not None:
+            row[f'spec.{section}'] = str(values)
+    return row
+
+
+def spec_columns(path):
+    columns = set()
+    for record in iter_brand_records(path):
+        columns.update(flatten_record(record))
+    return columns.difference(BASE_COLUMNS)
+
+
+def dataset_schema(columns):
+    # Every column is a nullable string; units are normalised at analysis time.
+    _require_pyarrow()
+    return pa.schema([(column, pa.string()) for column in (*BASE_COLUMNS, *sorted(columns))])
+
+
+def partition_dir(dataset, brand):
+    return os.path.join(dataset, 'brand=' + quote(brand, safe=''))
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime]
+
+
+def _read_manifest(dataset):
+    try:
+        with open(os.path.join(dataset, MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'columns': [], 'brands': {}}
+
+
+def _write_manifest(dataset, manifest):
+    path = os.path.join(dataset, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def write_partition(dataset, brand, path, schema):
+    # Streams one brand file into its partition in row groups; the file is written under an
+    # ignored `_` name and renamed into place, so readers never see a half-written partition.
+    directory = partition_dir(dataset, brand)
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, PART_FILE)
+    temp = os.path.join(directory, '_' + PART_FILE)
+    rows = 0
+    with pq.ParquetWriter(temp, schema, compression='zstd') as writer:
+        batch = []
+        for record in iter_brand_records(path):
+            batch.append(flatten_record(record))
+            if len(batch) >= ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                rows += len(batch)
+                batch = []
+        if batch or not rows:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            rows += len(batch)
+    os.replace(temp, target)
+    return rows
+
+
+def export_dataset(directory=BRAND_DIR, dataset=DEFAULT_DATASET, force=False):
+    # Rewrites only the partitions of brand files that changed since the last export. When a
+    # changed brand brings new spec columns, or BASE_COLUMNS changed, every partition is
+    # rewritten so that all files share one schema.
+    # Returns {'written': n, 'skipped': n, 'removed': n, 'columns': n}.
+    _require_pyarrow()
+    os.makedirs(dataset, exist_ok=True)
+    manifest = {} if force else _read_manifest(dataset)
+    exported = manifest.get('brands', {})
+    files = brand_files(directory)
+
+    brands = {}
+    for brand, path in files.items():
+        signature = _signature(path)
+        previous = exported.get(brand)
+        if previous and previous['signature'] == signature:
+            brands[brand] = previous
+        else:
+            brands[brand] = {'signature': signature, 'columns': sorted(spec_columns(path)), 'dirty': True}
+
+    columns = sorted(set().union(*(set(entry['columns']) for entry in brands.values())))
+    rewrite_all = force or columns != manifest.get('columns') or manifest.get('base_columns') != list(BASE_COLUMNS)
+    schema = dataset_schema(columns)
+
+    written = skipped = 0
+    for brand, entry in brands.items():
+        if rewrite_all or entry.pop('dirty', False):
+            rows = write_partition(dataset, brand, files[brand], schema)
+            print(f"Exported {rows} rows for {brand} to {partition_dir(dataset, brand)}")
+            written += 1
+        else:
+            skipped += 1
+        entry.pop('dirty', None)
+
+    removed = 0
+    for brand in set(exported) - set(brands):
+        shutil.rmtree(partition_dir(dataset, brand), ignore_errors=True)
+        removed += 1
+
+    _write_manifest(dataset, {'base_columns': list(BASE_COLUMNS), 'columns': columns, 'brands': brands})
+    return {'written': written, 'skipped': skipped, 'removed': removed, 'columns': len(BASE_COLUMNS) + len(columns) + 1}
+
+
+def add_arguments(parser):
+    parser.add_argument('--dataset', default=DEFAULT_DATASET, help='directory of the Parquet dataset exported after the crawl')
+    parser.add_argument('--no-dataset', dest='dataset', action='store_const', const=None,
+                        help='do not export the Parquet dataset')
+
+
+def export_from_args(args, directory=BRAND_DIR):
+    if not args.dataset:
+        return None
+    if not available():
+        print("pyarrow is not installed; skipping the Parquet dataset export")
+        return None
+    stats = export_dataset(directory, args.dataset)
+    print(f"Dataset: {stats}")
+    return stats
+
+
+def load_dataset(dataset=DEFAULT_DATASET, columns=None, brands=None):
+    # Reads only the requested columns (and brand partitions) into a DataFrame.
+    _require_pyarrow()
+    manifest = _read_manifest(dataset)
+    schema = dataset_schema(manifest['columns']).append(pa.field('brand', pa.string()))
+    partitioning = ds.partitioning(pa.schema([('brand', pa.string())]), flavor='hive')
+    data = ds.dataset(dataset, format='parquet', partitioning=partitioning, schema=schema)
+    if columns is not None:
+        columns = [column for column in columns if column in schema.names]
+    condition = ds.field('brand').isin(list(brands)) if brands else None
+    return data.to_table(columns=columns, filter=condition).to_pandas()
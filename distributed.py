@@ -0,0 +1,237 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Distributed spec crawl: sub_links sharded by consistent hashing over worker processes
+# Coordinator: python "04_Extract specification cleanup for each model.py" --workers 4
+# Worker:      python distributed.py --shard 2 --journal crawl_journal.sqlite
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import adaptive_concurrency
+from async_fetch import fetch_all
+import http_cache
+from http_cache import cache_key
+from jsonl_store import JsonlWriter, brand_path
+from parsers import parse_specs
+import politeness
+import profiling
+import telemetry
+from work_queue import DEFAULT_JOURNAL, WorkQueue, fan_out, group_rows
+
+SITE = 'https://www.autoevolution.com'
+REPLICAS = 64          # points per worker on the hash ring
+POLL_INTERVAL = 1.0    # seconds between coordinator passes over the journal
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    # Consistent hashing: a worker owns the arcs of the ring ending at its points, so adding
+    # or removing a worker on resume only moves about 1/N of the remaining frontier.
+    def __init__(self, shards, replicas=REPLICAS):
+        self.points = sorted((_hash(f"{shard}:{i}"), shard) for shard in range(shards) for i in range(replicas))
+        self.keys = [point for point, _ in self.points]
+
+    def shard_for(self, sub_link):
+        # Keyed on the spec page rather than the engine anchor, so every engine of a page
+        # lands on one worker and is downloaded there once.
+        index = bisect.bisect(self.keys, _hash(cache_key(sub_link))) % len(self.points)
+        return self.points[index][1]
+
+
+def run_worker(shard, journal_path=DEFAULT_JOURNAL, concurrency=8, site=SITE, parse_workers=0):
+    # Crawls one shard of the journal. Records go back into the journal for the coordinator,
+    # which is the only process writing brand files.
+    journal = WorkQueue(journal_path)
+    rows = {}
+    done = [0]
+
+    def on_result(sub_link, specs, error):
+        model = rows.pop(sub_link)
+        if error is not None:
+            print(f"[shard {shard}] Request failed: {error}")
+            journal.mark_failed(sub_link, error, result=model)
+            return
+        if specs:
+            model['specs'] = specs
+        journal.store_result(sub_link, model)
+        done[0] += 1
+
+    def jobs():
+        for model in journal.claim(shard=shard):
+            rows[model['sub_link']] = model
+            yield model['sub_link'], site + model['sub_link']
+
+    def run_pass():
+        if parse_workers:
+            with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+                asyncio.run(fetch_all(jobs(), parse_specs, on_result, concurrency=concurrency,
+                                      cache=http_cache.get_cache(), parse_executor=executor,
+                                      parse_workers=parse_workers))
+        else:
+            asyncio.run(fetch_all(jobs(), parse_specs, on_result, concurrency=concurrency,
+                                  cache=http_cache.get_cache()))
+
+    try:
+        run_pass()
+        while True:
+            requeued, wait = journal.requeue_failed(shard=shard)
+            if requeued:
+                run_pass()
+            elif wait is None:
+                break
+            else:
+                time.sleep(wait)
+    finally:
+        journal.close()
+    print(f"[shard {shard}] {done[0]} pages, requests: {politeness.get_scheduler().summary()}")
+    return done[0]
+
+
+def worker_arguments(options, shard):
+    # Stage 04 options a worker needs too, from the coordinator's parsed arguments. Metrics
+    # ports, run reports and profiles get one per shard so the workers do not collide.
+    if options is None:
+        return []
+    arguments = []
+    if getattr(options, 'parse_workers', 0):
+        arguments += ['--parse-workers', str(options.parse_workers)]
+    if getattr(options, 'metrics_port', None):
+        arguments += ['--metrics-port', str(options.metrics_port + 1 + shard)]
+    if getattr(options, 'run_report', None):
+        stem, extension = os.path.splitext(options.run_report)
+        arguments += ['--run-report', f'{stem}_shard{shard}{extension or ".json"}']
+    if getattr(options, 'profile', None) is not None:
+        arguments += ['--profile', f'{options.profile or "profile_04"}_shard{shard}',
+                      '--profile-interval', str(options.profile_interval)]
+    return arguments
+
+
+def spawn_workers(workers, journal_path, concurrency, rate, cache_dir, offline, site=SITE, options=None):
+    # Local workers are started with the same command line a worker on another node would use.
+    command = [sys.executable, os.path.abspath(__file__), '--journal', journal_path,
+               '--concurrency', str(concurrency), '--rate', str(rate), '--cache-dir', cache_dir, '--site', site]
+    if offline:
+        command.append('--offline')
+    command += adaptive_concurrency.worker_arguments()
+    return [subprocess.Popen(command + worker_arguments(options, shard) + ['--shard', str(shard)])
+            for shard in range(workers)]
+
+
+def collect(journal, writers, committed, rows=None):
+    # Appends the records workers have stored to their brand files and commits every brand
+    # whose items are all finished. `rows` (group_rows of the CSV) fans a record out to every
+    # row sharing its sub_link. Returns the number of pages collected.
+    results = journal.collect()
+    for sub_link, record in results:
+        brand = record['brand']
+        writer = writers.get(brand)
+        if writer is None:
+            writer = writers[brand] = JsonlWriter(brand_path(brand), key='sub_link')
+        writer.write_many(fan_out(record, rows.get(sub_link) if rows else None))
+    journal.mark_collected([sub_link for sub_link, _ in results])
+    telemetry.get_telemetry().item_done('engine', len(results))
+
+    for brand in list(writers):
+        # unfinished() first: a worker stores a record and finishes its item in one
+        # transaction, so once nothing is unfinished every record is visible.
+        if journal.unfinished(brand) == 0 and journal.uncollected(brand) == 0:
+            writers.pop(brand).commit()
+            committed.add(brand)
+            print(f"Completed processing for {brand}. Results saved to {brand_path(brand)}")
+            print("-" * 50)
+    return len(results)
+
+
+def coordinate(models, source, workers, journal_path=DEFAULT_JOURNAL, concurrency=8,
+               rate=politeness.DEFAULT_MAX_RATE, cache_dir=http_cache.DEFAULT_CACHE_DIR, offline=False,
+               spawn=True, site=SITE, options=None):
+    # Seeds the journal, shards it over `workers`, and (with spawn=True) runs the workers as
+    # local processes. Workers started elsewhere only need the journal and their shard number.
+    # `options` are the stage's parsed arguments, passed on with worker_arguments().
+    # Every worker keeps its own rate budget, so the site sees up to workers * rate requests/s.
+    journal = WorkQueue(journal_path)
+    writers = {}
+    committed = set()
+    rows = group_rows(models)
+    try:
+        if journal.seed(models, source):
+            print(f"Resuming previous run: {journal.counts()}")
+        else:
+            for brand in journal.brands():
+                if os.path.exists(brand_path(brand) + '.part'):
+                    os.remove(brand_path(brand) + '.part')
+        ring = HashRing(workers)
+        shards = journal.assign_shards(ring.shard_for)
+        telemetry.get_telemetry().add_items('engine', sum(shards.values()))
+        print(f"Sharded {sum(shards.values())} pages over {workers} workers: "
+              f"{', '.join(f'{shard}: {count}' for shard, count in sorted(shards.items()))}")
+
+        processes = (spawn_workers(workers, journal_path, concurrency, rate, cache_dir, offline, site, options)
+                     if spawn else [])
+
+        def running():
+            if spawn:
+                return any(process.poll() is None for process in processes)
+            return any(journal.unfinished(brand) for brand in journal.brands())
+
+        while running():
+            collect(journal, writers, committed, rows)
+            time.sleep(POLL_INTERVAL)
+        while collect(journal, writers, committed, rows):
+            pass
+
+        failed = [shard for shard, process in enumerate(processes) if process.returncode != 0]
+        if failed:
+            print(f"Workers for shards {failed} exited with an error; rerun to resume their pages")
+
+        # Brands finished by an earlier run that stopped before committing them.
+        for brand in journal.brands():
+            if brand not in committed and os.path.exists(brand_path(brand) + '.part') and journal.unfinished(brand) == 0:
+                JsonlWriter(brand_path(brand)).commit()
+
+        print(f"Journal: {journal.counts()}")
+    finally:
+        for writer in writers.values():
+            writer.close()
+        journal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl one shard of a distributed spec crawl')
+    parser.add_argument('--shard', type=int, required=True, help='shard number assigned by the coordinator')
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL, help='work queue journal shared with the coordinator')
+    parser.add_argument('--concurrency', type=int, default=8, help='maximum number of requests in flight')
+    parser.add_argument('--rate', type=float, default=politeness.DEFAULT_MAX_RATE, help='request-rate ceiling per host for this worker')
+    parser.add_argument('--site', default=SITE, help=argparse.SUPPRESS)
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='parse in this many worker processes (0 parses in threads)')
+    adaptive_concurrency.add_arguments(parser)
+    http_cache.add_arguments(parser)
+    telemetry.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    politeness.configure(max_rate=args.rate)
+    http_cache.configure_from_args(args)
+    # Each worker adapts its own limit to what its shard of requests sees.
+    adaptive_concurrency.configure_from_args(args, args.concurrency)
+    # Workers report their own request and parse metrics; the coordinator's cover progress.
+    telemetry.configure_from_args(args, f'04_shard{args.shard}')
+    profiling.configure_from_args(args, f'04_shard{args.shard}')
+    run_worker(args.shard, args.journal, args.concurrency, args.site, args.parse_workers)
+    telemetry.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Engine title parser: structured fields from the engine links of a model page
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import logging
+import re
+from functools import lru_cache
+
+# Columns added to detailed_model_info.csv, after the original engine_name and horsepower.
+# The title_ prefix keeps them apart from the spec-page values spec_normalise derives.
+TITLE_FIELDS = ('title_displacement_l', 'title_power_hp', 'title_power_kw', 'drivetrain', 'transmission', 'trim')
+
+KW_PER_HP = 0.745700
+
+SLASHES = re.compile(r'\s*/\s*')
+HORSEPOWER = re.compile(r'(.*?)\s*\((\d+)\s*HP\)$')
+KILOWATTS = re.compile(r'\(?\b(\d{2,4})\s*kW\b\)?', re.I)
+# The litre unit is usually left out ("2.0 TFSI"), so a bare decimal counts unless it is an
+# EV battery or charger figure ("77.4 kWh", "11.0 kW", "50.0 Ah").
+DISPLACEMENT = re.compile(r'(?<![\w.])(\d{1,2}\.\d{1,2})(?!\d)(?!\s*(?:kWh|kW|Ah)\b)\s*(?:(?:litres?|liters?|l)\b)?',
+                          re.I)
+DRIVETRAINS = {
+    'awd': 'AWD', '4wd': '4WD', '4x4': '4WD', 'fwd': 'FWD', 'rwd': 'RWD', '2wd': '2WD',
+    '4motion': 'AWD', 'quattro': 'AWD', 'xdrive': 'AWD', '4matic': 'AWD', '4matic+': 'AWD', 'all4': 'AWD',
+    'q4': 'AWD', 'e-four': 'AWD', 'sh-awd': 'AWD', 'q2': 'RWD',
+}
+DRIVETRAIN = re.compile(r'(?<![\w-])(' + '|'.join(sorted(map(re.escape, DRIVETRAINS), key=len, reverse=True)) + r')(?![\w-])',
+                        re.I)
+# "6MT", "8AT", "7-speed DCT", "9G-TRONIC" ... and gearless names.
+GEARBOX_TYPES = {
+    'mt': 'MT', 'manual': 'MT', 'at': 'AT', 'automatic': 'AT', 'auto': 'AT', 'tiptronic': 'AT', 'steptronic': 'AT',
+    'g-tronic': 'AT', 'dct': 'DCT', 'dsg': 'DCT', 's tronic': 'DCT', 'pdk': 'DCT', 'edc': 'DCT', 'amt': 'AMT',
+    'smg': 'AMT', 'cvt': 'CVT', 'ecvt': 'CVT', 'e-cvt': 'CVT', 'multitronic': 'CVT', 'xtronic': 'CVT',
+}
+TRANSMISSION = re.compile(
+    r'(?<![\w-])(?:(\d{1,2})\s*-?\s*(?:speed\s+)?)?('
+    + '|'.join(sorted((re.escape(name).replace(r'\ ', r'\s+') for name in GEARBOX_TYPES), key=len, reverse=True))
+    + r')(?![\w-])',
+    re.I,
+)
+WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=None)
+def brand_prefix(brand):
+    return re.compile(r'^' + re.escape(brand) + r'\s+')
+
+
+@lru_cache(maxsize=8192)
+def model_prefix(brand, model_name):
+    # Compiled once per model instead of once per engine link.
+    return re.compile(r'^' + re.escape(brand) + r'\s+' + re.escape(model_name) + r'\s+')
+
+
+def _remove(text, match):
+    return text[:match.start()] + ' ' + text[match.end():]
+
+
+def parse_engine_title(title, brand, model_name):
+    # "BMW 3 Series 330i xDrive 8AT (258 HP)" -> engine_name "330i xDrive 8AT", horsepower "258 HP"
+    # and the structured fields in TITLE_FIELDS; fields the title does not carry are ''.
+    engine_info = SLASHES.sub(' ', title.strip())
+    engine_info = model_prefix(brand, model_name).sub('', engine_info)
+
+    engine_match = HORSEPOWER.search(engine_info)
+    if engine_match:
+        engine_name = engine_match.group(1).strip()
+        power_hp = engine_match.group(2)
+        horsepower = power_hp + " HP"
+    else:
+        # If the pattern doesn't match, use the whole string as engine name
+        engine_name = engine_info
+        power_hp = ''
+        horsepower = "N/A"
+        logging.info(f"Unmatched engine info: {engine_info}")
+
+    rest = engine_name
+    power_kw = ''
+    match = KILOWATTS.search(rest)
+    if match:
+        power_kw = match.group(1)
+        rest = _remove(rest, match)
+    elif power_hp:
+        power_kw = str(round(int(power_hp) * KW_PER_HP))
+
+    displacement = ''
+    match = DISPLACEMENT.search(rest)
+    if match:
+        displacement = match.group(1)
+        rest = _remove(rest, match)
+
+    drivetrain = ''
+    match = DRIVETRAIN.search(rest)
+    if match:
+        drivetrain = DRIVETRAINS[match.group(1).lower()]
+        rest = _remove(rest, match)
+
+    transmission = ''
+    match = TRANSMISSION.search(rest)
+    if match:
+        transmission = (match.group(1) or '') + GEARBOX_TYPES[WHITESPACE.sub(' ', match.group(2).lower())]
+        rest = _remove(rest, match)
+
+    return {
+        'engine_name': engine_name,
+        'horsepower': horsepower,
+        'title_displacement_l': displacement,
+        'title_power_hp': power_hp,
+        'title_power_kw': power_kw,
+        'drivetrain': drivetrain,
+        'transmission': transmission,
+        'trim': WHITESPACE.sub(' ', rest).strip(),
+    }
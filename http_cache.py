@@ -0,0 +1,191 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Persistent HTTP response cache with conditional revalidation and offline replay
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from urllib.parse import urldefrag
+
+import requests
+
+from politeness import polite_get
+
+DEFAULT_CACHE_DIR = 'http_cache'
+
+# Seconds a cached page is served without touching the network, by URL class.
+# After that it is revalidated with If-None-Match / If-Modified-Since.
+TTL_RULES = [
+    (re.compile(r'^https?://[^/]+/cars/?$'), 12 * 3600),        # brand index
+    (re.compile(r'/cars/[^/]+\.html$'), 30 * 24 * 3600),        # engine spec pages
+    (re.compile(r'^https?://[^/]+/[^/]+/[^/]+/$'), 14 * 24 * 3600),  # model pages
+    (re.compile(r'^https?://[^/]+/[^/]+/$'), 3 * 24 * 3600),     # brand pages
+]
+DEFAULT_TTL = 24 * 3600
+
+
+class CacheMiss(requests.RequestException):
+    pass
+
+
+def cache_key(url):
+    # Every engine of a generation lives on one spec page (/cars/...html#aeng_...),
+    # so the fragment is dropped and those sub_links share a single entry.
+    return urldefrag(url).url
+
+
+def ttl_for(url):
+    url = cache_key(url)
+    for pattern, ttl in TTL_RULES:
+        if pattern.search(url):
+            return ttl
+    return DEFAULT_TTL
+
+
+class CachedResponse:
+    # The subset of requests.Response the stages use.
+    def __init__(self, url, status_code, content, headers=None, encoding=None, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.encoding = encoding or 'utf-8'
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+class ResponseCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, offline=False):
+        self.directory = directory
+        self.offline = offline
+        self.stats = {'fresh': 0, 'revalidated': 0, 'downloaded': 0, 'missed': 0}
+
+    def _meta_path(self, url):
+        key = hashlib.sha256(cache_key(url).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'urls', key[:2], key + '.json')
+
+    def _body_path(self, digest):
+        return os.path.join(self.directory, 'bodies', digest[:2], digest + '.gz')
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def lookup(self, url):
+        try:
+            with open(self._meta_path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read_body(self, entry):
+        try:
+            with gzip.open(self._body_path(entry['body']), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < ttl_for(entry['url'])
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, content, headers, encoding=None):
+        digest = hashlib.sha256(content).hexdigest()
+        body_path = self._body_path(digest)
+        if not os.path.exists(body_path):
+            self._write_atomic(body_path, gzip.compress(content, compresslevel=6))
+        entry = {
+            'url': cache_key(url),
+            'body': digest,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'encoding': encoding,
+            'fetched_at': time.time(),
+        }
+        self._write_atomic(self._meta_path(url), json.dumps(entry).encode('utf-8'))
+        return entry
+
+    def touch(self, entry, headers):
+        # A 304 may carry fresh validators.
+        entry['etag'] = headers.get('ETag') or entry.get('etag')
+        entry['last_modified'] = headers.get('Last-Modified') or entry.get('last_modified')
+        entry['fetched_at'] = time.time()
+        self._write_atomic(self._meta_path(entry['url']), json.dumps(entry).encode('utf-8'))
+
+    def summary(self):
+        return ', '.join(f"{count} {name}" for name, count in self.stats.items())
+
+
+def cached_get(url, session=None, headers=None, cache=None, **kwargs):
+    # polite_get with the on-disk cache in front: fresh entries cost nothing, stale ones a
+    # conditional request, and offline mode never touches the network.
+    cache = cache or get_cache()
+    entry = cache.lookup(url)
+    body = cache.read_body(entry) if entry else None
+    if body is not None and (cache.offline or cache.is_fresh(entry)):
+        cache.stats['fresh'] += 1
+        return CachedResponse(url, 200, body, encoding=entry.get('encoding'), from_cache=True)
+    if cache.offline:
+        cache.stats['missed'] += 1
+        raise CacheMiss(f"Not in cache (offline mode): {url}")
+
+    request_headers = dict(headers or {})
+    if body is not None:
+        request_headers.update(cache.conditional_headers(entry))
+    response = polite_get(url, session=session, headers=request_headers, **kwargs)
+
+    if response.status_code == 304 and body is not None:
+        cache.touch(entry, response.headers)
+        cache.stats['revalidated'] += 1
+        return CachedResponse(url, 200, body, response.headers, entry.get('encoding'), from_cache=True)
+    if response.status_code == 200:
+        cache.store(url, response.content, response.headers, response.encoding)
+        cache.stats['downloaded'] += 1
+    return response
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+def configure(directory=DEFAULT_CACHE_DIR, offline=False):
+    global _cache
+    _cache = ResponseCache(directory, offline)
+    return _cache
+
+
+def add_arguments(parser):
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='on-disk HTTP cache (one directory per monthly snapshot)')
+    parser.add_argument('--offline', action='store_true', help='replay pages from the cache without touching the network')
+
+
+def configure_from_args(args):
+    return configure(args.cache_dir, args.offline)
@@ -0,0 +1,207 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Shared HTTP client: pooled keep-alive session, optional HTTP/2, retries, timeouts and latency metrics
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from telemetry import get_telemetry
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx only speaks HTTP/2 with the h2 package installed)
+except ImportError:
+    httpx = None
+
+DEFAULT_TIMEOUT = (5.0, 20.0)   # (connect, read) seconds
+DEFAULT_RETRIES = 3
+BACKOFF_FACTOR = 0.3
+# 429/503 are left to the politeness scheduler, which honours Retry-After.
+RETRY_STATUSES = (500, 502, 504)
+POOL_SIZE = 16
+
+
+def requests_retry_session(
+    retries=DEFAULT_RETRIES,
+    backoff_factor=BACKOFF_FACTOR,
+    status_forcelist=RETRY_STATUSES,
+    session=None,
+    pool_size=POOL_SIZE,
+):
+    session = session or requests.Session()
+    retry = Retry(
+        total=retries,
+        read=retries,
+        connect=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def http2_available():
+    return httpx is not None
+
+
+class Http2Response:
+    # The subset of requests.Response the stages use, over an httpx response.
+    def __init__(self, response):
+        self.url = str(response.url)
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.content = response.content
+        self.encoding = response.encoding
+        self.http_version = response.http_version
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class Http2Session:
+    # httpx client multiplexing requests over one HTTP/2 connection per host. Connection errors
+    # and RETRY_STATUSES are retried with the same backoff as requests_retry_session, and httpx
+    # errors surface as requests exceptions so the stages' error handling is unchanged.
+    def __init__(self, retries=DEFAULT_RETRIES, backoff_factor=BACKOFF_FACTOR, status_forcelist=RETRY_STATUSES,
+                 pool_size=POOL_SIZE):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.client = httpx.Client(http2=True, follow_redirects=True,
+                                   limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+
+    def get(self, url, headers=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.client.get(url, headers=headers, timeout=timeout, **kwargs)
+            except httpx.TimeoutException as e:
+                if attempt == self.retries:
+                    raise requests.Timeout(str(e))
+            except httpx.HTTPError as e:
+                if attempt == self.retries:
+                    raise requests.ConnectionError(str(e))
+            else:
+                if response.status_code not in self.status_forcelist or attempt == self.retries:
+                    return Http2Response(response)
+            time.sleep(self.backoff_factor * (2 ** attempt))
+
+    def connections(self):
+        return None
+
+    def close(self):
+        self.client.close()
+
+
+class HttpClient:
+    # One pooled session shared by every request of a stage, so connections to the site are
+    # opened once and kept alive instead of a TCP+TLS handshake per page.
+    def __init__(self, retries=DEFAULT_RETRIES, backoff_factor=BACKOFF_FACTOR, timeout=DEFAULT_TIMEOUT,
+                 pool_size=POOL_SIZE, http2=False):
+        self.timeout = timeout
+        self.http2 = http2 and http2_available()
+        if self.http2:
+            self.session = Http2Session(retries, backoff_factor, pool_size=pool_size)
+        else:
+            self.session = requests_retry_session(retries, backoff_factor, pool_size=pool_size)
+        self.latencies = []
+        self.stats = {'requests': 0, 'errors': 0}
+        self.lock = threading.Lock()
+
+    def get(self, url, timeout=None, **kwargs):
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException:
+            self._record(time.monotonic() - started, error=True)
+            get_telemetry().request(None, total=time.monotonic() - started)
+            raise
+        elapsed = time.monotonic() - started
+        self._record(elapsed)
+        # requests' `elapsed` stops once the headers are parsed; urllib3 keeps the retries it made.
+        ttfb = response.elapsed.total_seconds() if getattr(response, 'elapsed', None) is not None else None
+        retries = getattr(getattr(response, 'raw', None), 'retries', None)
+        get_telemetry().request(response.status_code, len(response.content), elapsed, ttfb,
+                                len(retries.history) if retries is not None else 0)
+        return response
+
+    def _record(self, elapsed, error=False):
+        with self.lock:
+            self.latencies.append(elapsed)
+            self.stats['requests'] += 1
+            if error:
+                self.stats['errors'] += 1
+
+    def connections(self):
+        # Connections opened so far (urllib3 pools only); None when it cannot be counted.
+        if self.http2:
+            return self.session.connections()
+        opened = 0
+        for adapter in self.session.adapters.values():
+            for key in adapter.poolmanager.pools.keys():
+                opened += adapter.poolmanager.pools[key].num_connections
+        return opened
+
+    def percentile(self, fraction):
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def summary(self):
+        if not self.stats['requests']:
+            return "no requests"
+        connections = self.connections()
+        over = f" over {connections} connections" if connections is not None else ""
+        protocol = 'HTTP/2' if self.http2 else 'HTTP/1.1'
+        return (f"{self.stats['requests']} {protocol} requests{over}, {self.stats['errors']} errors, "
+                f"latency p50 {self.percentile(0.5) * 1000:.0f}ms, p95 {self.percentile(0.95) * 1000:.0f}ms, "
+                f"max {self.percentile(1.0) * 1000:.0f}ms")
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
+
+
+def configure(retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT, pool_size=POOL_SIZE, http2=False):
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = HttpClient(retries=retries, timeout=timeout, pool_size=pool_size, http2=http2)
+    if http2 and not _client.http2:
+        print("httpx[http2] is not installed; using HTTP/1.1 keep-alive")
+    return _client
+
+
+def add_arguments(parser):
+    parser.add_argument('--http2', action='store_true', help='multiplex requests over HTTP/2 (needs httpx[http2])')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT[1], help='read timeout per request in seconds')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='retries for connection errors and 5xx responses')
+
+
+def configure_from_args(args):
+    return configure(retries=args.retries, timeout=(DEFAULT_TIMEOUT[0], args.timeout), http2=args.http2)
@@ -0,0 +1,168 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Streaming JSON Lines storage for per-brand spec output
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import json
+import os
+import shutil
+import time
+
+BRAND_DIR = 'brand_specs'
+FSYNC_EVERY = 50         # records
+FSYNC_INTERVAL = 5.0     # seconds
+
+
+def brand_path(brand, directory=BRAND_DIR):
+    return os.path.join(directory, f'{brand}_specs.jsonl')
+
+
+class JsonlWriter:
+    # Appends one JSON record per line to `{path}.part` and fsyncs in batches, so a crash loses
+    # at most the last batch. commit() atomically renames the part file over `path`.
+    #
+    # An existing part file (from an interrupted run) is continued rather than truncated, and
+    # records whose `key` field was already written are skipped; `key` may also be a tuple of
+    # fields, compared together (missing fields as ''). With append=True an existing
+    # committed file (or legacy .json) is copied into the part file first, so new records are
+    # added to it.
+    def __init__(self, path, key=None, append=False, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.part_path = path + '.part'
+        self.key = key
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.keys = set()
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(self.part_path):
+            self._recover()
+        elif append and os.path.exists(path):
+            shutil.copyfile(path, self.part_path)
+        elif append and path.endswith('.jsonl') and os.path.exists(path[:-1]):
+            # Carries a legacy pretty-printed {brand}_specs.json over into JSON Lines.
+            with open(self.part_path, 'w', encoding='utf-8') as f:
+                for record in iter_brand_records(path[:-1]):
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if key and os.path.exists(self.part_path):
+            self.keys = {self._key_of(record) for record in iter_jsonl(self.part_path)}
+        self.file = open(self.part_path, 'a', encoding='utf-8')
+
+    def _recover(self):
+        # Drops a torn last line left by a crash in the middle of a write.
+        with open(self.part_path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                f.truncate(end)
+
+    def _key_of(self, record):
+        if isinstance(self.key, tuple):
+            return tuple(record.get(field) or '' for field in self.key)
+        return record.get(self.key)
+
+    def write(self, record):
+        if self.key:
+            value = self._key_of(record)
+            if value in self.keys:
+                return False
+            self.keys.add(value)
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every or time.monotonic() - self.synced_at >= self.fsync_interval:
+            self.sync()
+        return True
+
+    def write_many(self, records):
+        # Records sharing one key (the rows of one spec page), written together with a single
+        # write; skipped as a whole when the key was already written.
+        if not records:
+            return False
+        if self.key:
+            value = self._key_of(records[0])
+            if value in self.keys:
+                return False
+            self.keys.add(value)
+        self.file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        self.unsynced += len(records)
+        if self.unsynced >= self.fsync_every or time.monotonic() - self.synced_at >= self.fsync_interval:
+            self.sync()
+        return True
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def commit(self):
+        self.sync()
+        self.file.close()
+        os.replace(self.part_path, self.path)
+
+    def close(self):
+        # Leaves the part file in place to be continued by the next run.
+        self.sync()
+        self.file.close()
+
+
+def iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Torn last line of an interrupted write.
+                continue
+
+
+def brand_files(directory=BRAND_DIR):
+    # {brand: path}; JSON Lines output wins over a legacy pretty-printed {brand}_specs.json.
+    files = {}
+    if not os.path.isdir(directory):
+        return files
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('_specs.json'):
+            files.setdefault(filename[:-len('_specs.json')], os.path.join(directory, filename))
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('_specs.jsonl'):
+            files[filename[:-len('_specs.jsonl')]] = os.path.join(directory, filename)
+    return files
+
+
+def iter_brand_records(path):
+    if path.endswith('.jsonl'):
+        yield from iter_jsonl(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+
+def iter_all_records(directory=BRAND_DIR):
+    for brand, path in brand_files(directory).items():
+        yield from iter_brand_records(path)
+
+
+def rewrite_brand(brand, update, directory=BRAND_DIR):
+    # Streams a brand file through update(record) -> record into a fresh JSON Lines file and
+    # atomically replaces the brand file with it. Returns the new path.
+    source = brand_files(directory)[brand]
+    path = brand_path(brand, directory)
+    if os.path.exists(path + '.part'):
+        os.remove(path + '.part')
+    writer = JsonlWriter(path)
+    try:
+        for record in iter_brand_records(source):
+            writer.write(update(record))
+    except BaseException:
+        writer.close()
+        os.remove(writer.part_path)
+        raise
+    writer.commit()
+    return path
@@ -0,0 +1,191 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Lazy, column-pruned access to the crawled corpus for analysis (stage 06)
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+import dataset_export
+from dataset_export import BASE_COLUMNS, DEFAULT_DATASET, select_spec_block
+from jsonl_store import BRAND_DIR, brand_files, iter_brand_records
+from spec_normalise import FIELDS, normalise, parse_number
+
+# Columns computed from others rather than read: canonical spec columns come out of
+# spec_normalise from their `section.key` sources, horsepower_hp from the listing.
+DERIVED = {column: pattern for column, (pattern, _) in FIELDS.items()}
+DERIVED.update({
+    'displacement_l': DERIVED['displacement_cc'],
+    'power_kw': DERIVED['power_hp'],
+    'fuel_combined_mpg': DERIVED['fuel_combined_l100km'],
+})
+
+
+def _read_brand(path, brand, fields, patterns):
+    # Runs in a worker process: one pass over a brand file keeping only `fields` (listing
+    # columns or exact `section.key` names) and spec columns matching `patterns`. Returns
+    # plain lists, which pickle far smaller than the records.
+    fields = set(fields)
+    patterns = [re.compile(pattern) for pattern in patterns]
+    base = [field for field in fields if field in BASE_COLUMNS]
+    wanted = {}  # `section.key` -> keep?, decided once per distinct key
+    columns = {field: [] for field in base}
+    rows = 0
+    for record in iter_brand_records(path):
+        for field in base:
+            columns[field].append(record.get(field))
+        for section, values in select_spec_block(record).items():
+            items = values.items() if isinstance(values, dict) else [(None, values)]
+            for key, value in items:
+                name = f'{section}.{key}' if key is not None else f'spec.{section}'
+                keep = wanted.get(name)
+                if keep is None:
+                    keep = wanted[name] = name in fields or any(pattern.search(name) for pattern in patterns)
+                if keep:
+                    column = columns.get(name)
+                    if column is None:
+                        column = columns[name] = [None] * rows
+                    column.append(None if value is None else str(value))
+        rows += 1
+        for column in columns.values():
+            if len(column) < rows:
+                column.append(None)
+    return brand, rows, columns
+
+
+def _read_partition(dataset, brand, columns):
+    import pyarrow.parquet as pq
+    path = os.path.join(dataset_export.partition_dir(dataset, brand), dataset_export.PART_FILE)
+    table = pq.read_table(path, columns=columns)
+    return brand, table.num_rows, table.to_pydict()
+
+
+class SpecDataset:
+    # The corpus as a table that is never materialised whole. load(columns) reads just the
+    # source fields those columns need and keeps every parsed column for later calls, so a
+    # script plotting a few columns at a time reads each field once.
+    #
+    # Rows come from the Parquet dataset when its export is current for every brand file
+    # (only the needed column chunks are read), else from the brand files, one worker
+    # process per file. Either way rows are in brand order, then file order.
+    def __init__(self, directory=BRAND_DIR, dataset=DEFAULT_DATASET, workers=None):
+        self.directory = directory
+        self.dataset = dataset
+        self.workers = workers
+        self.files = brand_files(directory)
+        self.source = None
+        self.frame = None
+        self.read = set()  # source fields and patterns already read
+
+    def _parquet_current(self):
+        if not self.dataset or not dataset_export.available():
+            return False
+        manifest = dataset_export._read_manifest(self.dataset)
+        exported = manifest.get('brands', {})
+        if manifest.get('base_columns') != list(BASE_COLUMNS) or set(exported) != set(self.files):
+            return False
+        return all(exported[brand]['signature'] == dataset_export._signature(path) for brand, path in self.files.items())
+
+    def _sources(self, columns):
+        # Listing fields, exact spec columns and derived-column patterns a set of columns needs.
+        fields, patterns = set(), set()
+        for column in columns:
+            if column == 'brand':
+                continue
+            if column == 'horsepower_hp':
+                fields.add('horsepower')
+            elif column in DERIVED:
+                patterns.add(DERIVED[column])
+            else:
+                fields.add(column)
+        return fields - self.read, patterns - self.read
+
+    def _read_files(self, fields, patterns):
+        brands = list(self.files)
+        if self.workers == 0:
+            results = [_read_brand(self.files[brand], brand, fields, patterns) for brand in brands]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(_read_brand, [self.files[brand] for brand in brands], brands,
+                                            [fields] * len(brands), [patterns] * len(brands)))
+        return results
+
+    def _read_parquet(self, fields, patterns):
+        manifest = dataset_export._read_manifest(self.dataset)
+        available = set(BASE_COLUMNS) | set(manifest['columns'])
+        compiled = [re.compile(pattern) for pattern in patterns]
+        columns = sorted(column for column in available
+                         if column in fields or any(pattern.search(column) for pattern in compiled))
+        brands = list(self.files)
+        # pyarrow decodes outside the GIL, so threads are enough here.
+        with ThreadPoolExecutor(max_workers=self.workers or None) as executor:
+            return list(executor.map(lambda brand: _read_partition(self.dataset, brand, columns), brands))
+
+    def _load_sources(self, fields, patterns):
+        if self.source is None:
+            self.source = 'parquet' if self._parquet_current() else 'files'
+        results = (self._read_parquet if self.source == 'parquet' else self._read_files)(fields, patterns)
+        frames = []
+        for brand, rows, columns in results:
+            frame = pd.DataFrame(columns, index=range(rows)) if columns else pd.DataFrame(index=range(rows))
+            frame.insert(0, 'brand', brand)
+            frames.append(frame)
+        loaded = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({'brand': []})
+        if self.frame is None:
+            self.frame = loaded
+        else:
+            new = [column for column in loaded.columns if column not in self.frame.columns]
+            self.frame = pd.concat([self.frame, loaded[new]], axis=1)
+        # Fields no brand has (e.g. a column that was never crawled) stay all-NaN.
+        for field in fields:
+            if field not in self.frame.columns:
+                self.frame[field] = None
+        self.read |= fields | patterns
+
+    def load(self, columns):
+        # DataFrame with exactly `columns`, read on first use and served from memory after.
+        columns = list(columns)
+        fields, patterns = self._sources(columns)
+        if fields or patterns or self.frame is None:
+            self._load_sources(fields, patterns)
+        missing = [column for column in columns if column not in self.frame.columns]
+        derived = [column for column in missing if column in DERIVED]
+        if derived:
+            normalised = normalise(self.frame)
+            for column in derived:
+                self.frame[column] = normalised[column]
+        if 'horsepower_hp' in missing:
+            self.frame['horsepower_hp'] = parse_number(self.frame['horsepower'])
+        return self.frame[columns]
+
+
+_dataset = None
+
+
+def get_dataset():
+    global _dataset
+    if _dataset is None:
+        _dataset = SpecDataset()
+    return _dataset
+
+
+def configure(directory=BRAND_DIR, dataset=DEFAULT_DATASET, workers=None):
+    global _dataset
+    _dataset = SpecDataset(directory, dataset, workers)
+    return _dataset
+
+
+def add_arguments(parser):
+    parser.add_argument('--brand-dir', default=BRAND_DIR, help='brand files to read')
+    parser.add_argument('--read-workers', type=int, default=None,
+                        help='processes reading brand files (0 reads in this process)')
+    parser.add_argument('--no-parquet', dest='parquet', action='store_false',
+                        help='read the brand files even when the Parquet dataset is current')
+
+
+def configure_from_args(args):
+    return configure(args.brand_dir, DEFAULT_DATASET if args.parquet else None, args.read_workers)
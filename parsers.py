@@ -0,0 +1,340 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# HTML extractors shared by the crawl stages
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import hashlib
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from engine_titles import brand_prefix, parse_engine_title
+from profiling import hot
+from telemetry import timed
+
+# lxml builds the tree in C, and every extractor hands it a SoupStrainer so only the
+# subtrees it reads (engine blocks, carmod divs, ...) are turned into Python objects.
+PARSER = 'lxml'
+SCOPED = True
+
+
+def _classes(*names):
+    # Matches an element carrying any of the given CSS classes. The regex works whether bs4
+    # hands the strainer the raw class string or each class separately.
+    return re.compile(r'(^|\s)(' + '|'.join(map(re.escape, names)) + r')(\s|$)')
+
+
+INDEX_STRAINER = SoupStrainer(['div', 'a'], class_=_classes('breadcrumb2', 'carbrnum', 'carman', 'car-brand-logo', 'carnums'))
+MANUFACTURER_STRAINER = SoupStrainer(['div', 'a'], class_=_classes('carman', 'car-brand-logo'))
+BRAND_STRAINER = SoupStrainer(['h1', 'div'], class_=_classes('newstitle', 'brandinfo', 'carmod'))
+MODEL_STRAINER = SoupStrainer(['h1', 'a', 'div'], class_=_classes('innews', 'mpic', 'mot'))
+SPEC_STRAINER = SoupStrainer('div', class_=_classes('engine-block'))
+GENERAL_INFO_STRAINER = SoupStrainer('div', class_=_classes('newstext', 'sbox10'))
+
+
+def _class_attribute(name):
+    # Byte-regex counterpart of _classes() for a raw tag: a class attribute, quoted either way
+    # or bare, that carries `name` among its whitespace-separated classes.
+    name = re.escape(name.encode('ascii'))
+    return (rb'class\s*=\s*(?:"(?:[^"]*\s)?' + name + rb'(?:\s[^"]*)?"'
+            rb"|'(?:[^']*\s)?" + name + rb"(?:\s[^']*)?'"
+            rb'|' + name + rb'(?=[\s>]))')
+
+
+# Spec region of a page (the title of each engine block and the techdata tables), located
+# with byte regexes so a page can be fingerprinted without building any tree. Only an
+# engine block's first h3 counts, as in parse_specs(); sidebar and news h3s are chrome.
+ENGINE_BLOCK_TAG = rb'<div\b[^>]*' + _class_attribute('engine-block') + rb'[^>]*>'
+FINGERPRINT_PATTERN = re.compile(
+    ENGINE_BLOCK_TAG + rb'(?:(?!' + ENGINE_BLOCK_TAG + rb').)*?(?P<title><h3\b[^>]*>.*?</h3>)'
+    rb'|<table\b[^>]*' + _class_attribute('techdata') + rb'[^>]*>.*?</table>',
+    re.S | re.I,
+)
+NOISE_PATTERN = re.compile(rb'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->', re.S | re.I)
+WHITESPACE_PATTERN = re.compile(rb'\s+')
+
+MODEL_TITLE_SUFFIX = re.compile(r'\s+Models/Series Timeline, Specifications & Photos$')
+FUEL_SUFFIX = re.compile(r'\s+ENGINES$')
+
+
+def make_soup(html_content, strainer=None):
+    return BeautifulSoup(html_content, PARSER, parse_only=strainer if SCOPED else None)
+
+
+def _text(element):
+    return element.text.strip() if element else ''
+
+
+@timed('extract_info')
+def extract_info(html_content):
+    soup = make_soup(html_content, INDEX_STRAINER)
+    manufacturers = []
+
+    # Extract update date
+    update_date = soup.find('div', class_='breadcrumb2').find('div', class_='fr').text.strip()
+
+    # Extract brand count
+    brand_count = soup.find('div', id='newscol3', class_='col3width carbrnum').text.strip()
+    brand_count_match = re.search(r'(\d+)', brand_count)
+    brand_count = brand_count_match.group(1) if brand_count_match else "Unknown"
+
+    # Find all manufacturer blocks
+    manufacturer_blocks = soup.find_all(['div', 'a'], class_=['col2width fl bcol-white carman', 'car-brand-logo'])
+
+    for block in manufacturer_blocks:
+        name_elem = block.find(['h5', 'img'])
+        if not name_elem:
+            continue
+
+        if name_elem.name == 'img':
+            name = name_elem['alt'].replace(' logo', '')
+        else:
+            name = name_elem.text.strip()
+
+        img = block.find('img')
+        anchor = block.find('a')
+        logo_url = img['src'] if img else ''
+        link = "https://www.autoevolution.com" + anchor['href'] if anchor else ''
+
+        numbers_div = block.find_next_sibling('div', class_='col3width fl carnums')
+        in_production = 0
+        discontinued = 0
+
+        if numbers_div:
+            numbers = numbers_div.text
+            in_production_match = re.search(r'(\d+)\s*in production', numbers)
+            discontinued_match = re.search(r'(\d+)\s*discontinued', numbers)
+
+            in_production = int(in_production_match.group(1)) if in_production_match else 0
+            discontinued = int(discontinued_match.group(1)) if discontinued_match else 0
+
+        manufacturers.append({
+            'name': name,
+            'logo_url': logo_url,
+            'link': link,
+            'in_production': in_production,
+            'discontinued': discontinued
+        })
+
+    return update_date, brand_count, manufacturers
+
+
+@timed('extract_manufacturers')
+def extract_manufacturers(html_content):
+    soup = make_soup(html_content, MANUFACTURER_STRAINER)
+    manufacturers = []
+
+    manufacturer_blocks = soup.find_all(['div', 'a'], class_=['col2width fl bcol-white carman', 'car-brand-logo'])
+
+    for block in manufacturer_blocks:
+        name_elem = block.find(['h5', 'img'])
+        if not name_elem:
+            continue
+
+        if name_elem.name == 'img':
+            name = name_elem['alt'].replace(' logo', '')
+        else:
+            name = name_elem.text.strip()
+
+        anchor = block.find('a')
+        link = anchor['href'] if anchor else ''
+
+        manufacturers.append({
+            'name': name,
+            'link': link
+        })
+
+    return manufacturers
+
+
+def _brand_info(soup):
+    brand_name = soup.find('h1', class_='newstitle').text.strip()
+    brand_name = re.sub(r'Models & Brand History', '', brand_name).strip()
+
+    info_div = soup.find('div', class_='brandinfo')
+    production_models = info_div.find('b', class_='col-green2').text if info_div else '0'
+    discontinued_models = info_div.find('b', class_='col-red').text if info_div else '0'
+
+    return brand_name, int(production_models), int(discontinued_models)
+
+
+def _models(soup):
+    models = []
+
+    for model_div in soup.find_all('div', class_='carmod'):
+        model_name = model_div.find('h4').text.strip()
+        body = model_div.find('p', class_='body')
+        eng = model_div.find('p', class_='eng')
+        body_type = body.text.strip() if body else ''
+        fuel_types = [span.text.strip() for span in eng.find_all('span')] if eng else []
+        generations = _text(model_div.find('b'))
+        years = _text(model_div.find('span'))
+
+        # Extract production years
+        production_years = re.search(r'\((\d{4})\s*-\s*(Present|\d{4})\)', years)
+        if production_years:
+            start_year = production_years.group(1)
+            end_year = production_years.group(2)
+            production_years = f"{start_year} - {end_year}"
+        else:
+            production_years = "N/A"
+
+        # Determine if the model is in production or discontinued
+        status = "PRODUCTION" if "Present" in years else "DISCONTINUED"
+
+        img = model_div.find('img')
+        image_url = img['src'] if img else ''
+
+        anchor = model_div.find('a')
+        link = anchor['href'] if anchor else ''
+
+        models.append({
+            'model_name': model_name,
+            'body_type': body_type,
+            'fuel_types': ', '.join(fuel_types),
+            'generations': generations,
+            'production_years': production_years,
+            'status': status,
+            'image_url': image_url,
+            'model_link': link
+        })
+
+    return models
+
+
+@timed('extract_brand_info')
+def extract_brand_info(html_content):
+    return _brand_info(make_soup(html_content, BRAND_STRAINER))
+
+
+@timed('extract_models')
+def extract_models(html_content):
+    return _models(make_soup(html_content, BRAND_STRAINER))
+
+
+@timed('parse_brand_page')
+def parse_brand_page(html_content):
+    # Brand name, model counts and model list from a single scoped parse.
+    soup = make_soup(html_content, BRAND_STRAINER)
+    brand_name, production_models, discontinued_models = _brand_info(soup)
+    return brand_name, production_models, discontinued_models, _models(soup)
+
+
+@hot()
+@timed('extract_model_info')
+def extract_model_info(html_content, brand):
+    soup = make_soup(html_content, MODEL_STRAINER)
+
+    model_name_full = soup.find('h1', class_='padsides_20i mgtop_10 nomgbot newstitle innews').text.strip()
+    # Remove brand name and extra text
+    model_name = brand_prefix(brand).sub('', model_name_full)
+    model_name = MODEL_TITLE_SUFFIX.sub('', model_name)
+
+    image_container = soup.find('a', class_='mpic fr mgtop_20')
+    image = image_container.find('img') if image_container else None
+    image_url = image['src'] if image else "N/A"
+
+    engines = []
+    engine_sections = soup.find_all('div', class_='mot clearfix')
+    for section in engine_sections:
+        fuel_type = section.find('strong').text.strip().replace(':', '').upper()
+        fuel_type = FUEL_SUFFIX.sub('', fuel_type)  # Remove 'ENGINES' from fuel type
+        for engine in section.find_all('a', class_='engurl semibold'):
+            sub_link = engine['href']
+            if sub_link.startswith('https://www.autoevolution.com'):
+                sub_link = sub_link[len('https://www.autoevolution.com'):]
+
+            # engine_name and horsepower as before, plus displacement, power, drivetrain,
+            # transmission and trim pulled out of the link title
+            engines.append({
+                'fuel_type': fuel_type,
+                **parse_engine_title(engine.text, brand, model_name),
+                'sub_link': sub_link
+            })
+
+    return {
+        'model_name': model_name,
+        'image_url': image_url,
+        'engines': engines
+    }
+
+
+@timed('parse_specs')
+def parse_specs(content):
+    soup = make_soup(content, SPEC_STRAINER)
+
+    # Find all engine blocks
+    engine_blocks = soup.find_all('div', class_='engine-block')
+
+    if not engine_blocks:
+        # If no engine blocks found, try to extract general information
+        return extract_general_info(make_soup(content, GENERAL_INFO_STRAINER))
+
+    all_specs = []
+
+    for engine_block in engine_blocks:
+        specs = {}
+
+        # Extract engine name
+        engine_name = engine_block.find('h3')
+        if engine_name:
+            specs['engine_name'] = engine_name.text.strip()
+
+        # Extract all spec tables
+        tables = engine_block.find_all('table', class_='techdata')
+
+        for table in tables:
+            table_title = table.find('th', class_='title')
+            if table_title:
+                section_name = table_title.text.strip().lower().replace(' specs', '')
+                section = specs[section_name] = {}
+
+                for row in table.find_all('tr'):
+                    header = row.find('td', class_='left')
+                    value = row.find('td', class_='right')
+                    if header and value:
+                        key = header.text.strip().replace(':', '').lower()
+                        section[key] = value.text.strip()
+
+        all_specs.append(specs)
+
+    return all_specs
+
+
+def extract_general_info(soup):
+    general_info = {}
+
+    # Try to extract information from the general description
+    description = soup.find('div', class_='newstext')
+    if description:
+        general_info['description'] = description.text.strip()
+
+    # Try to extract any visible specifications
+    spec_boxes = soup.find_all('div', class_='sbox10')
+    for box in spec_boxes:
+        title = box.find('div', class_='tt')
+        if title:
+            section_name = title.text.strip().lower()
+            general_info[section_name] = {}
+            items = box.find_all('li')
+            for item in items:
+                general_info[section_name][item['id']] = item.text.strip()
+
+    return [general_info] if general_info else None
+
+
+@timed('content_fingerprint')
+def content_fingerprint(content):
+    # Normalised hash of the spec region, so ads, timestamps and page chrome changing around
+    # the specs do not count as a change. Pages without techdata fall back to the whole page
+    # minus scripts, styles and comments.
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    sections = [match.group('title') or match.group(0) for match in FINGERPRINT_PATTERN.finditer(content)]
+    sections = sections or [NOISE_PATTERN.sub(b'', content)]
+    digest = hashlib.sha256()
+    for section in sections:
+        digest.update(WHITESPACE_PATTERN.sub(b' ', section).strip())
+        digest.update(b'\0')
+    return digest.hexdigest()
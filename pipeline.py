@@ -0,0 +1,343 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Pipelined crawl: stages 01 -> 04 fused into one streaming run
+# Usage: python pipeline.py --concurrency 8 [--parse-workers 4] [--offline]
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import argparse
+import asyncio
+import csv
+import glob
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import aiohttp
+
+from async_fetch import DEFAULT_HEADERS, fetch_bytes, fetch_cached
+import dataset_export
+import http_cache
+from engine_titles import TITLE_FIELDS
+from http_cache import cache_key
+from jsonl_store import BRAND_DIR, JsonlWriter, brand_path
+from parsers import extract_info, extract_manufacturers, extract_model_info, parse_brand_page, parse_specs
+import politeness
+import profiling
+import spec_store
+from spec_index import SpecIndex
+import telemetry
+from work_queue import fan_out, group_rows
+
+SITE = 'https://www.autoevolution.com'
+INDEX_PATH = '/cars/'
+
+MANUFACTURER_FIELDS = ['name', 'logo_url', 'link', 'in_production', 'discontinued']
+MODEL_FIELDS = ['brand', 'production_models', 'discontinued_models', 'model_name', 'body_type', 'fuel_types',
+                'generations', 'production_years', 'status', 'image_url', 'model_link']
+ENGINE_FIELDS = ['brand', 'model_name', 'fuel_type', 'engine_name', 'horsepower', 'image_url', 'sub_link', *TITLE_FIELDS]
+
+# Workers always take the deepest job first, so spec pages of a brand that is already in
+# flight go out before new model pages are opened and brand files are committed early.
+SPEC, MODEL, BRAND = 0, 1, 2
+KINDS = ('spec', 'model', 'brand')
+
+
+def absolute(link, site=SITE):
+    # Links on the site are either relative or absolute to autoevolution; both are resolved
+    # against `site` so the pipeline can be pointed at a local replay server.
+    if link.startswith(SITE):
+        link = link[len(SITE):]
+    if link.startswith('http'):
+        return link
+    return site + link
+
+
+class CsvSink:
+    # One of the CSV artifacts of the staged scripts, written row by row as it is discovered.
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.file = open(path + '.part', 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        self.writer.writeheader()
+        self.rows = 0
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.rows += 1
+
+    def commit(self):
+        self.file.close()
+        os.replace(self.path + '.part', self.path)
+
+    def close(self):
+        self.file.close()
+
+
+class Pipeline:
+    # Brand pages, model pages and spec pages share one job queue, one aiohttp session and
+    # one politeness budget. Each page queues the pages it links to as soon as it is parsed,
+    # so the first spec pages are fetched while most brand pages are still unread and the
+    # run takes as long as its longest brand -> model -> spec chain rather than the sum of
+    # four stages.
+    #
+    # manufacturers.csv, all_brand_models.csv and detailed_model_info.csv are still written as
+    # side outputs, so stage 04 and stage 05 can be run against them afterwards. Their rows
+    # come out in discovery order; every brand's (and every model's) rows stay together.
+    def __init__(self, site=SITE, concurrency=8, scheduler=None, cache=None, parse_executor=None,
+                 output_dir='.', brand_dir=BRAND_DIR, timeout=10, retries=3):
+        self.site = site
+        self.concurrency = concurrency
+        self.scheduler = scheduler or politeness.get_scheduler()
+        self.cache = cache
+        self.parse_executor = parse_executor
+        self.output_dir = output_dir
+        self.brand_dir = brand_dir
+        self.timeout = timeout
+        self.retries = retries
+        self.queue = asyncio.PriorityQueue()
+        self.order = itertools.count()
+        self.outstanding = 0
+        self.drained = asyncio.Event()
+        self.error = None
+        self.inflight = {}
+        # brand -> pages of the brand still to be processed (model pages and spec pages)
+        self.open_pages = {}
+        self.writers = {}
+        self.stats = {'brands': 0, 'models': 0, 'engines': 0, 'specs': 0, 'failed': 0}
+        self.sub_links = []  # every engine row's spec page, for the fingerprints stage 05 --update compares
+
+    def put(self, priority, job):
+        self.outstanding += 1
+        self.queue.put_nowait((priority, next(self.order), job))
+        telemetry.get_telemetry().add_items(KINDS[priority], 1)
+
+    async def load(self, session, url):
+        if self.cache is not None:
+            return await fetch_cached(session, url, self.scheduler, self.cache, self.loop,
+                                      retries=self.retries, timeout=self.timeout)
+        status, body, _ = await fetch_bytes(session, url, self.scheduler, retries=self.retries, timeout=self.timeout)
+        return body
+
+    async def parse(self, func, *args):
+        return await self.loop.run_in_executor(self.parse_executor, func, *args)
+
+    def load_and_parse_shared(self, session, url, func, *args):
+        # Every engine of a generation lives on one spec page; jobs for the same page share
+        # one download and one parse.
+        page = cache_key(url)
+        task = self.inflight.get(page)
+        if task is None:
+            async def run():
+                return await self.parse(func, await self.load(session, url), *args)
+            task = self.inflight[page] = asyncio.ensure_future(run())
+            task.add_done_callback(lambda _: self.inflight.pop(page, None))
+        return task
+
+    def writer_for(self, brand):
+        writer = self.writers.get(brand)
+        if writer is None:
+            writer = self.writers[brand] = JsonlWriter(brand_path(brand, self.brand_dir), key='sub_link')
+        return writer
+
+    def page_done(self, brand, discovered=0):
+        # A brand file is committed once its brand page, model pages and spec pages are all in.
+        self.open_pages[brand] += discovered - 1
+        if self.open_pages[brand] == 0:
+            del self.open_pages[brand]
+            writer = self.writers.pop(brand, None)
+            if writer is not None:
+                writer.commit()
+                print(f"Completed processing for {brand}. Results saved to {writer.path}")
+                print("-" * 50)
+
+    async def crawl_brand(self, session, url):
+        try:
+            body = await self.load(session, url)
+            brand, production_models, discontinued_models, models = await self.parse(parse_brand_page, body)
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Error fetching the brand page {url}: {e}")
+            return
+        self.stats['brands'] += 1
+        print(f"Processed {brand}: {production_models} in production, {discontinued_models} discontinued, "
+              f"{len(models)} models extracted")
+        for model in models:
+            self.models_csv.write({
+                'brand': brand,
+                'production_models': production_models,
+                'discontinued_models': discontinued_models,
+                **model
+            })
+        self.open_pages[brand] = self.open_pages.get(brand, 0) + len(models) + 1
+        for model in models:
+            self.put(MODEL, (brand, model['model_link']))
+        self.page_done(brand)
+
+    async def crawl_model(self, session, brand, link):
+        engines = []
+        try:
+            body = await self.load(session, absolute(link, self.site))
+            model_info = await self.parse(extract_model_info, body, brand)
+            engines = [{
+                'brand': brand,
+                'model_name': model_info['model_name'],
+                'fuel_type': engine['fuel_type'],
+                'engine_name': engine['engine_name'],
+                'horsepower': engine['horsepower'],
+                'image_url': model_info['image_url'],
+                'sub_link': engine['sub_link'],
+                **{field: engine[field] for field in TITLE_FIELDS}
+            } for engine in model_info['engines']]
+            self.stats['models'] += 1
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Error fetching the model page {link}: {e}")
+        for row in engines:
+            self.engines_csv.write(row)
+            self.sub_links.append(row['sub_link'])
+        # One spec job per sub_link, as in stage 04; every row sharing it is written.
+        groups = group_rows(engines)
+        for rows in groups.values():
+            self.put(SPEC, rows)
+        self.stats['engines'] += len(engines)
+        self.page_done(brand, len(groups))
+
+    async def crawl_spec(self, session, rows):
+        model = dict(rows[0])
+        brand = model['brand']
+        try:
+            specs = await self.load_and_parse_shared(session, absolute(model['sub_link'], self.site), parse_specs)
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Request failed: {e}")
+            print(f"Failed to extract specs for {brand} {model['model_name']}")
+            specs = None
+        if specs:
+            model['specs'] = specs
+            self.stats['specs'] += 1
+        self.writer_for(brand).write_many(fan_out(model, rows))
+        self.page_done(brand)
+
+    async def worker(self, session):
+        while True:
+            priority, _, job = await self.queue.get()
+            telemetry.get_telemetry().gauge('queue_depth', self.queue.qsize(), queue='pipeline')
+            try:
+                if priority == SPEC:
+                    await self.crawl_spec(session, job)
+                elif priority == MODEL:
+                    await self.crawl_model(session, *job)
+                else:
+                    await self.crawl_brand(session, job)
+            except Exception as e:
+                # Page errors are handled per job; anything else (a full disk, ...) stops the run.
+                self.error = e
+                self.drained.set()
+                return
+            telemetry.get_telemetry().item_done(KINDS[priority])
+            self.outstanding -= 1
+            if self.outstanding == 0:
+                self.drained.set()
+
+    async def crawl_index(self, session):
+        url = self.site + INDEX_PATH
+        body = await self.load(session, url)
+        update_date, brand_count, manufacturers = await self.parse(extract_info, body)
+        print(f"업데이트 날짜: {update_date}")
+        print(f"브랜드 수: {brand_count}")
+        print(f"추출된 제조사 수: {len(manufacturers)}")
+        print("-" * 50)
+        for manufacturer in manufacturers:
+            self.manufacturers_csv.write(manufacturer)
+        return [manufacturer['link'] for manufacturer in await self.parse(extract_manufacturers, body)]
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        os.makedirs(self.brand_dir, exist_ok=True)
+        self.manufacturers_csv = CsvSink(os.path.join(self.output_dir, 'manufacturers.csv'), MANUFACTURER_FIELDS)
+        self.models_csv = CsvSink(os.path.join(self.output_dir, 'all_brand_models.csv'), MODEL_FIELDS)
+        self.engines_csv = CsvSink(os.path.join(self.output_dir, 'detailed_model_info.csv'), ENGINE_FIELDS)
+        sinks = (self.manufacturers_csv, self.models_csv, self.engines_csv)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency)
+        try:
+            async with aiohttp.ClientSession(headers=DEFAULT_HEADERS, connector=connector,
+                                             trace_configs=[telemetry.trace_config()]) as session:
+                workers = [asyncio.create_task(self.worker(session)) for _ in range(self.concurrency)]
+                try:
+                    for link in await self.crawl_index(session):
+                        self.put(BRAND, absolute(link, self.site))
+                    if self.outstanding:
+                        await self.drained.wait()
+                    if self.error is not None:
+                        raise self.error
+                finally:
+                    for task in workers:
+                        task.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+        except BaseException:
+            for sink in sinks:
+                sink.close()
+            raise
+        else:
+            for sink in sinks:
+                sink.commit()
+        finally:
+            # Brands cut off by an error keep their part files; see --resume.
+            for writer in self.writers.values():
+                writer.close()
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl brands, models, engines and specs in one pipelined run')
+    parser.add_argument('--concurrency', type=int, default=8, help='maximum number of requests in flight')
+    parser.add_argument('--rate', type=float, default=politeness.DEFAULT_MAX_RATE, help='request-rate ceiling per host in requests per second')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='parse in this many worker processes (0 parses in threads)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the brand part files of an interrupted run instead of starting them over')
+    http_cache.add_arguments(parser)
+    dataset_export.add_arguments(parser)
+    spec_store.add_arguments(parser)
+    telemetry.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    scheduler = politeness.configure(max_rate=args.rate)
+    cache = http_cache.configure_from_args(args)
+    telemetry.configure_from_args(args, 'pipeline')
+    profiling.configure_from_args(args, 'pipeline')
+
+    if not args.resume:
+        for path in glob.glob(os.path.join(BRAND_DIR, '*.part')):
+            os.remove(path)
+
+    if args.parse_workers:
+        executor = ProcessPoolExecutor(max_workers=args.parse_workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=args.concurrency)
+    try:
+        pipeline = Pipeline(concurrency=args.concurrency, scheduler=scheduler, cache=cache, parse_executor=executor)
+        stats = asyncio.run(pipeline.run())
+        print(f"Pipeline: {', '.join(f'{count} {name}' for name, count in stats.items())}")
+
+        # Fingerprint the spec pages just crawled, so stage 05 --update only re-parses later changes.
+        index = SpecIndex()
+        try:
+            index.record_fingerprints(pipeline.sub_links, cache, pipeline.site)
+        finally:
+            index.close()
+
+        # 분석용 Parquet 데이터셋 (브랜드별 파티션)
+        dataset_export.export_from_args(args, BRAND_DIR)
+        spec_store.sync_from_args(args, BRAND_DIR)
+    finally:
+        executor.shutdown(wait=True)
+
+    print(f"Requests: {scheduler.summary()}")
+    print(f"Cache: {cache.summary()}")
+    print(f"Telemetry: {telemetry.finish()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Politeness scheduler shared by every crawl stage
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+from http_client import get_client
+from telemetry import get_telemetry
+
+# Requests per second per host. Each host starts at the ceiling, is cut back on 429/503
+# and climbs back to the ceiling again while responses stay healthy.
+DEFAULT_MAX_RATE = 2.0
+DEFAULT_MIN_RATE = 0.05
+DEFAULT_BURST = 2
+DECREASE_FACTOR = 0.5
+INCREASE_STEP = 0.1  # fraction of the ceiling regained per healthy response
+THROTTLE_STATUSES = (429, 503)
+MAX_THROTTLE_RETRIES = 5
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date.
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self):
+        # Takes a token and returns how long the caller has to wait before using it.
+        # Tokens may go negative, which queues callers behind each other.
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(delay, self.blocked_until - now)
+
+    def block(self, seconds):
+        now = time.monotonic()
+        self._refill(now)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        # No refill while blocked, so the host does not get a burst when the block ends.
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = self.blocked_until
+
+
+class PolitenessScheduler:
+    def __init__(self, max_rate=DEFAULT_MAX_RATE, min_rate=DEFAULT_MIN_RATE, burst=DEFAULT_BURST):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.buckets = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def _host(self, url):
+        return urlsplit(url).netloc
+
+    def _bucket(self, host):
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.max_rate, self.burst)
+            self.stats[host] = {'requests': 0, 'throttled': 0, 'errors': 0,
+                                'wait_seconds': 0.0, 'fetch_seconds': 0.0}
+        return bucket
+
+    def reserve(self, url):
+        host = self._host(url)
+        with self.lock:
+            delay = self._bucket(host).reserve()
+            self.stats[host]['wait_seconds'] += delay
+        return delay
+
+    def acquire(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record(self, url, status, headers=None, elapsed=0.0):
+        # Feeds a response back into the host's bucket. Returns the number of seconds the
+        # server asked us to back off for, or None when the response was not throttled.
+        host = self._host(url)
+        with self.lock:
+            bucket = self._bucket(host)
+            stats = self.stats[host]
+            stats['requests'] += 1
+            stats['fetch_seconds'] += elapsed
+            if status is None:
+                stats['errors'] += 1
+                return None
+            if status in THROTTLE_STATUSES:
+                stats['throttled'] += 1
+                bucket.rate = max(self.min_rate, bucket.rate * DECREASE_FACTOR)
+                backoff = parse_retry_after((headers or {}).get('Retry-After'))
+                if backoff is None:
+                    backoff = 1.0 / bucket.rate
+                bucket.block(backoff)
+                return backoff
+            if status < 500:
+                bucket.rate = min(self.max_rate, bucket.rate + self.max_rate * INCREASE_STEP)
+            return None
+
+    def totals(self):
+        with self.lock:
+            totals = {'requests': 0, 'throttled': 0, 'errors': 0, 'wait_seconds': 0.0, 'fetch_seconds': 0.0}
+            for stats in self.stats.values():
+                for key in totals:
+                    totals[key] += stats[key]
+            totals['rates'] = {host: round(bucket.rate, 3) for host, bucket in self.buckets.items()}
+        return totals
+
+    def summary(self):
+        totals = self.totals()
+        return (f"{totals['requests']} requests, {totals['throttled']} throttled, {totals['errors']} errors, "
+                f"{totals['wait_seconds']:.1f}s waiting, {totals['fetch_seconds']:.1f}s fetching")
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = PolitenessScheduler()
+    return _scheduler
+
+
+def configure(max_rate=DEFAULT_MAX_RATE, min_rate=DEFAULT_MIN_RATE, burst=DEFAULT_BURST):
+    global _scheduler
+    _scheduler = PolitenessScheduler(max_rate=max_rate, min_rate=min_rate, burst=burst)
+    return _scheduler
+
+
+def polite_get(url, session=None, scheduler=None, **kwargs):
+    # GET on the shared pooled client (or the given session) routed through the scheduler; 429/503 responses are retried after backing off.
+    scheduler = scheduler or get_scheduler()
+    session = session or get_client()
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        scheduler.acquire(url)
+        started = time.monotonic()
+        try:
+            response = session.get(url, **kwargs)
+        except requests.RequestException:
+            scheduler.record(url, None, elapsed=time.monotonic() - started)
+            raise
+        backoff = scheduler.record(url, response.status_code, response.headers, time.monotonic() - started)
+        if backoff is None or attempt == MAX_THROTTLE_RETRIES:
+            return response
+        get_telemetry().inc('retries_total', reason='throttled')
@@ -0,0 +1,194 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Sampling profiler with a per-phase split and flame-graph output (--profile)
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005  # seconds between samples
+
+# Phase of a sample: the first frame, walking out from the innermost one, whose module is
+# listed here. Compiled regex methods and lxml run in C, so their time lands on the
+# Python frame that called them; re.search/re.sub and bs4 show up on their own, and
+# engine_titles, which is nothing but compiled-pattern calls, counts as regex.
+PHASES = [
+    ('regex', ('re', 're._compiler', 're._parser', 'sre_compile', 'sre_parse', 'engine_titles')),
+    ('html_parse', ('bs4', 'lxml', 'html.parser', 'html5lib', 'parsers')),
+    ('io', ('json', 'csv', 'gzip', 'sqlite3', 'jsonl_store', 'work_queue', 'spec_index', 'http_cache')),
+    ('network', ('socket', 'ssl', 'selectors', 'http.client', 'urllib3', 'requests', 'aiohttp', 'httpx',
+                 'async_fetch', 'http_client')),
+    ('rate_limit', ('politeness',)),
+    ('dataframe', ('pandas', 'numpy', 'pyarrow', 'spec_normalise', 'dataset_export')),
+    ('plot', ('matplotlib', 'seaborn')),
+]
+# Functions whose work is pattern matching run through C (compiled patterns, Arrow's RE2
+# kernel) or pandas' str.extract. A sample with one of them anywhere on the stack is regex,
+# even when the innermost Python frame is in pandas.
+REGEX_CALLS = {('spec_normalise', 'extract_number'), ('spec_normalise', 'parse_number'),
+               ('spec_normalise', 'source_columns')}
+# Innermost frames of threads that are parked rather than working (pool threads waiting for
+# work, server threads in select). These samples are dropped except on the main thread.
+IDLE = {('threading', 'wait'), ('queue', 'get'), ('selectors', 'select'), ('socketserver', 'serve_forever'),
+        ('concurrent.futures.thread', '_worker')}
+
+
+def _module(frame):
+    return frame.f_globals.get('__name__', '')
+
+
+def classify(frames):
+    # frames: innermost first.
+    if any((_module(frame), frame.f_code.co_name) in REGEX_CALLS for frame in frames):
+        return 'regex'
+    for frame in frames:
+        module = _module(frame)
+        for phase, modules in PHASES:
+            if module in modules or module.split('.')[0] in modules:
+                return phase
+    return 'python'
+
+
+class Profiler:
+    # A daemon thread samples every thread's stack each `interval` seconds. Each sample is
+    # folded into "phase;thread;outer;...;inner" (the input format of flamegraph.pl,
+    # speedscope and inferno) and weighted by the time since the previous pass, since code
+    # holding the GIL (C regex, lxml) delays the sampler well past the interval. Folded
+    # weights are in microseconds.
+    def __init__(self, stage, interval=DEFAULT_INTERVAL):
+        self.stage = stage
+        self.interval = interval
+        self.stacks = Counter()
+        self.phases = Counter()  # phase -> sampled thread-seconds
+        self.samples = 0
+        self.functions = {}  # hot function -> [calls, seconds]
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        main = threading.main_thread().ident
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(frame)
+                    frame = frame.f_back
+                if ident != main and (_module(frames[0]), frames[0].f_code.co_name) in IDLE:
+                    continue
+                phase = classify(frames)
+                stack = ';'.join(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)})"
+                                 for frame in reversed(frames))
+                with self.lock:
+                    self.stacks[f"{phase};{names.get(ident, ident)};{stack}"] += round(weight * 1e6)
+                    self.phases[phase] += weight
+                    self.samples += 1
+
+    def record_call(self, name, seconds):
+        with self.lock:
+            calls = self.functions.setdefault(name, [0, 0.0])
+            calls[0] += 1
+            calls[1] += seconds
+
+    def report(self):
+        with self.lock:
+            sampled = sum(self.phases.values())
+            return {
+                'stage': self.stage,
+                'elapsed_seconds': round(self.elapsed, 3),
+                'interval_seconds': self.interval,
+                'samples': self.samples,
+                # Sampled thread-seconds; busy worker threads add up past the wall clock.
+                'phases': {phase: {'seconds': round(seconds, 3), 'share': round(seconds / sampled, 4)}
+                           for phase, seconds in self.phases.most_common()},
+                'hot_functions': {name: {'calls': calls, 'seconds': round(total, 3)}
+                                  for name, (calls, total) in sorted(self.functions.items(),
+                                                                     key=lambda item: -item[1][1])},
+            }
+
+    def write(self, prefix):
+        with open(prefix + '.folded', 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        report = self.report()
+        with open(prefix + '.json', 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+_profiler = None
+
+
+def hot(name=None):
+    # Wall time and call count of a hot function; costs one global lookup when not profiling.
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _profiler.record_call(label, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def _finish(prefix):
+    _profiler.stop()
+    report = _profiler.write(prefix)
+    split = ', '.join(f"{phase} {stats['share']:.0%}" for phase, stats in report['phases'].items())
+    print(f"Profile: {report['samples']} samples ({split}); flame graph input in {prefix}.folded, "
+          f"summary in {prefix}.json")
+
+
+def configure(stage, prefix, interval=DEFAULT_INTERVAL):
+    # Starts sampling until the process exits, then writes {prefix}.folded and {prefix}.json.
+    global _profiler
+    _profiler = Profiler(stage, interval)
+    _profiler.start()
+    atexit.register(_finish, prefix)
+    return _profiler
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', nargs='?', const='', metavar='PREFIX',
+                        help='sample the run and write PREFIX.folded (flame graph) and PREFIX.json '
+                             '(default prefix profile_<stage>)')
+    parser.add_argument('--profile-interval', type=float, default=DEFAULT_INTERVAL * 1000,
+                        help='sampling interval in milliseconds')
+
+
+def configure_from_args(args, stage):
+    if args.profile is None:
+        return None
+    return configure(stage, args.profile or f'profile_{stage}', args.profile_interval / 1000)
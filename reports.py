@@ -0,0 +1,298 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Reporting stage: stage 06's charts from a cached aggregate layer, rendered headless in parallel
+# Usage: python reports.py [--out reports] [--workers 4] [--force]
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import lazy_dataset
+import profiling
+import spec_normalise
+
+DEFAULT_OUT = 'reports'
+# Bump when a renderer changes, so every chart is redrawn once.
+RENDER_VERSION = 1
+# Bump when compute_aggregates or a helper it uses changes, so cached aggregates are recomputed.
+AGGREGATE_VERSION = 1
+COLUMNS = ['brand', 'fuel_type', 'horsepower_hp', 'displacement_l', 'fuel_combined_mpg']
+HIST_BINS = 40
+KDE_POINTS = 200
+SCATTER_DECIMALS = 2
+
+
+def corpus_version(files):
+    # Brand files by size and mtime, the same change test the dataset export and spec index use.
+    digest = hashlib.sha256()
+    for brand, path in sorted(files.items()):
+        stat = os.stat(path)
+        digest.update(f"{brand}\0{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _normalisation():
+    # spec_normalise's column patterns, units and conversions (a converter by its code and
+    # factor), plus the columns lazy_dataset derives from them.
+    def converter(convert):
+        return [convert.__code__.co_code.hex(), [cell.cell_contents for cell in convert.__closure__ or ()]]
+    fields = [[column, pattern, [[unit, converter(convert)] for unit, convert in units]]
+              for column, (pattern, units) in sorted(spec_normalise.FIELDS.items())]
+    return [spec_normalise.NUMBER, fields, sorted(lazy_dataset.DERIVED.items())]
+
+
+def aggregate_key(version):
+    # The corpus version plus everything else the aggregates depend on, so a change to the
+    # aggregation code or the spec normalisation does not serve stale aggregates.
+    code = [AGGREGATE_VERSION, COLUMNS, HIST_BINS, KDE_POINTS, SCATTER_DECIMALS, _normalisation()]
+    return f"{version}-{hashlib.sha256(json.dumps(code).encode('utf-8')).hexdigest()[:8]}"
+
+
+def _digest(data):
+    return hashlib.sha256(json.dumps([RENDER_VERSION, data], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Aggregates. Each chart keeps only what it draws: counts, box statistics, a binned
+# histogram with its density curve, or deduplicated scatter points.
+
+def _counts(series, top=None):
+    counts = series[series.notna() & (series != '')].value_counts()
+    if top:
+        counts = counts.head(top)
+    return {'labels': [str(label) for label in counts.index], 'values': [int(value) for value in counts.values]}
+
+
+def _box_stats(df, column):
+    from matplotlib.cbook import boxplot_stats
+    valid = df.dropna(subset=['fuel_type', column])
+    valid = valid[valid['fuel_type'] != '']
+    stats = []
+    for fuel_type, values in valid.groupby('fuel_type')[column]:
+        box = boxplot_stats(values.to_numpy())[0]
+        stats.append({key: (value.tolist() if isinstance(value, np.ndarray) else float(value))
+                      for key, value in box.items() if key != 'cilo' and key != 'cihi'})
+        stats[-1]['label'] = str(fuel_type)
+    return stats
+
+
+def _histogram(values):
+    values = values.dropna().to_numpy(dtype='float64')
+    if not len(values):
+        return {'edges': [], 'counts': [], 'kde_x': [], 'kde_y': []}
+    counts, edges = np.histogram(values, bins=HIST_BINS)
+    kde_x, kde_y = [], []
+    std = values.std()
+    if len(values) > 1 and std > 0:
+        # Gaussian KDE with Scott's bandwidth, scaled to counts per bin like seaborn's kde=True.
+        bandwidth = std * len(values) ** (-1 / 5)
+        grid = np.linspace(edges[0], edges[-1], KDE_POINTS)
+        density = np.zeros_like(grid)
+        for chunk in np.array_split(values, max(1, len(values) // 10000)):
+            density += np.exp(-0.5 * ((grid[:, None] - chunk[None, :]) / bandwidth) ** 2).sum(axis=1)
+        density /= len(values) * bandwidth * np.sqrt(2 * np.pi)
+        kde_x = grid.tolist()
+        kde_y = (density * len(values) * (edges[1] - edges[0])).tolist()
+    return {'edges': edges.tolist(), 'counts': counts.tolist(), 'kde_x': kde_x, 'kde_y': kde_y}
+
+
+def _scatter(df, x, y):
+    valid = df.dropna(subset=[x, y, 'fuel_type'])
+    valid = valid[valid['fuel_type'] != '']
+    points = valid.assign(**{x: valid[x].round(SCATTER_DECIMALS), y: valid[y].round(SCATTER_DECIMALS)})
+    points = points.drop_duplicates(subset=['fuel_type', x, y]).sort_values(['fuel_type', x, y])
+    return {'fuel_type': points['fuel_type'].astype(str).tolist(), 'x': points[x].tolist(), 'y': points[y].tolist()}
+
+
+def compute_aggregates(dataset):
+    # One pass over the columns every chart needs; lazy_dataset reads each field once.
+    df = dataset.load(COLUMNS)
+    return {
+        'brand_model_count': _counts(df['brand'], top=20),
+        'fuel_type_distribution': _counts(df['fuel_type']),
+        'horsepower_distribution': _histogram(df['horsepower_hp']),
+        'horsepower_by_fuel_type': _box_stats(df, 'horsepower_hp'),
+        'engine_size_vs_fuel_economy': _scatter(df, 'displacement_l', 'fuel_combined_mpg'),
+        'fuel_economy_by_fuel_type': _box_stats(df, 'fuel_combined_mpg'),
+        'engine_size_distribution': _histogram(df['displacement_l']),
+    }
+
+
+# Renderers; run in worker processes on the Agg backend.
+
+def _bar(plt, data):
+    import seaborn as sns
+    plt.figure(figsize=(12, 6))
+    sns.barplot(x=data['labels'], y=data['values'])
+    plt.title('Top 20 Brands by Number of Models')
+    plt.xlabel('Brand')
+    plt.ylabel('Number of Models')
+    plt.xticks(rotation=45)
+
+
+def _pie(plt, data):
+    plt.figure(figsize=(10, 6))
+    plt.pie(data['values'], labels=data['labels'], autopct='%1.1f%%')
+    plt.title('Distribution of Fuel Types')
+    plt.axis('equal')
+
+
+def _hist(title, xlabel):
+    def render(plt, data):
+        plt.figure(figsize=(12, 6))
+        if data['counts']:
+            edges = np.asarray(data['edges'])
+            plt.bar(edges[:-1], data['counts'], width=np.diff(edges), align='edge', alpha=0.6, edgecolor='white')
+            if data['kde_x']:
+                plt.plot(data['kde_x'], data['kde_y'])
+        plt.title(title)
+        plt.xlabel(xlabel)
+        plt.ylabel('Count')
+    return render
+
+
+def _box(title, ylabel):
+    def render(plt, data):
+        figure, ax = plt.subplots(figsize=(12, 6))
+        if data:
+            ax.bxp(data, showfliers=True)
+        ax.set_title(title)
+        ax.set_xlabel('Fuel Type')
+        ax.set_ylabel(ylabel)
+        plt.xticks(rotation=45)
+    return render
+
+
+def _points(plt, data):
+    import seaborn as sns
+    plt.figure(figsize=(12, 6))
+    sns.scatterplot(x=data['x'], y=data['y'], hue=data['fuel_type'])
+    plt.title('Engine Size vs Fuel Economy')
+    plt.xlabel('Engine Size (L)')
+    plt.ylabel('Fuel Economy (MPG)')
+
+
+CHARTS = {
+    'brand_model_count': _bar,
+    'fuel_type_distribution': _pie,
+    'horsepower_distribution': _hist('Distribution of Horsepower', 'Horsepower'),
+    'horsepower_by_fuel_type': _box('Horsepower Distribution by Fuel Type', 'Horsepower'),
+    'engine_size_vs_fuel_economy': _points,
+    'fuel_economy_by_fuel_type': _box('Fuel Economy Distribution by Fuel Type', 'Fuel Economy (MPG)'),
+    'engine_size_distribution': _hist('Distribution of Engine Sizes', 'Engine Size (L)'),
+}
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_chart(name, data, path):
+    import matplotlib.pyplot as plt
+    started = time.perf_counter()
+    CHARTS[name](plt, data)
+    plt.tight_layout()
+    tmp = f"{path}.{os.getpid()}.tmp.png"
+    plt.savefig(tmp)
+    plt.close('all')
+    os.replace(tmp, path)
+    return name, time.perf_counter() - started
+
+
+class ReportCache:
+    # reports/_aggregates/<aggregate key>.json holds every chart's aggregate for one corpus;
+    # reports/_charts.json the input digest each PNG was last rendered from.
+    def __init__(self, out=DEFAULT_OUT):
+        self.out = out
+        self.aggregate_dir = os.path.join(out, '_aggregates')
+        self.state_path = os.path.join(out, '_charts.json')
+        os.makedirs(self.aggregate_dir, exist_ok=True)
+
+    def _write_json(self, path, data):
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+    def aggregates(self, key, compute):
+        path = os.path.join(self.aggregate_dir, key + '.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f), True
+        except (OSError, ValueError):
+            pass
+        data = compute()
+        self._write_json(path, data)
+        # Only the current corpus's aggregates are kept.
+        for filename in os.listdir(self.aggregate_dir):
+            if filename != key + '.json':
+                os.remove(os.path.join(self.aggregate_dir, filename))
+        return data, False
+
+    def rendered(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_rendered(self, state):
+        self._write_json(self.state_path, state)
+
+    def chart_path(self, name):
+        return os.path.join(self.out, name + '.png')
+
+
+def build_reports(dataset, out=DEFAULT_OUT, workers=None, force=False):
+    # Returns {'version': ..., 'aggregates': 'cached'|'computed', 'rendered': [...], 'skipped': [...]}.
+    cache = ReportCache(out)
+    version = corpus_version(dataset.files)
+    aggregates, cached = cache.aggregates(aggregate_key(version), lambda: compute_aggregates(dataset))
+
+    state = {} if force else cache.rendered()
+    todo, skipped = {}, []
+    for name in CHARTS:
+        digest = _digest(aggregates[name])
+        if state.get(name) == digest and os.path.exists(cache.chart_path(name)):
+            skipped.append(name)
+        else:
+            todo[name] = digest
+
+    rendered = []
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(render_chart, name, aggregates[name], cache.chart_path(name)) for name in todo]
+            for future in futures:
+                name, seconds = future.result()
+                state[name] = todo[name]
+                rendered.append(name)
+                print(f"Rendered {cache.chart_path(name)} in {seconds:.2f}s")
+        cache.save_rendered(state)
+    return {'version': version, 'aggregates': 'cached' if cached else 'computed',
+            'rendered': rendered, 'skipped': skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the stage 06 charts from cached aggregates')
+    parser.add_argument('--out', default=DEFAULT_OUT, help='directory for the PNG files and the report cache')
+    parser.add_argument('--workers', type=int, default=None, help='rendering processes (default: one per core)')
+    parser.add_argument('--force', action='store_true', help='render every chart even if its input is unchanged')
+    lazy_dataset.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.configure_from_args(args, 'reports')
+    dataset = lazy_dataset.configure_from_args(args)
+
+    stats = build_reports(dataset, args.out, args.workers, args.force)
+    print(f"Corpus {stats['version']}: aggregates {stats['aggregates']}, {len(stats['rendered'])} charts rendered, "
+          f"{len(stats['skipped'])} unchanged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Persistent index of crawled engines for O(N) diffing and merging in stage 05
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import hashlib
+import os
+import sqlite3
+import time
+
+from http_cache import cache_key
+from jsonl_store import BRAND_DIR, brand_files, iter_brand_records
+from parsers import content_fingerprint
+
+DEFAULT_INDEX = os.path.join(BRAND_DIR, 'spec_index.sqlite')
+
+KEY_FIELDS = ('brand', 'model_name', 'engine_name', 'sub_link')
+# Columns of detailed_model_info.csv that describe an engine's listing; a different
+# value under the same key is reported as a changed entry.
+LISTING_FIELDS = ('fuel_type', 'horsepower', 'image_url')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    brand TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    engine_name TEXT NOT NULL,
+    sub_link TEXT NOT NULL,
+    listing TEXT NOT NULL,
+    PRIMARY KEY (brand, model_name, engine_name, sub_link)
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    sub_link TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL
+);
+CREATE TABLE IF NOT EXISTS brand_files (
+    brand TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+"""
+
+
+def entry_key(row):
+    return tuple(row.get(field) or '' for field in KEY_FIELDS)
+
+
+def listing_hash(row):
+    return hashlib.sha1('\x1f'.join(str(row.get(field) or '') for field in LISTING_FIELDS).encode('utf-8')).hexdigest()
+
+
+class SpecIndex:
+    def __init__(self, path=DEFAULT_INDEX):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        self.known = None
+
+    def close(self):
+        self.db.close()
+
+    def refresh(self, directory=BRAND_DIR):
+        # Re-indexes only brand files whose size or mtime changed since they were last indexed,
+        # and drops brands whose file is gone. Returns the number of brands re-indexed.
+        files = brand_files(directory)
+        indexed = {brand: (path, size, mtime) for brand, path, size, mtime in self.db.execute(
+            "SELECT brand, path, size, mtime FROM brand_files")}
+        reindexed = 0
+        with self.db:
+            for brand in set(indexed) - set(files):
+                self.db.execute("DELETE FROM entries WHERE brand = ?", (brand,))
+                self.db.execute("DELETE FROM brand_files WHERE brand = ?", (brand,))
+            for brand, path in files.items():
+                stat = os.stat(path)
+                if indexed.get(brand) == (path, stat.st_size, stat.st_mtime):
+                    continue
+                self.db.execute("DELETE FROM entries WHERE brand = ?", (brand,))
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    ((*entry_key(record), listing_hash(record)) for record in iter_brand_records(path)),
+                )
+                self._record_file(brand, path)
+                reindexed += 1
+        self.known = None
+        return reindexed
+
+    def _record_file(self, brand, path):
+        stat = os.stat(path)
+        self.db.execute("INSERT OR REPLACE INTO brand_files VALUES (?, ?, ?, ?)",
+                        (brand, path, stat.st_size, stat.st_mtime))
+
+    def load(self):
+        if self.known is None:
+            self.known = {(brand, model_name, engine_name, sub_link): listing
+                          for brand, model_name, engine_name, sub_link, listing in self.db.execute("SELECT * FROM entries")}
+        return self.known
+
+    def __len__(self):
+        return len(self.load())
+
+    def __contains__(self, row):
+        return entry_key(row) in self.load()
+
+    def brands(self):
+        return {key[0] for key in self.load()}
+
+    def diff(self, rows):
+        # One pass over the new rows plus one over the index: (added rows, changed rows, removed keys).
+        # Only brands present in `rows` are checked for removals.
+        known = self.load()
+        added, changed, seen = [], [], set()
+        for row in rows:
+            key = entry_key(row)
+            seen.add(key)
+            listing = known.get(key)
+            if listing is None:
+                added.append(row)
+            elif listing != listing_hash(row):
+                changed.append(row)
+        brands = {key[0] for key in seen}
+        removed = [key for key in known if key[0] in brands and key not in seen]
+        return added, changed, removed
+
+    def add(self, row):
+        # Returns False when the entry is already indexed.
+        key = entry_key(row)
+        known = self.load()
+        if key in known:
+            return False
+        listing = known[key] = listing_hash(row)
+        self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (*key, listing))
+        return True
+
+    def commit_brand(self, brand, path):
+        # Called after the brand file was rewritten, so the next refresh() does not re-index it.
+        with self.db:
+            self._record_file(brand, path)
+
+    def pages(self):
+        # {spec page URL: [(brand, sub_link), ...]}; every engine of a generation shares one page.
+        pages = {}
+        for brand, _, _, sub_link in self.load():
+            page = cache_key(f"https://www.autoevolution.com{sub_link}")
+            pages.setdefault(page, []).append((brand, sub_link))
+        return pages
+
+    def fingerprints(self):
+        return dict(self.db.execute("SELECT sub_link, content_hash FROM fingerprints"))
+
+    def set_fingerprint(self, sub_link, content_hash, etag=None, last_modified=None):
+        self.db.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                        (sub_link, content_hash, etag, last_modified, time.time()))
+
+    def record_fingerprints(self, sub_links, cache, site='https://www.autoevolution.com'):
+        # Fingerprints the cached spec page of every crawled sub_link with the validators it
+        # was cached with, so the next --update only re-parses pages that change after this
+        # crawl. Each page is read and hashed once; pages that never made it into the cache
+        # are skipped. Returns the number of sub_links recorded.
+        if cache is None:
+            return 0
+        by_page = {}
+        for sub_link in sub_links:
+            by_page.setdefault(cache_key(site + sub_link), []).append(sub_link)
+        recorded = 0
+        with self.db:
+            for page, links in by_page.items():
+                entry = cache.lookup(page)
+                body = cache.read_body(entry) if entry else None
+                if body is None:
+                    continue
+                fingerprint = content_fingerprint(body)
+                for sub_link in links:
+                    self.set_fingerprint(sub_link, fingerprint, entry.get('etag'), entry.get('last_modified'))
+                recorded += len(links)
+        return recorded
+
+    def commit(self):
+        self.db.commit()
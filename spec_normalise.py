@@ -0,0 +1,125 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Vectorized normalisation of spec strings into canonical numeric columns
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+from dataset_export import flatten_record
+
+NUMBER = r'(\d[\d,]*(?:\.\d+)?)'
+
+L100KM_PER_MPG_US = 235.214583
+L100KM_PER_MPG_UK = 282.480936
+
+
+def scale(factor):
+    return lambda number: number * factor
+
+
+def per(factor):
+    # Fuel economy in mpg converts to l/100 km by division.
+    return lambda number: factor / number.where(number > 0)
+
+
+# (unit pattern following the number, conversion to the canonical unit). The first unit found
+# in a value wins, so the metric figure autoevolution prints in brackets is preferred over the
+# imperial one it was converted from.
+DISPLACEMENT_CC = ((r'\s*(?:cm3|cm³|cc)\b', scale(1.0)), (r'\s*(?:l|liters?|litres?)\b', scale(1000.0)),
+                   (r'\s*cu\.?\s*in\b', scale(16.387064)))
+POWER_HP = ((r'\s*hp\b', scale(1.0)), (r'\s*kw\b', scale(1.341022)), (r'\s*(?:ps|cv)\b', scale(0.986320)))
+TORQUE_NM = ((r'\s*nm\b', scale(1.0)), (r'\s*lb[\s.-]*ft\b', scale(1.355818)))
+SPEED_KMH = ((r'\s*km/h\b', scale(1.0)), (r'\s*mph\b', scale(1.609344)))
+LENGTH_MM = ((r'\s*mm\b', scale(1.0)), (r'\s*cm\b', scale(10.0)), (r'\s*in\b', scale(25.4)))
+WEIGHT_KG = ((r'\s*kg\b', scale(1.0)), (r'\s*lbs?\b', scale(0.45359237)))
+CO2_GKM = ((r'\s*g/km\b', scale(1.0)), (r'\s*g/mi(?:le)?\b', scale(1 / 1.609344)))
+SECONDS = ((r'\s*s\b', scale(1.0)),)
+CONSUMPTION_L100KM = ((r'\s*l/100\s*km\b', scale(1.0)), (r'\s*mpg\s*us\b', per(L100KM_PER_MPG_US)),
+                      (r'\s*mpg\s*uk\b', per(L100KM_PER_MPG_UK)), (r'\s*mpg\b', per(L100KM_PER_MPG_US)))
+
+# Canonical column -> (pattern matching the flattened `section.key` source columns, units).
+# Several source columns (e.g. NEDC and WLTP fuel economy sections) are coalesced in order.
+FIELDS = {
+    'displacement_cc': (r'^engine\.displacement$', DISPLACEMENT_CC),
+    'power_hp': (r'^engine\.power$', POWER_HP),
+    'torque_nm': (r'^engine\.torque$', TORQUE_NM),
+    'top_speed_kmh': (r'^performance\.top speed$', SPEED_KMH),
+    'acceleration_0_100_s': (r'^performance\.acceleration 0-62 mph', SECONDS),
+    'fuel_city_l100km': (r'^fuel economy.*\.city$', CONSUMPTION_L100KM),
+    'fuel_highway_l100km': (r'^fuel economy.*\.highway$', CONSUMPTION_L100KM),
+    'fuel_combined_l100km': (r'^fuel economy.*\.combined$', CONSUMPTION_L100KM),
+    'co2_gkm': (r'^fuel economy.*\.co2 emissions$', CO2_GKM),
+    'length_mm': (r'^dimensions\.length$', LENGTH_MM),
+    'width_mm': (r'^dimensions\.width$', LENGTH_MM),
+    'height_mm': (r'^dimensions\.height$', LENGTH_MM),
+    'wheelbase_mm': (r'^dimensions\.wheelbase$', LENGTH_MM),
+    'ground_clearance_mm': (r'^dimensions\.ground clearance$', LENGTH_MM),
+    'unladen_weight_kg': (r'^weight\.unladen weight$', WEIGHT_KG),
+    'gross_weight_kg': (r'^weight\.gross weight limit$', WEIGHT_KG),
+}
+
+
+def records_frame(records):
+    # One row per crawled engine with its own spec block flattened to `section.key` columns,
+    # the same layout as the Parquet dataset.
+    return pd.DataFrame([{'brand': record.get('brand'), **flatten_record(record)} for record in records])
+
+
+def extract_number(values, pattern):
+    # Number captured by `pattern` in each lower-cased value as float64, NaN where it does not
+    # match. Runs in Arrow's RE2 kernel when pyarrow is installed, else through pandas' str.extract.
+    if pa is not None:
+        matches = pc.extract_regex(pa.array(values, type=pa.string(), from_pandas=True), '(?P<n>' + pattern[1:])
+        numbers = pc.cast(pc.replace_substring(pc.struct_field(matches, [0]), ',', ''), pa.float64())
+        return pd.Series(numbers.to_numpy(zero_copy_only=False), index=values.index, dtype='float64')
+    number = values.str.extract(pattern, expand=False).str.replace(',', '', regex=False)
+    return pd.to_numeric(number, errors='coerce').astype('float64')
+
+
+def parse_quantity(values, units):
+    # Vectorized: one regex pass per unit over the whole column, coalesced in unit order.
+    values = pd.Series(values, dtype='string').str.lower()
+    result = pd.Series(np.nan, index=values.index, dtype='float64')
+    for unit, convert in units:
+        result = result.fillna(convert(extract_number(values, NUMBER + unit)))
+    return result
+
+
+def parse_number(values):
+    # Leading number of each value ("184 HP" -> 184.0, "1.6 l" -> 1.6), NaN when there is none.
+    values = pd.Series(values, dtype='string')
+    number = values.str.extract(NUMBER, expand=False).str.replace(',', '', regex=False)
+    return pd.to_numeric(number, errors='coerce').astype('float64')
+
+
+def source_columns(df, pattern):
+    pattern = re.compile(pattern)
+    return [column for column in df.columns if pattern.search(column)]
+
+
+def normalise(df):
+    # Returns a frame of canonical float columns (unit in the column name) aligned with df.
+    # Columns whose source fields are missing from df come back as all-NaN.
+    out = pd.DataFrame(index=df.index)
+    for column, (pattern, units) in FIELDS.items():
+        result = pd.Series(np.nan, index=df.index, dtype='float64')
+        for source in source_columns(df, pattern):
+            result = result.fillna(parse_quantity(df[source], units))
+        out[column] = result
+
+    out['displacement_l'] = out['displacement_cc'] / 1000.0
+    out['power_kw'] = out['power_hp'] / 1.341022
+    out['fuel_combined_mpg'] = L100KM_PER_MPG_US / out['fuel_combined_l100km']
+    if 'horsepower' in df.columns:
+        out['horsepower_hp'] = parse_number(df['horsepower'])
+    return out
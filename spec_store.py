@@ -0,0 +1,558 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Embedded SQLite spec store: brands, models, engines and spec key/values with indexed lookups
+# Usage: python spec_store.py query --fuel-type DIESEL --min-hp 300 --since 2015
+#        python spec_store.py engine /cars/bmw-3-series-2022.html#aeng_bmw-3-series-2022-330i
+#        python spec_store.py sync
+#        python spec_store.py import archive/2023-*/brand_specs brand_specs --workers 8
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from dataset_export import select_spec_block
+from jsonl_store import BRAND_DIR, brand_files, iter_brand_records
+
+DEFAULT_STORE = 'spec_store.sqlite'
+MODELS_CSV = 'all_brand_models.csv'
+BATCH_SIZE = 500          # records per transaction in bulk imports
+IMPORT_TIMEOUT = 300.0    # seconds an import worker waits for another one's write transaction
+
+# An engine is a brand-file row: several engines of a generation share one spec page (sub_link).
+ENGINES_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY,
+    model_id INTEGER NOT NULL REFERENCES models (id),
+    sub_link TEXT NOT NULL,
+    engine_name TEXT NOT NULL,  -- '' when the listing has none, so the identity stays unique
+    fuel_type TEXT,
+    horsepower INTEGER,
+    displacement_l REAL,
+    power_kw INTEGER,
+    drivetrain TEXT,
+    transmission TEXT,
+    trim TEXT,
+    image_url TEXT,
+    archived INTEGER NOT NULL DEFAULT 0,  -- 1: only seen in an imported snapshot, kept by sync()
+    UNIQUE (model_id, engine_name, sub_link)
+);"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS brands (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    brand_id INTEGER NOT NULL REFERENCES brands (id),
+    name TEXT NOT NULL,
+    body_type TEXT,
+    status TEXT,
+    production_start INTEGER,
+    production_end INTEGER,  -- NULL while in production
+    UNIQUE (brand_id, name)
+);
+""" + ENGINES_TABLE.format(table='engines') + """
+CREATE TABLE IF NOT EXISTS specs (
+    engine_id INTEGER NOT NULL REFERENCES engines (id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (engine_id, section, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS brand_files (
+    brand TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS models_brand ON models (brand_id);
+CREATE INDEX IF NOT EXISTS models_years ON models (production_start, production_end);
+CREATE INDEX IF NOT EXISTS engines_model ON engines (model_id);
+CREATE INDEX IF NOT EXISTS engines_sub_link ON engines (sub_link);
+CREATE INDEX IF NOT EXISTS engines_fuel_hp ON engines (fuel_type, horsepower);
+CREATE INDEX IF NOT EXISTS engines_hp ON engines (horsepower);
+CREATE INDEX IF NOT EXISTS specs_key ON specs (section, key);
+"""
+
+HORSEPOWER = re.compile(r'(\d+)')
+YEARS = re.compile(r'(\d{4})\s*-\s*(Present|\d{4})')
+SNAPSHOT_DATE = re.compile(r'(?<!\d)(\d{4}-\d{2}(?:-\d{2})?)(?!\d)')
+
+# Output columns of query(); brand and model come from their tables.
+ENGINE_COLUMNS = ('brand', 'model_name', 'body_type', 'production_start', 'production_end', 'sub_link',
+                  'engine_name', 'fuel_type', 'horsepower', 'displacement_l', 'power_kw', 'drivetrain',
+                  'transmission', 'trim', 'image_url', 'archived')
+ENGINE_SELECT = """
+    SELECT b.name, m.name, m.body_type, m.production_start, m.production_end, e.sub_link, e.engine_name, e.fuel_type,
+           e.horsepower, e.displacement_l, e.power_kw, e.drivetrain, e.transmission, e.trim, e.image_url, e.archived
+    FROM engines e JOIN models m ON m.id = e.model_id JOIN brands b ON b.id = m.brand_id"""
+
+
+def _int(value):
+    match = HORSEPOWER.search(str(value or ''))
+    return int(match.group(1)) if match else None
+
+
+def _float(value):
+    try:
+        return float(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def parse_years(value):
+    # "2015 - Present" -> (2015, None); "2009 - 2014" -> (2009, 2014); anything else -> (None, None).
+    match = YEARS.search(value or '')
+    if not match:
+        return None, None
+    return int(match.group(1)), None if match.group(2) == 'Present' else int(match.group(2))
+
+
+def load_model_listing(path=MODELS_CSV):
+    # {(brand, model_name): stage 02 row}; production years and body type live only there.
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {(row['brand'], row['model_name']): row for row in csv.DictReader(f)}
+
+
+def iter_records_streaming(path):
+    # Legacy {brand}_specs.json files are one pretty-printed array; ijson walks it item by
+    # item instead of loading the whole brand. JSON Lines files stream line by line anyway.
+    if path.endswith('.jsonl') or ijson is None:
+        yield from iter_brand_records(path)
+        return
+    with open(path, 'rb') as f:
+        yield from ijson.items(f, 'item', use_float=True)
+
+
+def spec_rows(record):
+    # (section, key, value) of the record's own spec block; top-level strings go under 'spec'.
+    for section, values in select_spec_block(record).items():
+        if isinstance(values, dict):
+            for key, value in values.items():
+                yield section, key, None if value is None else str(value)
+        elif values is not None:
+            yield 'spec', section, str(values)
+
+
+class SpecStore:
+    def __init__(self, path=DEFAULT_STORE, timeout=30.0):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=timeout)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA foreign_keys=ON')
+        self.db.executescript(SCHEMA)
+        if 'archived' not in [row[1] for row in self.db.execute("PRAGMA table_info(engines)")]:
+            # Stores created before bulk imports were kept apart from the synced state.
+            self.db.execute("ALTER TABLE engines ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+        if self._keyed_on_sub_link():
+            self._rebuild_engines()
+        self.listing = None
+
+    def close(self):
+        self.db.close()
+
+    def _keyed_on_sub_link(self):
+        # Stores created before engines sharing a spec page were kept apart have UNIQUE (sub_link).
+        for _, name, unique, *_ in self.db.execute("PRAGMA index_list(engines)"):
+            if unique and [row[2] for row in self.db.execute(f"PRAGMA index_info('{name}')")] == ['sub_link']:
+                return True
+        return False
+
+    def _rebuild_engines(self):
+        # SQLite cannot drop a UNIQUE constraint, so the table is copied into the current
+        # schema. Engine ids are kept, so specs stay attached; foreign keys are off meanwhile
+        # because dropping the old table would otherwise cascade to specs.
+        columns = ('model_id, sub_link, fuel_type, horsepower, displacement_l, power_kw, drivetrain, transmission, '
+                   'trim, image_url, archived')
+        self.db.execute('PRAGMA foreign_keys=OFF')
+        try:
+            with self.db:
+                self.db.execute(ENGINES_TABLE.format(table='engines_rebuilt'))
+                self.db.execute(f"INSERT INTO engines_rebuilt (id, engine_name, {columns}) "
+                                f"SELECT id, COALESCE(engine_name, ''), {columns} FROM engines")
+                self.db.execute("DROP TABLE engines")
+                self.db.execute("ALTER TABLE engines_rebuilt RENAME TO engines")
+            self.db.executescript(SCHEMA)  # the indexes went with the old table
+        finally:
+            self.db.execute('PRAGMA foreign_keys=ON')
+
+    def _brand_id(self, name):
+        self.db.execute("INSERT OR IGNORE INTO brands (name) VALUES (?)", (name,))
+        return self.db.execute("SELECT id FROM brands WHERE name = ?", (name,)).fetchone()[0]
+
+    def _model_id(self, brand_id, brand, name):
+        listing = self.listing.get((brand, name), {})
+        start, end = parse_years(listing.get('production_years'))
+        self.db.execute("""
+            INSERT INTO models (brand_id, name, body_type, status, production_start, production_end)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (brand_id, name) DO UPDATE SET
+                body_type = COALESCE(excluded.body_type, body_type), status = COALESCE(excluded.status, status),
+                production_start = COALESCE(excluded.production_start, production_start),
+                production_end = CASE WHEN excluded.production_start IS NULL THEN production_end
+                                      ELSE excluded.production_end END""",
+                        (brand_id, name, listing.get('body_type') or None, listing.get('status') or None, start, end))
+        return self.db.execute("SELECT id FROM models WHERE brand_id = ? AND name = ?", (brand_id, name)).fetchone()[0]
+
+    def upsert(self, record, ids=None, archived=False):
+        # One crawled engine record (a line of a brand file). `ids` caches brand/model ids
+        # across the records of one batch. Call inside a transaction. An archived record (from
+        # a snapshot import) never overwrites an engine the current brand files still have;
+        # a current one takes an archived engine back. Returns the engine id.
+        if self.listing is None:
+            self.listing = load_model_listing()
+        ids = {} if ids is None else ids
+        brand = record.get('brand') or ''
+        model_name = record.get('model_name') or ''
+        brand_id = ids.get(brand)
+        if brand_id is None:
+            brand_id = ids[brand] = self._brand_id(brand)
+        model_id = ids.get((brand, model_name))
+        if model_id is None:
+            model_id = ids[(brand, model_name)] = self._model_id(brand_id, brand, model_name)
+
+        row = self.db.execute("""
+            INSERT INTO engines (model_id, sub_link, engine_name, fuel_type, horsepower, displacement_l, power_kw,
+                                 drivetrain, transmission, trim, image_url, archived)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (model_id, engine_name, sub_link) DO UPDATE SET
+                fuel_type = excluded.fuel_type, horsepower = excluded.horsepower, displacement_l = excluded.displacement_l,
+                power_kw = excluded.power_kw, drivetrain = excluded.drivetrain,
+                transmission = excluded.transmission, trim = excluded.trim, image_url = excluded.image_url,
+                archived = excluded.archived
+            WHERE excluded.archived = 0 OR engines.archived = 1
+            RETURNING id""", (
+            model_id, record.get('sub_link'), record.get('engine_name') or '', (record.get('fuel_type') or '').upper() or None,
+            _int(record.get('horsepower')), _float(record.get('title_displacement_l')),
+            _int(record.get('title_power_kw')), record.get('drivetrain') or None,
+            record.get('transmission') or None, record.get('trim') or None, record.get('image_url') or None,
+            int(archived),
+        )).fetchone()
+        if row is None:
+            # Archived record for a current engine: left as it is.
+            return self.db.execute("SELECT id FROM engines WHERE model_id = ? AND engine_name = ? AND sub_link = ?",
+                                   (model_id, record.get('engine_name') or '', record.get('sub_link'))).fetchone()[0]
+        engine_id = row[0]
+        self.db.execute("DELETE FROM specs WHERE engine_id = ?", (engine_id,))
+        self.db.executemany("INSERT OR REPLACE INTO specs VALUES (?, ?, ?, ?)",
+                            ((engine_id, section, key, value) for section, key, value in spec_rows(record)))
+        return engine_id
+
+    def upsert_many(self, records, brand=None, batch_size=BATCH_SIZE, archived=False):
+        # Upserts a stream of records, committing every `batch_size`, so memory stays bounded
+        # and other writers get the lock between batches. Returns the number of records.
+        ids = {}
+        count = 0
+        try:
+            for record in records:
+                if brand and not record.get('brand'):
+                    record['brand'] = brand
+                self.upsert(record, ids, archived)
+                count += 1
+                if count % batch_size == 0:
+                    self.db.commit()
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+        return count
+
+    def record_file(self, brand, path):
+        # Remembers the brand file as loaded, so sync() skips it until it changes.
+        stat = os.stat(path)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO brand_files VALUES (?, ?, ?, ?)",
+                            (brand, path, stat.st_size, stat.st_mtime))
+
+    def replace_brand(self, brand, records):
+        # Loads a brand file in one transaction; engines no longer in the file are dropped,
+        # except archived ones from snapshot imports.
+        with self.db:
+            ids = {}
+            seen = set()
+            for record in records:
+                record.setdefault('brand', brand)
+                seen.add(self.upsert(record, ids))
+            brand_id = ids.get(brand) or self._brand_id(brand)
+            stale = [engine_id for (engine_id,) in self.db.execute(
+                "SELECT e.id FROM engines e JOIN models m ON m.id = e.model_id WHERE m.brand_id = ? AND e.archived = 0",
+                (brand_id,))
+                if engine_id not in seen]
+            self.db.executemany("DELETE FROM engines WHERE id = ?", ((engine_id,) for engine_id in stale))
+        return len(seen)
+
+    def sync(self, directory=BRAND_DIR):
+        # Loads the brand files whose size or mtime changed since the last sync and drops
+        # brands whose file is gone. sync() owns the current state: brand_files only ever
+        # holds files of `directory`, and archived engines are left alone.
+        # Returns {'loaded': brands, 'engines': n, 'removed': brands}.
+        self.listing = load_model_listing()
+        files = brand_files(directory)
+        synced = {brand: (path, size, mtime) for brand, path, size, mtime in self.db.execute(
+            "SELECT brand, path, size, mtime FROM brand_files")}
+        loaded = engines = 0
+        for brand, path in files.items():
+            stat = os.stat(path)
+            if synced.get(brand) == (path, stat.st_size, stat.st_mtime):
+                continue
+            engines += self.replace_brand(brand, iter_brand_records(path))
+            self.record_file(brand, path)
+            loaded += 1
+        removed = set(synced) - set(files)
+        with self.db:
+            for brand in removed:
+                self.db.execute("""DELETE FROM engines WHERE archived = 0 AND model_id IN (
+                                   SELECT m.id FROM models m JOIN brands b ON b.id = m.brand_id WHERE b.name = ?)""",
+                                (brand,))
+                self.db.execute("DELETE FROM brand_files WHERE brand = ?", (brand,))
+        return {'loaded': loaded, 'engines': engines, 'removed': len(removed)}
+
+    # Queries
+
+    def query(self, brand=None, model=None, fuel_type=None, min_hp=None, max_hp=None, since=None, until=None,
+              drivetrain=None, limit=None, current=False):
+        # Engines matching every given filter, as dicts with ENGINE_COLUMNS. `since`/`until` are
+        # years the model was in production in: since=2015 keeps models still built in 2015 or later.
+        # current=True leaves out archived engines only known from imported snapshots.
+        where, params = [], []
+        if brand:
+            where.append("b.name = ?")
+            params.append(brand)
+        if model:
+            where.append("m.name = ?")
+            params.append(model)
+        if fuel_type:
+            where.append("e.fuel_type = ?")
+            params.append(fuel_type.upper())
+        if min_hp is not None:
+            where.append("e.horsepower >= ?")
+            params.append(min_hp)
+        if max_hp is not None:
+            where.append("e.horsepower <= ?")
+            params.append(max_hp)
+        if since is not None:
+            where.append("((m.production_end IS NULL AND m.production_start IS NOT NULL) OR m.production_end >= ?)")
+            params.append(since)
+        if until is not None:
+            where.append("m.production_start <= ?")
+            params.append(until)
+        if drivetrain:
+            where.append("e.drivetrain = ?")
+            params.append(drivetrain.upper())
+        if current:
+            where.append("e.archived = 0")
+        sql = ENGINE_SELECT
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY b.name, m.name, e.horsepower"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(zip(ENGINE_COLUMNS, row)) for row in self.db.execute(sql, params)]
+
+    def engines(self, sub_link):
+        # Every engine listed under one spec page (brand-file rows can share a sub_link), each
+        # with its specs as {section: {key: value}}; [] when the page is not in the store.
+        engines = []
+        for (engine_id,) in self.db.execute("SELECT id FROM engines WHERE sub_link = ? ORDER BY id", (sub_link,)).fetchall():
+            engine = dict(zip(ENGINE_COLUMNS, self.db.execute(ENGINE_SELECT + " WHERE e.id = ?", (engine_id,)).fetchone()))
+            engine['specs'] = {}
+            for section, key, value in self.db.execute(
+                    "SELECT section, key, value FROM specs WHERE engine_id = ?", (engine_id,)):
+                engine['specs'].setdefault(section, {})[key] = value
+            engines.append(engine)
+        return engines
+
+    def brands(self):
+        return [name for (name,) in self.db.execute("SELECT name FROM brands ORDER BY name")]
+
+    def counts(self):
+        return {table: self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('brands', 'models', 'engines', 'specs')}
+
+
+_worker_store = None
+
+
+def _open_worker_store(store_path):
+    # Import workers keep one connection for every brand they are handed. Every transaction
+    # takes the write lock up front (BEGIN IMMEDIATE) and waits its turn instead of failing
+    # on a lock upgrade.
+    global _worker_store
+    _worker_store = SpecStore(store_path, timeout=IMPORT_TIMEOUT)
+    _worker_store.db.isolation_level = 'IMMEDIATE'
+    _worker_store.db.execute('PRAGMA synchronous=NORMAL')
+
+
+def _import_brand(brand, paths, batch_size):
+    # Upserts one brand's files in order, so a later snapshot overwrites an earlier one.
+    # Snapshot paths are not recorded in brand_files; that table is sync()'s.
+    count = sum(_worker_store.upsert_many(iter_records_streaming(path), brand, batch_size, archived=True)
+                for path in paths)
+    return brand, count
+
+
+def snapshot_date(directory):
+    # 'YYYY-MM[-DD]' of a snapshot: the last date in its path (archive/2023-05/brand_specs),
+    # else the day its newest brand file was written, so an undated brand_specs sorts last.
+    match = SNAPSHOT_DATE.findall(os.path.abspath(directory))
+    if match:
+        return match[-1]
+    mtimes = [os.path.getmtime(path) for path in brand_files(directory).values()]
+    return time.strftime('%Y-%m-%d', time.localtime(max(mtimes, default=0)))
+
+
+def bulk_import(store_path, directories, workers=None, batch_size=BATCH_SIZE):
+    # Upserts every brand file of `directories` into the store as archived engines, with one
+    # worker process per brand at a time. The directories are taken oldest snapshot first
+    # whatever order they are given in, so a later snapshot overwrites an earlier one.
+    # Parsing runs in parallel; SQLite takes one writer at a time, batch by batch.
+    # Returns {'brands': n, 'engines': n}.
+    directories = sorted(directories, key=snapshot_date)
+    print(f"Snapshots, oldest first: {', '.join(f'{d} ({snapshot_date(d)})' for d in directories)}")
+    tasks = {}
+    for directory in directories:
+        for brand, path in brand_files(directory).items():
+            tasks.setdefault(brand, []).append(path)
+    if ijson is None and any(not path.endswith('.jsonl') for paths in tasks.values() for path in paths):
+        print("ijson is not installed; legacy .json brand files are loaded whole (pip install ijson)")
+    SpecStore(store_path).close()  # schema in place before the workers start
+
+    # Largest brands first, so one big brand does not start last and run alone.
+    order = sorted(tasks, key=lambda brand: -sum(os.path.getsize(path) for path in tasks[brand]))
+    engines = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_store, initargs=(store_path,)) as executor:
+        futures = [executor.submit(_import_brand, brand, tasks[brand], batch_size) for brand in order]
+        for done, future in enumerate(as_completed(futures), 1):
+            brand, count = future.result()
+            engines += count
+            print(f"[{done}/{len(futures)}] Imported {count} engines for {brand}")
+    return {'brands': len(tasks), 'engines': engines}
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = SpecStore()
+    return _store
+
+
+def configure(path=DEFAULT_STORE):
+    global _store
+    _store = SpecStore(path)
+    return _store
+
+
+def add_arguments(parser):
+    parser.add_argument('--store', default=DEFAULT_STORE, help='SQLite spec store synced from the brand files after the crawl')
+    parser.add_argument('--no-store', dest='store', action='store_const', const=None,
+                        help='do not sync the spec store')
+
+
+def sync_from_args(args, directory=BRAND_DIR):
+    if not args.store:
+        return None
+    store = configure(args.store)
+    try:
+        stats = store.sync(directory)
+    finally:
+        store.close()
+    print(f"Spec store: {stats}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the spec store')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='SQLite spec store')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sync = commands.add_parser('sync', help='load changed brand files into the store')
+    sync.add_argument('--brand-dir', default=BRAND_DIR)
+
+    bulk = commands.add_parser('import', help='upsert every brand file of one or more brand_specs directories')
+    bulk.add_argument('directories', nargs='+', help='brand_specs directories, in any order')
+    bulk.add_argument('--workers', type=int, default=None, help='import processes (default: one per core)')
+    bulk.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='records per transaction')
+
+    query = commands.add_parser('query', help='engines matching the filters')
+    query.add_argument('--brand')
+    query.add_argument('--model')
+    query.add_argument('--fuel-type')
+    query.add_argument('--min-hp', type=int)
+    query.add_argument('--max-hp', type=int)
+    query.add_argument('--since', type=int, help='in production in or after this year')
+    query.add_argument('--until', type=int, help='in production in or before this year')
+    query.add_argument('--drivetrain')
+    query.add_argument('--limit', type=int)
+    query.add_argument('--current', action='store_true', help='leave out engines only found in imported snapshots')
+    query.add_argument('--format', choices=('table', 'json', 'csv'), default='table')
+
+    engine = commands.add_parser('engine', help='the engines of one spec page with their specs')
+    engine.add_argument('sub_link')
+
+    commands.add_parser('stats', help='row counts')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        started = time.perf_counter()
+        stats = bulk_import(args.store, args.directories, args.workers, args.batch_size)
+        print(f"{stats} in {time.perf_counter() - started:.1f}s")
+        return
+
+    store = SpecStore(args.store)
+    try:
+        if args.command == 'sync':
+            print(store.sync(args.brand_dir))
+        elif args.command == 'query':
+            started = time.perf_counter()
+            rows = store.query(args.brand, args.model, args.fuel_type, args.min_hp, args.max_hp, args.since,
+                               args.until, args.drivetrain, args.limit, args.current)
+            elapsed = time.perf_counter() - started
+            if args.format == 'json':
+                json.dump(rows, sys.stdout, ensure_ascii=False, indent=2)
+                print()
+            elif args.format == 'csv':
+                writer = csv.DictWriter(sys.stdout, fieldnames=ENGINE_COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    years = f"{row['production_start'] or '?'}-{row['production_end'] or 'present'}"
+                    print(f"{row['brand']:<16} {row['model_name']:<32} {years:<12} {row['fuel_type'] or '':<10} "
+                          f"{row['horsepower'] or '':>5} HP  {row['engine_name']}{' (archived)' if row['archived'] else ''}")
+                print(f"{len(rows)} engines in {elapsed * 1000:.1f} ms")
+        elif args.command == 'engine':
+            engines = store.engines(args.sub_link)
+            if not engines:
+                print(f"Not in the store: {args.sub_link}")
+                sys.exit(1)
+            json.dump(engines, sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        else:
+            print(store.counts())
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Crawl telemetry: counters, latency histograms, queue depths and ETA, served Prometheus-style
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import bisect
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, shared by every histogram (request phases and parse times).
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = 'crawl_'
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket holding the quantile; None past the last bucket.
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+class Telemetry:
+    # Counters, gauges and histograms keyed by (name, labels). Every series carries the
+    # `stage` label of the running script. Updates come from the event loop, request and
+    # parse threads alike, so everything goes through one lock.
+    def __init__(self, stage='crawl'):
+        self.stage = stage
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        # item kind -> [done, total, first_done_at]
+        self.items = {}
+        self.server = None
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def request(self, status, size=0, total=None, ttfb=None, retries=0):
+        # One HTTP exchange. `ttfb` runs until the response headers are in (including any new
+        # connection); the rest of `total` is the body download.
+        self.inc('requests_total', status=status if status is not None else 'error')
+        self.inc('response_bytes_total', size)
+        if retries:
+            self.inc('retries_total', retries, reason='transport')
+        if total is not None:
+            self.observe('request_seconds', total, phase='total')
+        if ttfb is not None:
+            self.observe('request_seconds', ttfb, phase='ttfb')
+            if total is not None:
+                self.observe('request_seconds', max(0.0, total - ttfb), phase='download')
+
+    def add_items(self, kind, total):
+        # Expected work for the ETA; may be called again as more work is discovered.
+        with self.lock:
+            self.items.setdefault(kind, [0, 0, None])[1] += total
+
+    def item_done(self, kind, count=1):
+        with self.lock:
+            progress = self.items.setdefault(kind, [0, 0, None])
+            progress[0] += count
+            if progress[2] is None and count:
+                progress[2] = time.time()
+
+    def eta(self, kind):
+        # Seconds left at the rate items have been finishing so far.
+        with self.lock:
+            done, total, first_done_at = self.items.get(kind, (0, 0, None))
+        if not done or first_done_at is None or total <= done:
+            return 0.0 if total and total <= done else None
+        rate = done / max(time.time() - first_done_at, 1e-9)
+        return (total - done) / rate
+
+    def prometheus(self):
+        stage = (('stage', self.stage),)
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            items = sorted(self.items.items())
+            histograms = [(key, (list(h.counts), h.sum, h.count)) for key, h in histograms]
+        for metrics, metric_type in ((counters, 'counter'), (gauges, 'gauge')):
+            seen = set()
+            for (name, labels), value in metrics:
+                if name not in seen:
+                    lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+                    seen.add(name)
+                lines.append(f"{PREFIX}{name}{_format_labels(stage + labels)} {value}")
+        seen = set()
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in seen:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                seen.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(stage + labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(stage + labels)} {total}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(stage + labels)} {count}")
+        if items:
+            lines.append(f"# TYPE {PREFIX}items_done gauge")
+            lines.append(f"# TYPE {PREFIX}items_total gauge")
+            lines.append(f"# TYPE {PREFIX}eta_seconds gauge")
+        for kind, (done, total, _) in items:
+            labels = stage + (('kind', kind),)
+            lines.append(f"{PREFIX}items_done{_format_labels(labels)} {done}")
+            lines.append(f"{PREFIX}items_total{_format_labels(labels)} {total}")
+            eta = self.eta(kind)
+            if eta is not None:
+                lines.append(f"{PREFIX}eta_seconds{_format_labels(labels)} {eta:.1f}")
+        lines.append(f"{PREFIX}uptime_seconds{_format_labels(stage)} {time.time() - self.started:.1f}")
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        elapsed = time.time() - self.started
+        with self.lock:
+            counters = {f"{name}{_format_labels(labels)}": value for (name, labels), value in sorted(self.counters.items())}
+            gauges = {f"{name}{_format_labels(labels)}": value for (name, labels), value in sorted(self.gauges.items())}
+            histograms = {
+                f"{name}{_format_labels(labels)}": {
+                    'count': h.count,
+                    'mean': h.sum / h.count if h.count else None,
+                    'p50': h.quantile(0.5),
+                    'p95': h.quantile(0.95),
+                    'p99': h.quantile(0.99),
+                } for (name, labels), h in sorted(self.histograms.items(), key=lambda item: item[0])
+            }
+            items = {kind: {'done': done, 'total': total} for kind, (done, total, _) in self.items.items()}
+            requests = sum(value for (name, _), value in self.counters.items() if name == 'requests_total')
+            errors = self.counters.get(('requests_total', _labels({'status': 'error'})), 0)
+            size = sum(value for (name, _), value in self.counters.items() if name == 'response_bytes_total')
+        return {
+            'stage': self.stage,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'elapsed_seconds': round(elapsed, 1),
+            'requests': requests,
+            'requests_per_second': round(requests / elapsed, 2) if elapsed else None,
+            'bytes': size,
+            'error_rate': round(errors / requests, 4) if requests else None,
+            'items': items,
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+        }
+
+    def summary(self):
+        report = self.report()
+        return (f"{report['requests']} requests in {report['elapsed_seconds']:.0f}s "
+                f"({report['requests_per_second'] or 0:.2f}/s), {report['bytes'] / 2 ** 20:.1f} MiB, "
+                f"error rate {report['error_rate'] or 0:.1%}")
+
+    def serve(self, port, host='127.0.0.1'):
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] == '/metrics':
+                    body, content_type = telemetry.prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+                elif self.path.split('?')[0] == '/report':
+                    body, content_type = json.dumps(telemetry.report()).encode('utf-8'), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def finish(self, path=None):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+def timed(name):
+    # Records the call time of a parser under crawl_parse_seconds{extractor=name}. Parses run
+    # in a ProcessPoolExecutor are recorded in the worker process and do not show up here.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                get_telemetry().observe('parse_seconds', time.perf_counter() - started, extractor=name)
+        return wrapper
+    return decorator
+
+
+def trace_config():
+    # aiohttp hooks for the DNS and connect phases of new connections; pooled requests skip both.
+    import aiohttp
+
+    async def on_dns_start(session, context, params):
+        context.dns_started = time.monotonic()
+
+    async def on_dns_end(session, context, params):
+        get_telemetry().observe('request_seconds', time.monotonic() - context.dns_started, phase='dns')
+
+    async def on_connect_start(session, context, params):
+        context.connect_started = time.monotonic()
+
+    async def on_connect_end(session, context, params):
+        get_telemetry().observe('request_seconds', time.monotonic() - context.connect_started, phase='connect')
+        get_telemetry().inc('connections_total')
+
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(on_dns_start)
+    config.on_dns_resolvehost_end.append(on_dns_end)
+    config.on_connection_create_start.append(on_connect_start)
+    config.on_connection_create_end.append(on_connect_end)
+    return config
+
+
+_telemetry = None
+_report_path = None
+
+
+def get_telemetry():
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = Telemetry()
+    return _telemetry
+
+
+def configure(stage, port=None, report_path=None):
+    global _telemetry, _report_path
+    if _telemetry is not None:
+        _telemetry.finish()
+    _telemetry = Telemetry(stage)
+    _report_path = report_path
+    if port:
+        _telemetry.serve(port)
+        print(f"Metrics on http://127.0.0.1:{port}/metrics")
+    return _telemetry
+
+
+def add_arguments(parser):
+    parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on this local port while crawling')
+    parser.add_argument('--run-report', help='JSON run report written at the end (default run_report_<stage>.json)')
+
+
+def configure_from_args(args, stage):
+    return configure(stage, args.metrics_port, args.run_report or f'run_report_{stage}.json')
+
+
+def finish():
+    # Writes the run report and stops the metrics endpoint. Returns the one-line summary.
+    telemetry = get_telemetry()
+    summary = telemetry.summary()
+    telemetry.finish(_report_path)
+    if _report_path:
+        print(f"Run report saved to {_report_path}")
+    return summary
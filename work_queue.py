@@ -0,0 +1,231 @@
+########################################################################################################################
+# Crawl once a month to update global vehicle information.
+# Durable work queue journal for resumable spec crawls
+# Source constructors : Esketch Song (esketch@gmail.com)
+########################################################################################################################
+
+import hashlib
+import json
+import sqlite3
+import time
+
+DEFAULT_JOURNAL = 'crawl_journal.sqlite'
+
+PENDING = 'pending'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+FAILED = 'failed'
+
+MAX_ATTEMPTS = 4
+RETRY_BACKOFF = 30.0  # seconds, doubled on every failed attempt
+
+def group_rows(models):
+    # {sub_link: [row, ...]} in CSV order. The journal keeps one item per sub_link, seeded
+    # from its first row; the other rows naming the same engine get its specs on output.
+    groups = {}
+    for model in models:
+        groups.setdefault(model['sub_link'], []).append(model)
+    return groups
+
+
+def fan_out(record, rows):
+    # One output record per source row: each keeps its own CSV columns and shares the specs
+    # parsed for `record`.
+    if not rows:
+        return [record]
+    records = []
+    for row in rows:
+        copy = dict(row)
+        if 'specs' in record:
+            copy['specs'] = record['specs']
+        records.append(copy)
+    return records
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    sub_link TEXT PRIMARY KEY,
+    brand TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    row TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS items_state ON items (state, position);
+CREATE INDEX IF NOT EXISTS items_brand ON items (brand, state);
+CREATE TABLE IF NOT EXISTS results (
+    sub_link TEXT PRIMARY KEY,
+    brand TEXT NOT NULL,
+    record TEXT NOT NULL,
+    collected INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_collected ON results (collected, brand);
+"""
+
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WorkQueue:
+    def __init__(self, path=DEFAULT_JOURNAL, timeout=30.0):
+        # `timeout` is how long a write waits for another process holding the lock
+        # (distributed workers share one journal).
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=timeout)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        columns = [name for _, name, *_ in self.db.execute("PRAGMA table_info(items)")]
+        if 'shard' not in columns:
+            # Journals written before distributed mode existed.
+            with self.db:
+                self.db.execute("ALTER TABLE items ADD COLUMN shard INTEGER")
+        self.db.execute("CREATE INDEX IF NOT EXISTS items_shard ON items (shard, state, position)")
+
+    def close(self):
+        self.db.close()
+
+    def seed(self, models, source):
+        # Seeds the queue from the rows of detailed_model_info.csv. A journal seeded from the
+        # same CSV is resumed; a new CSV (next month's stage 03 output) starts a new run.
+        # Returns True when an existing run is being resumed.
+        current = self.db.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        with self.db:
+            if current and current[0] == source:
+                # Anything that was in flight when the previous run stopped is fetched again.
+                self.db.execute("UPDATE items SET state = ? WHERE state = ?", (PENDING, IN_FLIGHT))
+                return True
+            self.db.execute("DELETE FROM items")
+            self.db.execute("DELETE FROM results")
+            self.db.executemany(
+                "INSERT OR IGNORE INTO items (sub_link, brand, position, row) VALUES (?, ?, ?, ?)",
+                ((model['sub_link'], model['brand'], position, json.dumps(model, ensure_ascii=False))
+                 for position, model in enumerate(models)),
+            )
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)", (source,))
+        return False
+
+    def assign_shards(self, shard_of):
+        # Stores shard_of(sub_link) for every item that is not done yet. Returns {shard: items}.
+        rows = self.db.execute("SELECT sub_link FROM items WHERE state != ?", (DONE,)).fetchall()
+        with self.db:
+            self.db.executemany(
+                "UPDATE items SET shard = ? WHERE sub_link = ?",
+                ((shard_of(sub_link), sub_link) for sub_link, in rows),
+            )
+        return dict(self.db.execute(
+            "SELECT shard, COUNT(*) FROM items WHERE state != ? GROUP BY shard", (DONE,)
+        ))
+
+    def claim(self, batch_size=100, shard=None):
+        # Yields pending items in CSV order, marking each batch in flight as it is handed out.
+        # With `shard`, only that shard's items are handed out.
+        where, params = ("state = ?", (PENDING,)) if shard is None else ("state = ? AND shard = ?", (PENDING, shard))
+        while True:
+            with self.db:
+                rows = self.db.execute(
+                    f"SELECT sub_link, row FROM items WHERE {where} ORDER BY position LIMIT ?",
+                    params + (batch_size,),
+                ).fetchall()
+                self.db.executemany(
+                    "UPDATE items SET state = ?, updated_at = ? WHERE sub_link = ?",
+                    ((IN_FLIGHT, time.time(), sub_link) for sub_link, _ in rows),
+                )
+            if not rows:
+                return
+            for sub_link, row in rows:
+                yield json.loads(row)
+
+    def mark_done(self, sub_link):
+        with self.db:
+            self.db.execute(
+                "UPDATE items SET state = ?, error = NULL, updated_at = ? WHERE sub_link = ?",
+                (DONE, time.time(), sub_link),
+            )
+
+    def mark_failed(self, sub_link, error, max_attempts=MAX_ATTEMPTS, result=None):
+        # Returns True while the item still has retries left. A `result` record is stored
+        # (see store_result) in the same transaction once the retries are used up.
+        with self.db:
+            self.db.execute(
+                "UPDATE items SET state = ?, error = ?, attempts = attempts + 1, "
+                "next_attempt = ? * (1 << attempts) + ?, updated_at = ? WHERE sub_link = ?",
+                (FAILED, str(error), RETRY_BACKOFF, time.time(), time.time(), sub_link),
+            )
+            attempts = self.db.execute("SELECT attempts FROM items WHERE sub_link = ?", (sub_link,)).fetchone()[0]
+            if attempts >= max_attempts and result is not None:
+                self._insert_result(sub_link, result)
+        return attempts < max_attempts
+
+    def store_result(self, sub_link, record):
+        # Distributed workers hand their records to the coordinator through the journal; the
+        # item is marked done in the same transaction.
+        with self.db:
+            self._insert_result(sub_link, record)
+            self.db.execute(
+                "UPDATE items SET state = ?, error = NULL, updated_at = ? WHERE sub_link = ?",
+                (DONE, time.time(), sub_link),
+            )
+
+    def _insert_result(self, sub_link, record):
+        self.db.execute(
+            "INSERT OR REPLACE INTO results (sub_link, brand, record) VALUES (?, ?, ?)",
+            (sub_link, record['brand'], json.dumps(record, ensure_ascii=False)),
+        )
+
+    def collect(self, batch_size=500):
+        # Records stored by workers that the coordinator has not written out yet.
+        return [
+            (sub_link, json.loads(record)) for sub_link, record in self.db.execute(
+                "SELECT sub_link, record FROM results WHERE collected = 0 LIMIT ?", (batch_size,)
+            )
+        ]
+
+    def mark_collected(self, sub_links):
+        with self.db:
+            self.db.executemany("UPDATE results SET collected = 1 WHERE sub_link = ?", ((s,) for s in sub_links))
+
+    def uncollected(self, brand):
+        return self.db.execute(
+            "SELECT COUNT(*) FROM results WHERE brand = ? AND collected = 0", (brand,)
+        ).fetchone()[0]
+
+    def requeue_failed(self, max_attempts=MAX_ATTEMPTS, shard=None):
+        # Moves retryable failures back to pending once their backoff has passed.
+        # Returns (requeued, seconds until the next one becomes due or None).
+        now = time.time()
+        where, params = ("state = ? AND attempts < ?", (FAILED, max_attempts))
+        if shard is not None:
+            where, params = where + " AND shard = ?", params + (shard,)
+        with self.db:
+            requeued = self.db.execute(
+                f"UPDATE items SET state = ? WHERE {where} AND next_attempt <= ?",
+                (PENDING,) + params + (now,),
+            ).rowcount
+        due = self.db.execute(f"SELECT MIN(next_attempt) FROM items WHERE {where}", params).fetchone()[0]
+        return requeued, (max(0.0, due - now) if due is not None else None)
+
+    def unfinished(self, brand, max_attempts=MAX_ATTEMPTS):
+        # Items of the brand that are still to be fetched, including failures with retries left.
+        return self.db.execute(
+            "SELECT COUNT(*) FROM items WHERE brand = ? AND (state IN (?, ?) OR (state = ? AND attempts < ?))",
+            (brand, PENDING, IN_FLIGHT, FAILED, max_attempts),
+        ).fetchone()[0]
+
+    def brands(self):
+        return [brand for brand, in self.db.execute("SELECT brand FROM items GROUP BY brand ORDER BY MIN(position)")]
+
+    def counts(self):
+        return dict(self.db.execute("SELECT state, COUNT(*) FROM items GROUP BY state"))